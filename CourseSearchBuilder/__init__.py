@@ -11,11 +11,15 @@ from SharedCode.dataset_helper import DataSetHelper
 # from SharedCode.mail_helper import MailHelper
 from SharedCode import utils
 
+from .build_institutions_json import INSTITUTION_FIELDS
 from .build_institutions_json import build_institutions_json_files
 from .build_search import build_search_index
-from .build_sitemap_xml import build_sitemap_xml
+from .build_sitemap_xml import INSTITUTION_FIELDS as SITEMAP_INSTITUTION_FIELDS
+from .build_sitemap_xml import Sitemap
 from .build_subjects_json import build_subjects_json_file
 from .build_version_json import build_version_json_file
+from .collection_scan import scan_collection
+from .get_collections import iter_collection_pages
 
 
 def main(msgin: func.QueueMessage):
@@ -37,13 +41,27 @@ def main(msgin: func.QueueMessage):
             f"CourseSearchBuilder function started on {function_start_datetime}"
         )
 
-        build_complete = build_search_index(dsh=dsh)
+        # Each collection is read once, and every output uses the same version
+        version = dsh.get_latest_version_number()
+        sitemap = Sitemap()
+
+        build_complete = build_search_index(dsh=dsh, version=version, course_consumers=[sitemap.add_course])
 
         if build_complete and dsh.have_all_builds_succeeded():
-            build_institutions_json_files()
-            build_subjects_json_file()
-            build_version_json_file()
-            build_sitemap_xml()
+            institution_list = []
+            scan_collection(
+                iter_collection_pages(
+                    "AzureCosmosDbInstitutionsCollectionId",
+                    fields=INSTITUTION_FIELDS + SITEMAP_INSTITUTION_FIELDS,
+                    version=version,
+                ),
+                institution_list.append,
+                sitemap.add_institution,
+            )
+            build_institutions_json_files(institution_list)
+            build_subjects_json_file(version)
+            build_version_json_file(version)
+            sitemap.write()
 
             dsh.update_status("root", "succeeded")
         else:
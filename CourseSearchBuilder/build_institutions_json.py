@@ -1,86 +1,111 @@
 """Module for creating the institutions.json file used by CMS"""
 
-import io
 import json
 import os
 import re
 from typing import Any
 from typing import Dict
+from typing import Iterator
 from typing import List
+from typing import Tuple
 
 from CourseSearchBuilder.get_collections import get_institutions
 from SharedCode.blob_helper import BlobHelper
 
 
-def build_institutions_json_files():
-    institution_list = get_institutions()
-
-    generate_file(
-        institution_list=institution_list,
-        primary_name="pub_ukprn_welsh_name",
-        secondary_name="pub_ukprn_name",
-        first_trading_name="first_trading_name",
-        legal_name="legal_name",
-        other_names="other_names",
-        blob_file="AzureStorageInstitutionsCYJSONFileBlobName"
-    )
-    generate_file(
-        institution_list=institution_list,
-        primary_name="pub_ukprn_name",
-        secondary_name="pub_ukprn_welsh_name",
-        first_trading_name="first_trading_name",
-        legal_name="legal_name",
-        other_names="other_names",
-        blob_file="AzureStorageInstitutionsENJSONFileBlobName"
-    )
-
-
-def not_already_in_list(name, existing):
-    if name not in existing:
-        existing.append(name)
-        return True
-    return False
-
-
-def generate_file(
-        institution_list: List[Dict[str, Any]],
-        primary_name: str,
-        secondary_name: str,
-        first_trading_name: str,
-        legal_name: str,
-        other_names: str,
-        blob_file: str
-):
-    blob_helper = BlobHelper()
-    institutions_file = io.StringIO()
-    institutions = []
-    for val in institution_list:
-        institution = val["institution"]
-        primary = institution[primary_name]
-        secondary = institution[secondary_name]
-        first_trading = institution.get(first_trading_name, "")
-        legal = institution.get(legal_name, "")
-        other = institution.get(other_names, "")
+# The fields of the institution documents read by get_institution_entries
+INSTITUTION_FIELDS = (
+    "institution.pub_ukprn_name",
+    "institution.pub_ukprn_welsh_name",
+    "institution.first_trading_name",
+    "institution.legal_name",
+    "institution.other_names",
+)
+
 
-        if isinstance(primary, str):
-            inst_entry = get_inst_entry(primary, first_trading, legal, other)
-            institutions.append(inst_entry)
-        elif isinstance(secondary, str):
-            inst_entry = get_inst_entry(secondary, first_trading, legal, other)
-            institutions.append(inst_entry)
+# The prefixes remove_phrases_from_start strips, each at most once and in this order
+STRIPPED_PREFIXES = re.compile(
+    r"^(?:the university of )?(?:university of )?(?:university for )?(?:the )?"
+    r"(?:prifysgol )?(?:coleg )?(?:y coleg )?(?:y brifysgol )?"
+)
+# The number of bytes of JSON uploaded at a time
+JSON_CHUNK_BYTES = 64 * 1024
+JSON_ENCODER = json.JSONEncoder(indent=4)
 
-    institutions.sort(key=lambda x: x["order_by_name"])
 
-    de_duped = []
-    final = [name for name in institutions if not_already_in_list(name=name["name"], existing=de_duped)]
+def build_institutions_json_files(institution_list=None):
+    if institution_list is None:
+        institution_list = get_institutions(INSTITUTION_FIELDS)
 
-    json.dump(final, institutions_file, indent=4)
-    encoded_file = institutions_file.getvalue().encode('utf-8')
+    en_institutions, cy_institutions = get_institution_entries(institution_list)
 
+    blob_helper = BlobHelper()
     storage_container_name = os.environ["AzureStorageJSONFilesContainerName"]
-    storage_blob_name = os.environ[blob_file]
-    blob_helper.write_stream_file(storage_container_name, storage_blob_name, encoded_file)
-    institutions_file.close()
+    for institutions, blob_file in (
+            (cy_institutions, "AzureStorageInstitutionsCYJSONFileBlobName"),
+            (en_institutions, "AzureStorageInstitutionsENJSONFileBlobName"),
+    ):
+        storage_blob_name = os.environ[blob_file]
+        blob_helper.write_stream_file(storage_container_name, storage_blob_name, iter_json_chunks(de_dupe(institutions)))
+
+
+def get_institution_entries(institution_list: List[Dict[str, Any]]) -> Tuple[List[dict], List[dict]]:
+    """Returns the English and Welsh entries of the institutions, read in one pass
+
+    Each language uses the institution's name in that language, or the
+    name in the other language when it has none. An institution with the
+    same name in both languages shares one entry between them.
+    """
+    en_institutions = []
+    cy_institutions = []
+    for val in institution_list:
+        institution = val["institution"]
+        en_name = institution.get("pub_ukprn_name")
+        cy_name = institution.get("pub_ukprn_welsh_name")
+        first_trading = institution.get("first_trading_name", "")
+        legal = institution.get("legal_name", "")
+        other = institution.get("other_names", "")
+
+        en_primary = en_name if isinstance(en_name, str) else cy_name
+        cy_primary = cy_name if isinstance(cy_name, str) else en_name
+        if not isinstance(en_primary, str):
+            continue
+
+        en_entry = get_inst_entry(en_primary, first_trading, legal, other)
+        en_institutions.append(en_entry)
+        if cy_primary == en_primary:
+            cy_institutions.append(en_entry)
+        else:
+            cy_institutions.append(get_inst_entry(cy_primary, first_trading, legal, other))
+    return en_institutions, cy_institutions
+
+
+def de_dupe(institutions: List[dict]) -> List[dict]:
+    """Returns the entries in order_by_name order, keeping the first entry of each name"""
+    institutions = sorted(institutions, key=lambda x: x["order_by_name"])
+
+    seen_names = set()
+    final = []
+    for institution in institutions:
+        if institution["name"] not in seen_names:
+            seen_names.add(institution["name"])
+            final.append(institution)
+    return final
+
+
+def iter_json_chunks(data, chunk_bytes=JSON_CHUNK_BYTES) -> Iterator[bytes]:
+    """Yields the indented JSON of data as utf-8 chunks of about chunk_bytes"""
+    parts = []
+    size = 0
+    for part in JSON_ENCODER.iterencode(data):
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_bytes:
+            yield "".join(parts).encode("utf-8")
+            parts = []
+            size = 0
+    if parts:
+        yield "".join(parts).encode("utf-8")
 
 
 def get_inst_entry(name, first_trading_name, legal_name, other_names):
@@ -103,22 +128,7 @@ def get_order_by_name(name):
 
 
 def remove_phrases_from_start(name):
-    if re.search(r"^the university of ", name):
-        name = re.sub(r"^the university of ", "", name)
-    if re.search(r"^university of ", name):
-        name = re.sub(r"^university of ", "", name)
-    if re.search(r"^university for ", name):
-        name = re.sub(r"^university for ", "", name)
-    if re.search(r"^the ", name):
-        name = re.sub(r"^the ", "", name)
-    if re.search(r"^prifysgol ", name):
-        name = re.sub(r"^prifysgol ", "", name)
-    if re.search(r"^coleg ", name):
-        name = re.sub(r"^coleg ", "", name)
-    if re.search(r"^y coleg ", name):
-        name = re.sub(r"^y coleg ", "", name)
-    if re.search(r"^y brifysgol ", name):
-        name = re.sub(r"^y brifysgol ", "", name)
+    name = STRIPPED_PREFIXES.sub("", name, count=1)
     name = name.strip()
     name = name.replace(",", "")
-    return name
\ No newline at end of file
+    return name
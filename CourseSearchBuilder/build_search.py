@@ -5,15 +5,22 @@ from SharedCode import exceptions
 from SharedCode import utils
 from SharedCode.dataset_helper import DataSetHelper
 from . import search
+from .collection_scan import scan_collection
 
 
-def build_search_index(dsh: DataSetHelper) -> bool:
+def build_search_index(dsh: DataSetHelper, version=None, course_consumers=()) -> bool:
+    """Loads the version's courses into a new search index
+
+    Each course is also passed to every callable in course_consumers, so
+    other outputs can use the same read of the courses collection.
+    """
     try:
         api_key = os.environ["SearchAPIKey"]
         search_url = os.environ["SearchURL"]
         api_version = os.environ["AzureSearchAPIVersion"]
 
-        version = dsh.get_latest_version_number()
+        if version is None:
+            version = dsh.get_latest_version_number()
 
         dsh.update_status("search", "in progress")
 
@@ -21,17 +28,20 @@ def build_search_index(dsh: DataSetHelper) -> bool:
 
         search.build_index(search_url, api_key, api_version, version)
         logging.info(f"CourseSearchBuilder function: get course by version '{version}'")
-        courses = utils.get_courses_by_version(version)
+        # Read a page of courses at a time rather than holding every course in memory
+        course_pages = utils.iter_courses_by_version(version)
+        load = search.Load(search_url, api_key, api_version, version)
+
+        logging.info("attempting to load courses to azure search")
 
-        number_of_courses = len(courses)
+        scan_collection(course_pages, load.add, *course_consumers)
+        number_of_courses = load.finish()
 
         logging.info(
-            f"attempting to load courses to azure search\n\
+            f"loaded courses to azure search\n\
                         number_of_courses: {number_of_courses}\n"
         )
 
-        search.load_index(search_url, api_key, api_version, version, courses)
-
         dsh.update_status("search", "succeeded")
     except Exception as e:
         raise exceptions.StopEtlPipelineErrorException(f"build_search_index: error thrown while creating search index for version: {version} {e}")
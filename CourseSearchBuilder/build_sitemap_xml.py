@@ -1,30 +1,173 @@
+"""Writes the sitemap of the course and institution details pages.
+
+Urls are written as the documents are scanned, straight into gzip
+compressed sitemap files of at most MAX_SITEMAP_URLS urls and
+MAX_SITEMAP_BYTES uncompressed bytes, the limits of the sitemaps protocol.
+Each file is uploaded as soon as it is full, so only the one being written
+is held, and write uploads the last of them followed by a sitemap index
+listing them under the sitemap blob name. The index lists each file at
+SitemapFilesBaseUrl, the site by default, followed by its blob name, so
+the files have to be served from there. Each url's
+lastmod is the date its document was last updated, and each file's
+lastmod the latest of its urls, so crawlers can skip what has not changed.
+"""
+
+import gzip
 import io
+import logging
 import os
 from datetime import datetime
-from io import StringIO
+from xml.sax.saxutils import escape
 
-from CourseSearchBuilder.get_collections import get_institutions, get_collections
+from CourseSearchBuilder.collection_scan import scan_collection
+from CourseSearchBuilder.get_collections import iter_collection_pages
 from SharedCode.blob_helper import BlobHelper
 
 base_url = "https://discoveruni.gov.uk"
 
+# The document timestamps used for lastmod, in order of preference
+LASTMOD_FIELDS = ("updated_at", "created_at")
+# The fields of the documents read to build the sitemap urls
+INSTITUTION_FIELDS = ("institution.pub_ukprn",) + LASTMOD_FIELDS
+COURSE_FIELDS = ("institution_id", "course.kis_course_id", "course.mode.label") + LASTMOD_FIELDS
 
-def build_sitemap_xml() -> None:
-    blob_helper = BlobHelper()
-    institution_list = get_institutions()
-    course_list = get_collections("AzureCosmosDbCoursesCollectionId")
-    institution_params, course_params = build_param_lists(institution_list, course_list)
-    xml = """
-            <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">"""
-    xml_data = build_xml_string(institution_params + course_params, xml)
-    xml_file: StringIO = io.StringIO(xml_data)
-    storage_container_name = os.environ["AzureStorageJSONFilesContainerName"]
-    storage_blob_name = os.environ["AzureStorageInstitutionsSitemapsBlobName"]
-    blob_helper.write_stream_file(
-        storage_container_name=storage_container_name,
-        storage_blob_name=storage_blob_name,
-        encoded_file=xml_file.read().encode('utf-8')
+# The sitemaps protocol limits for a single sitemap file
+MAX_SITEMAP_URLS = 50000
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+
+SITEMAP_NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+URLSET_HEADER = f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NAMESPACE}">\n'.encode("utf-8")
+URLSET_FOOTER = b"</urlset>\n"
+URLS_PER_WRITE = 1000
+
+
+def build_sitemap_xml(version=None) -> None:
+    sitemap = Sitemap()
+    scan_collection(
+        iter_collection_pages("AzureCosmosDbInstitutionsCollectionId", fields=INSTITUTION_FIELDS, version=version),
+        sitemap.add_institution,
+    )
+    scan_collection(
+        iter_collection_pages("AzureCosmosDbCoursesCollectionId", fields=COURSE_FIELDS, version=version),
+        sitemap.add_course,
     )
+    sitemap.write()
+
+
+class SitemapFile:
+    """A gzip compressed sitemap file that urls are written to until it is full"""
+
+    def __init__(self):
+        self.compressed = io.BytesIO()
+        self.gzip_file = gzip.GzipFile(fileobj=self.compressed, mode="wb", compresslevel=6, mtime=0)
+        self.gzip_file.write(URLSET_HEADER)
+        self.number_of_urls = 0
+        self.number_of_bytes = len(URLSET_HEADER) + len(URLSET_FOOTER)
+        self.lastmod = ""
+        self.lines = []
+
+    def has_room(self, line, max_urls, max_bytes):
+        return self.number_of_urls < max_urls and self.number_of_bytes + len(line) <= max_bytes
+
+    def add(self, line, lastmod):
+        self.lines.append(line)
+        self.number_of_urls += 1
+        self.number_of_bytes += len(line)
+        self.lastmod = max(self.lastmod, lastmod)
+        if len(self.lines) == URLS_PER_WRITE:
+            self.gzip_file.write(b"".join(self.lines))
+            self.lines = []
+
+    def close(self) -> bytes:
+        self.gzip_file.write(b"".join(self.lines) + URLSET_FOOTER)
+        self.lines = []
+        self.gzip_file.close()
+        return self.compressed.getvalue()
+
+
+class Sitemap:
+    """Writes the sitemap urls as documents are scanned and then uploads the sitemap
+
+    add_institution and add_course take documents from scans of the
+    institutions and courses collections that other outputs share.
+    """
+
+    def __init__(self, max_urls=None, max_bytes=MAX_SITEMAP_BYTES):
+        if max_urls is None:
+            max_urls = int(os.environ.get("SitemapMaxUrls", MAX_SITEMAP_URLS))
+        self.max_urls = min(max_urls, MAX_SITEMAP_URLS)
+        self.max_bytes = min(max_bytes, MAX_SITEMAP_BYTES)
+        self.today = datetime.strftime(datetime.today(), "%Y-%m-%d")
+        self.current_file = None
+        # The number and lastmod of each sitemap file uploaded
+        self.files = []
+
+        self.blob_helper = BlobHelper()
+        self.storage_container_name = os.environ["AzureStorageJSONFilesContainerName"]
+        self.storage_blob_name = os.environ["AzureStorageInstitutionsSitemapsBlobName"]
+
+    def add_institution(self, institution):
+        lastmod = get_lastmod(institution, self.today)
+        for params in get_institution_params([institution]):
+            self.add_url(build_institution_details_url(*params), lastmod)
+
+    def add_course(self, course):
+        lastmod = get_lastmod(course, self.today)
+        for params in get_course_params([course]):
+            self.add_url(build_course_details_url(*params), lastmod)
+
+    def add_url(self, url, lastmod):
+        line = build_url_xml(url, lastmod).encode("utf-8")
+        if self.current_file is None or not self.current_file.has_room(line, self.max_urls, self.max_bytes):
+            self.close_file()
+            self.current_file = SitemapFile()
+        self.current_file.add(line, lastmod)
+
+    def close_file(self):
+        """Uploads the current sitemap file, keeping only its number and lastmod for the index"""
+        if self.current_file is not None:
+            number = len(self.files) + 1
+            self.blob_helper.write_stream_file(
+                storage_container_name=self.storage_container_name,
+                storage_blob_name=get_sitemap_file_blob_name(self.storage_blob_name, number),
+                encoded_file=self.current_file.close(),
+            )
+            self.files.append((number, self.current_file.lastmod))
+            self.current_file = None
+
+    def write(self) -> None:
+        self.close_file()
+        files_base_url = os.environ.get("SitemapFilesBaseUrl", base_url).rstrip("/")
+
+        # The index is uploaded after the files that it lists
+        file_entries = [
+            (f"{files_base_url}/{get_sitemap_file_blob_name(self.storage_blob_name, number)}", lastmod)
+            for number, lastmod in self.files
+        ]
+        self.blob_helper.write_stream_file(
+            storage_container_name=self.storage_container_name,
+            storage_blob_name=self.storage_blob_name,
+            encoded_file=build_sitemap_index_xml(file_entries).encode("utf-8"),
+        )
+        logging.info(f"wrote sitemap\n\
+                        sitemap: {self.storage_blob_name}\n\
+                        number_of_files: {len(file_entries)}")
+
+
+def get_sitemap_file_blob_name(storage_blob_name: str, number: int) -> str:
+    """Returns the blob name of a sitemap file, e.g. sitemap-1.xml.gz for sitemap.xml"""
+    stem = storage_blob_name[:-len(".xml")] if storage_blob_name.endswith(".xml") else storage_blob_name
+    return f"{stem}-{number}.xml.gz"
+
+
+def get_lastmod(document: dict, default: str) -> str:
+    """Returns the date a document was last updated, or default if it has no timestamp"""
+    for field in LASTMOD_FIELDS:
+        try:
+            return datetime.fromisoformat(document[field]).strftime("%Y-%m-%d")
+        except (KeyError, TypeError, ValueError):
+            continue
+    return default
 
 
 def build_param_lists(institution_list: list, course_list: list) -> tuple:
@@ -51,25 +194,20 @@ def get_course_params(course_list: list) -> list:
     return course_params
 
 
-def build_xml_string(arg_list: tuple, xml: str) -> str:
-    today = datetime.strftime(datetime.today(), "%Y-%m-%d")
-    centre_xml = """"""
-    for args in arg_list:
-        if len(args) == 4:
-            centre_xml += f"""    <url>
-                <loc>{build_course_details_url(*args)}></loc>
-                <lastmod>{today}</lastmod>
-            </url>
-        """
-        elif len(args) == 2:
-            centre_xml += f"""    <url>
-                <loc>{build_institution_details_url(*args)}></loc>
-                <lastmod>{today}</lastmod>
-            </url>
-        """
-    final_xml = f"""{xml}
-        {centre_xml}</urlset>"""
-    return final_xml
+def build_url_xml(url: str, lastmod: str) -> str:
+    return f"<url><loc>{escape(url)}</loc><lastmod>{lastmod}</lastmod></url>\n"
+
+
+def build_sitemap_index_xml(file_entries: list) -> str:
+    """Returns a sitemap index of the (url, lastmod) of each sitemap file"""
+    sitemaps = "".join(
+        f"<sitemap><loc>{escape(url)}</loc><lastmod>{lastmod}</lastmod></sitemap>\n"
+        for url, lastmod in file_entries
+    )
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n{sitemaps}</sitemapindex>\n'
+    )
 
 
 def build_course_details_url(institution_id: str, course_id: str, kis_mode: str, language: str) -> str:
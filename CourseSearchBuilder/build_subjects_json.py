@@ -9,9 +9,9 @@ from CourseSearchBuilder.get_collections import get_collections
 from SharedCode.blob_helper import BlobHelper
 
 
-def build_subjects_json_file():
+def build_subjects_json_file(version=None):
     blob_helper = BlobHelper()
-    subjects_list = get_collections("AzureCosmosDbSubjectsCollectionId")
+    subjects_list = get_collections("AzureCosmosDbSubjectsCollectionId", version=version)
     subjects_file = io.StringIO()
 
     subjects = []
@@ -8,8 +8,9 @@ from SharedCode.dataset_helper import DataSetHelper
 from SharedCode.blob_helper import BlobHelper
 
 
-def build_version_json_file():
-    version = DataSetHelper().get_latest_version_number()
+def build_version_json_file(version=None):
+    if version is None:
+        version = DataSetHelper().get_latest_version_number()
 
     blob_helper = BlobHelper()
 
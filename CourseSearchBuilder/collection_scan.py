@@ -0,0 +1,22 @@
+"""Reads each collection once per publish and shares the documents.
+
+The search index, the sitemap and the institutions JSON files all read the
+latest version of the courses or institutions collection. scan_collection
+streams a collection a page at a time and passes every document to each
+consumer in turn, so a collection is read once however many outputs use it.
+"""
+
+
+def scan_collection(pages, *consumers):
+    """Passes every document in pages to each consumer and returns the number of documents
+
+    pages is an iterable of lists of documents, such as iter_collection_pages
+    returns, and each consumer is a callable taking one document.
+    """
+    number_of_documents = 0
+    for page in pages:
+        for document in page:
+            number_of_documents += 1
+            for consumer in consumers:
+                consumer(document)
+    return number_of_documents
@@ -2,10 +2,17 @@ import os
 
 from SharedCode.dataset_helper import DataSetHelper
 from SharedCode.utils import get_cosmos_client
+from SharedCode.utils import get_projected_query
+from SharedCode.utils import iter_query_pages
 
 
-def get_collections(collection_id_env):
-    version = DataSetHelper().get_latest_version_number()
+def iter_collection_pages(collection_id_env, page_size=None, fields=None, version=None):
+    """Yields pages of a version's documents in a collection, by default the latest version
+
+    With fields, only those fields of each document are read (see get_projection).
+    """
+    if version is None:
+        version = DataSetHelper().get_latest_version_number()
     cosmos_db_client = get_cosmos_client()
     database_id = os.environ.get('AzureCosmosDbDatabaseId')
     collection_id = os.environ.get(collection_id_env)
@@ -13,13 +20,19 @@ def get_collections(collection_id_env):
     database = cosmos_db_client.get_database_client(database_id)
     container = database.get_container_client(collection_id)
 
-    query = f"SELECT * from c where c.version = {version}"
+    query = get_projected_query(fields, f"c.version = {version}")
 
     options = {"enable_cross_partition_query": True}
 
-    collections_list = list(container.query_items(query=query, **options))
+    yield from iter_query_pages(container, query, page_size, **options)
+
 
-    return collections_list
+def get_collections(collection_id_env, fields=None, version=None):
+    return [
+        document
+        for page in iter_collection_pages(collection_id_env, fields=fields, version=version)
+        for document in page
+    ]
 
-def get_institutions():
-    return get_collections("AzureCosmosDbInstitutionsCollectionId")
\ No newline at end of file
+def get_institutions(fields=None, version=None):
+    return get_collections("AzureCosmosDbInstitutionsCollectionId", fields, version)
\ No newline at end of file
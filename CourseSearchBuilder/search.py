@@ -4,6 +4,7 @@ import json
 import os
 
 from SharedCode import exceptions
+from SharedCode.search_uploader import SearchUploader
 from . import models
 
 
@@ -17,7 +18,7 @@ def build_index(url, api_key, api_version, version):
 def load_index(url, api_key, api_version, version, docs):
     load = Load(url, api_key, api_version, version, docs)
 
-    load.course_documents()
+    return load.course_documents()
 
 
 def build_synonyms(url, api_key, api_version):
@@ -102,75 +103,83 @@ class Index:
 
 
 class Load:
-    """Loads course documents into search index"""
+    """Loads course documents into search index
 
-    def __init__(self, url, api_key, api_version, version, docs):
+    docs can be any iterable, such as a generator reading pages of courses
+    from Cosmos DB. It is read one batch at a time, so only the batch being
+    uploaded is held in memory. Courses can also be passed one at a time to
+    add, followed by a call to finish.
+
+    Batches are uploaded by a SearchUploader, so the next batch is built
+    while earlier ones are still being uploaded.
+    """
+
+    bulk_course_count = 500
+
+    def __init__(self, url, api_key, api_version, version, docs=()):
 
-        self.url = url
-        self.headers = {
-            "Content-Type": "application/json",
-            "api-key": api_key,
-            "odata": "verbose",
-        }
-        self.query_string = "?api-version=" + api_version
         self.index_name = f"courses-{version}"
+        self.uploader = SearchUploader(
+            url, api_key, api_version, self.index_name, max_batch_docs=self.bulk_course_count
+        )
 
         self.docs = docs
+        self.course_count = 0
+        self.search_courses = []
 
     def course_documents(self):
+        """Loads every course in docs and returns the number loaded"""
 
-        number_of_docs = len(self.docs)
-        logging.info(f"THERE ARE A TOTAL OF {number_of_docs} courses")
-        course_count = 0
-        bulk_course_count = 500
-        documents = {}
-        search_courses = []
         for doc in self.docs:
-            course_count += 1
+            self.add(doc)
 
-            search_course = models.build_course_search_doc(doc)
-            search_courses.append(search_course)
+        return self.finish()
 
-            if course_count % bulk_course_count == 0 or course_count == number_of_docs:
+    def add(self, doc):
+        self.course_count += 1
 
-                documents["value"] = search_courses
+        search_course = models.build_course_search_doc(doc)
+        self.search_courses.append(search_course)
 
-                self.bulk_create_courses(documents)
+        if self.course_count % self.bulk_course_count == 0:
+            self.load_batch()
 
-                logging.info(
-                    f"successfully loaded {course_count} courses into azure search\n\
-                        index: {self.index_name}\n"
-                )
+    def finish(self):
+        """Loads the last partial batch and returns the number of courses loaded"""
 
-                # Empty variables
-                documents = {}
-                search_courses = []
-
-    def bulk_create_courses(self, documents):
+        if self.search_courses:
+            self.load_batch()
 
         try:
-            url = (
-                self.url
-                + "/indexes/"
-                + self.index_name
-                + "/docs/index"
-                + self.query_string
-            )
-            logging.info(f"url: {url}")
-            response = requests.post(url, headers=self.headers, json=documents)
-        except requests.exceptions.RequestException as e:
-            logging.exception("unexpected error loading bulk index", exc_info=True)
-            raise exceptions.StopEtlPipelineErrorException(e)
-
-        if response.status_code != 200:
+            self.uploader.flush()
+        except exceptions.SearchUploadError as e:
             logging.error(
                 f"failed to bulk load course search documents\n\
                             index-name: {self.index_name}\n\
-                            status: {response.status_code}\n\
-                            error: {requests.exceptions.HTTPError(response.text)}"
+                            error: {e}"
             )
+            raise exceptions.StopEtlPipelineErrorException(e)
+
+        logging.info(f"THERE WERE A TOTAL OF {self.course_count} courses")
+        return self.course_count
+
+    def load_batch(self):
+        documents = {"value": self.search_courses}
+
+        self.bulk_create_courses(documents)
+
+        logging.info(
+            f"queued {self.course_count} courses for upload to azure search\n\
+                index: {self.index_name}\n"
+        )
+
+        self.search_courses = []
+
+    def bulk_create_courses(self, documents):
+        """Queues a batch of course search documents with the uploader"""
 
-            raise exceptions.StopEtlPipelineErrorException()
+        for document in documents["value"]:
+            self.uploader.add(document)
 
 
 class SynonymMap:
@@ -1,4 +1,19 @@
+import json
+import re
+from unittest import mock
+
+from CourseSearchBuilder.build_institutions_json import build_institutions_json_files
+from CourseSearchBuilder.build_institutions_json import de_dupe
 from CourseSearchBuilder.build_institutions_json import get_inst_entry
+from CourseSearchBuilder.build_institutions_json import get_institution_entries
+from CourseSearchBuilder.build_institutions_json import iter_json_chunks
+from CourseSearchBuilder.build_institutions_json import remove_phrases_from_start
+
+ENVIRONMENT = {
+    "AzureStorageJSONFilesContainerName": "jsonfiles",
+    "AzureStorageInstitutionsCYJSONFileBlobName": "institutions_cy.json",
+    "AzureStorageInstitutionsENJSONFileBlobName": "institutions_en.json",
+}
 
 
 def test_get_inst_entry():
@@ -14,3 +29,86 @@ def test_get_inst_entry():
                      'order_by_name': 'test name',
                      'other_names': other_names
                      }
+
+
+def remove_phrases_one_at_a_time(name):
+    """The prefix stripping remove_phrases_from_start did with a regex per phrase"""
+    for phrase in ("the university of ", "university of ", "university for ", "the ",
+                   "prifysgol ", "coleg ", "y coleg ", "y brifysgol "):
+        name = re.sub(f"^{phrase}", "", name)
+    return name.strip().replace(",", "")
+
+
+def get_institution(en_name, cy_name=None):
+    return {"institution": {"pub_ukprn_name": en_name, "pub_ukprn_welsh_name": cy_name, "legal_name": "legal"}}
+
+
+def test_remove_phrases_from_start_strips_phrases_in_order():
+    names = [
+        "the university of the arts", "university of wales, trinity saint david", "university for the creative arts",
+        "the coleg y brifysgol x", "prifysgol coleg x", "y coleg cymraeg", "y brifysgol agored", "coleg y coleg x",
+        "the the open university", " university of x ", "theology college", "",
+    ]
+    for name in names:
+        assert remove_phrases_from_start(name) == remove_phrases_one_at_a_time(name), name
+
+
+def test_institution_entries_fall_back_to_the_other_language():
+    institutions = [
+        get_institution("Cardiff University", "Prifysgol Caerdydd"),
+        get_institution("The Open University"),
+        get_institution(None, "Coleg Cymraeg"),
+        get_institution(None, None),
+    ]
+
+    en_institutions, cy_institutions = get_institution_entries(institutions)
+
+    assert [entry["name"] for entry in en_institutions] == ["Cardiff University", "The Open University", "Coleg Cymraeg"]
+    assert [entry["name"] for entry in cy_institutions] == ["Prifysgol Caerdydd", "The Open University", "Coleg Cymraeg"]
+    assert en_institutions[1] is cy_institutions[1]
+    assert cy_institutions[0]["order_by_name"] == "caerdydd"
+
+
+def test_de_dupe_keeps_the_first_entry_of_each_name_in_order():
+    entries = [
+        get_inst_entry("University of Bath", "first", "", ""),
+        get_inst_entry("Aston University", "", "", ""),
+        get_inst_entry("University of Bath", "second", "", ""),
+    ]
+
+    assert [(entry["name"], entry["first_trading_name"]) for entry in de_dupe(entries)] == [
+        ("Aston University", ""),
+        ("University of Bath", "first"),
+    ]
+
+
+def test_json_is_streamed_in_chunks():
+    data = [get_inst_entry(f"University of {number}", "", "", "") for number in range(100)]
+
+    chunks = list(iter_json_chunks(data, chunk_bytes=1000))
+
+    assert len(chunks) > 1
+    assert b"".join(chunks) == json.dumps(data, indent=4).encode("utf-8")
+    assert list(iter_json_chunks([])) == [b"[]"]
+
+
+def test_both_files_are_written_with_one_blob_helper():
+    blobs = {}
+    institutions = [
+        get_institution("Cardiff University", "Prifysgol Caerdydd"),
+        get_institution("Aberystwyth University", "Prifysgol Aberystwyth"),
+        get_institution("Aberystwyth University", "Prifysgol Aberystwyth"),
+    ]
+    blob_helper = mock.Mock()
+    blob_helper.return_value.write_stream_file.side_effect = \
+        lambda container, blob, chunks: blobs.setdefault(blob, b"".join(chunks))
+
+    with mock.patch.dict("os.environ", ENVIRONMENT), \
+            mock.patch("CourseSearchBuilder.build_institutions_json.BlobHelper", blob_helper):
+        build_institutions_json_files(institutions)
+
+    blob_helper.assert_called_once_with()
+    en_institutions = json.loads(blobs["institutions_en.json"])
+    cy_institutions = json.loads(blobs["institutions_cy.json"])
+    assert [entry["name"] for entry in en_institutions] == ["Aberystwyth University", "Cardiff University"]
+    assert [entry["name"] for entry in cy_institutions] == ["Prifysgol Aberystwyth", "Prifysgol Caerdydd"]
@@ -0,0 +1,131 @@
+import gzip
+import json
+import os
+import unittest
+from unittest import mock
+
+import CourseSearchBuilder
+from CourseSearchBuilder import search
+from CourseSearchBuilder.collection_scan import scan_collection
+from SharedCode.fake_cosmos_container import FakeCosmosContainer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+ENVIRONMENT = {
+    "Environment": "test",
+    "AzureCosmosDbDatabaseId": "db",
+    "AzureCosmosDbCoursesCollectionId": "courses",
+    "AzureCosmosDbInstitutionsCollectionId": "institutions",
+    "AzureCosmosDbSubjectsCollectionId": "subjects",
+    "AzureStorageJSONFilesContainerName": "jsonfiles",
+    "AzureStorageInstitutionsSitemapsBlobName": "sitemap.xml",
+    "AzureStorageInstitutionsCYJSONFileBlobName": "institutions_cy.json",
+    "AzureStorageInstitutionsENJSONFileBlobName": "institutions_en.json",
+    "AzureStorageSubjectsJSONFileBlobName": "subjects.json",
+    "SearchAPIKey": "key",
+    "SearchURL": "https://search.example",
+    "AzureSearchAPIVersion": "2019-05-06",
+}
+
+
+def get_fixture(filename):
+    with open(os.path.join(FIXTURES_DIR, filename)) as fixture:
+        return json.load(fixture)
+
+
+class FakeCosmosClient:
+    def __init__(self, containers):
+        self.containers = containers
+
+    def get_database_client(self, database_id):
+        return self
+
+    def get_container_client(self, container_id):
+        return self.containers[container_id]
+
+
+class TestScanCollection(unittest.TestCase):
+    def test_every_document_goes_to_every_consumer(self):
+        first, second = [], []
+
+        number_of_documents = scan_collection(iter([[1, 2], [], [3]]), first.append, second.append)
+
+        self.assertEqual(3, number_of_documents)
+        self.assertEqual([1, 2, 3], first)
+        self.assertEqual([1, 2, 3], second)
+
+
+class TestCourseSearchBuilderReads(unittest.TestCase):
+    def setUp(self):
+        self.containers = {
+            "courses": FakeCosmosContainer(),
+            "institutions": FakeCosmosContainer(),
+            "subjects": FakeCosmosContainer(),
+        }
+        self.containers["courses"].documents = [get_fixture("input-full-fat-course.json")] * 3
+        self.containers["institutions"].documents = get_fixture("institution_list.json")
+        self.containers["subjects"].documents = [
+            {"code": "CAH01-01-01", "english_name": "Medicine", "welsh_name": "Meddygaeth", "level": 3}
+        ]
+        self.blobs = {}
+        self.loaded = []
+
+    def write_blob(self, storage_container_name, storage_blob_name, encoded_file):
+        if not isinstance(encoded_file, bytes):
+            encoded_file = b"".join(encoded_file)
+        if storage_blob_name.endswith(".gz"):
+            encoded_file = gzip.decompress(encoded_file)
+        self.blobs[storage_blob_name] = encoded_file.decode("utf-8")
+
+    def run_main(self):
+        client = FakeCosmosClient(self.containers)
+        blob_helper = mock.Mock()
+        blob_helper.return_value.write_stream_file.side_effect = self.write_blob
+        dsh = mock.Mock()
+        dsh.return_value.get_latest_version_number.return_value = 3
+        dsh.return_value.have_all_builds_succeeded.return_value = True
+
+        with mock.patch.dict("os.environ", ENVIRONMENT), \
+                mock.patch("SharedCode.utils.get_cosmos_client", return_value=client), \
+                mock.patch("CourseSearchBuilder.get_collections.get_cosmos_client", return_value=client), \
+                mock.patch("CourseSearchBuilder.DataSetHelper", dsh), \
+                mock.patch("CourseSearchBuilder.get_collections.DataSetHelper", dsh), \
+                mock.patch("CourseSearchBuilder.build_version_json.DataSetHelper", dsh), \
+                mock.patch("CourseSearchBuilder.build_institutions_json.BlobHelper", blob_helper), \
+                mock.patch("CourseSearchBuilder.build_subjects_json.BlobHelper", blob_helper), \
+                mock.patch("CourseSearchBuilder.build_version_json.BlobHelper", blob_helper), \
+                mock.patch("CourseSearchBuilder.build_sitemap_xml.BlobHelper", blob_helper), \
+                mock.patch.object(search, "build_synonyms"), \
+                mock.patch.object(search, "build_index"), \
+                mock.patch.object(search.Load, "bulk_create_courses", side_effect=self.loaded.append):
+            CourseSearchBuilder.main(mock.Mock())
+
+        return dsh.return_value
+
+    def test_each_collection_is_read_once(self):
+        dsh = self.run_main()
+
+        for name, container in self.containers.items():
+            with self.subTest(collection=name):
+                self.assertEqual(1, len(container.queries))
+                self.assertIn("c.version = 3", container.queries[0])
+        dsh.get_latest_version_number.assert_called_once_with()
+
+    def test_outputs_are_built_from_the_shared_reads(self):
+        self.run_main()
+
+        self.assertEqual(3, len(self.loaded[0]["value"]))
+        self.assertEqual(
+            {"sitemap.xml", "sitemap-1.xml.gz", "institutions_cy.json", "institutions_en.json", "subjects.json", "version.json"},
+            set(self.blobs),
+        )
+        self.assertIn("/sitemap-1.xml.gz</loc>", self.blobs["sitemap.xml"])
+        sitemap_file = self.blobs["sitemap-1.xml.gz"]
+        self.assertEqual(3 * 2, sitemap_file.count("/course-details/10000047/PSSFDOPTDIS/Full-time/"))
+        self.assertEqual(2, sitemap_file.count("/institution-details/10000047/"))
+        self.assertEqual(1, len(json.loads(self.blobs["institutions_en.json"])))
+        self.assertEqual({"version": 3}, json.loads(self.blobs["version.json"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import json
+import os
+import unittest
+
+from CourseSearchBuilder.build_institutions_json import INSTITUTION_FIELDS as INSTITUTIONS_JSON_FIELDS
+from CourseSearchBuilder.build_sitemap_xml import COURSE_FIELDS
+from CourseSearchBuilder.build_sitemap_xml import INSTITUTION_FIELDS
+from CourseSearchBuilder.build_sitemap_xml import build_param_lists
+from SharedCode.utils import project_document
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def get_fixture(filename):
+    with open(os.path.join(FIXTURES_DIR, filename)) as fixture:
+        return json.load(fixture)
+
+
+class TestProjectedCollections(unittest.TestCase):
+    def setUp(self):
+        self.course = get_fixture("input-full-fat-course.json")
+        self.institutions = get_fixture("institution_list.json")
+
+    def test_sitemap_params_are_the_same_from_projected_documents(self):
+        courses = [project_document(self.course, COURSE_FIELDS)]
+        institutions = [
+            project_document(institution, INSTITUTION_FIELDS)
+            for institution in self.institutions
+        ]
+
+        self.assertEqual(
+            build_param_lists(self.institutions, [self.course]),
+            build_param_lists(institutions, courses),
+        )
+
+    def test_institution_fields_include_the_names_used(self):
+        projected = project_document(self.institutions[0], INSTITUTIONS_JSON_FIELDS)["institution"]
+
+        for name in ("pub_ukprn_name", "pub_ukprn_welsh_name"):
+            self.assertEqual(self.institutions[0]["institution"][name], projected[name])
+
+    def test_projected_course_is_much_smaller(self):
+        full_bytes = len(json.dumps(self.course).encode("utf-8"))
+        projected_bytes = len(json.dumps(project_document(self.course, COURSE_FIELDS)).encode("utf-8"))
+
+        self.assertLess(projected_bytes * 20, full_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
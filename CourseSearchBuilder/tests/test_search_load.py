@@ -0,0 +1,58 @@
+import unittest
+from unittest import mock
+
+from CourseSearchBuilder import search
+from SharedCode.fake_cosmos_container import FakeCosmosContainer
+from SharedCode.utils import iter_query_pages
+
+
+def get_load(docs):
+    return search.Load("https://search.example", "key", "2019-05-06", 1, docs)
+
+
+class TestLoadCourseDocuments(unittest.TestCase):
+    def setUp(self):
+        self.uploaded = []
+        patcher = mock.patch.object(search.models, "build_course_search_doc", side_effect=lambda doc: doc)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, documents):
+        self.uploaded.append(list(documents["value"]))
+
+    def test_courses_are_uploaded_in_batches(self):
+        load = get_load(iter([{"id": str(i)} for i in range(1203)]))
+
+        with mock.patch.object(load, "bulk_create_courses", side_effect=self.upload):
+            number_of_courses = load.course_documents()
+
+        self.assertEqual(1203, number_of_courses)
+        self.assertEqual([500, 500, 203], [len(batch) for batch in self.uploaded])
+
+    def test_nothing_is_uploaded_without_courses(self):
+        load = get_load(iter([]))
+
+        with mock.patch.object(load, "bulk_create_courses", side_effect=self.upload):
+            self.assertEqual(0, load.course_documents())
+
+        self.assertEqual([], self.uploaded)
+
+    def test_pages_are_read_as_batches_are_uploaded(self):
+        container = FakeCosmosContainer()
+        container.documents = [{"id": str(i)} for i in range(2000)]
+        pages_read_at_upload = []
+
+        def upload(documents):
+            pages_read_at_upload.append(container.pages_read)
+
+        pages = iter_query_pages(container, "SELECT * from c", page_size=250)
+        load = get_load(doc for page in pages for doc in page)
+        with mock.patch.object(load, "bulk_create_courses", side_effect=upload):
+            load.course_documents()
+
+        # Each upload of 500 courses only needs the two pages of 250 it contains
+        self.assertEqual([2, 4, 6, 8], pages_read_at_upload)
+
+
+if __name__ == "__main__":
+    unittest.main()
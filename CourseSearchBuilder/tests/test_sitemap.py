@@ -0,0 +1,196 @@
+import gzip
+import tracemalloc
+import unittest
+import xml.etree.ElementTree as ElementTree
+from unittest import mock
+
+from CourseSearchBuilder.build_sitemap_xml import Sitemap
+from CourseSearchBuilder.build_sitemap_xml import get_lastmod
+from CourseSearchBuilder.build_sitemap_xml import get_sitemap_file_blob_name
+from SharedCode.benchmark import benchmark
+
+ENVIRONMENT = {
+    "AzureStorageJSONFilesContainerName": "jsonfiles",
+    "AzureStorageInstitutionsSitemapsBlobName": "sitemap.xml",
+}
+NAMESPACE = {"sitemap": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+
+
+def get_course(number, updated_at="2022-02-09T19:43:47.910837"):
+    return {
+        "institution_id": "10000047",
+        "course": {"kis_course_id": f"COURSE{number}", "mode": {"label": "Full-time"}},
+        "updated_at": updated_at,
+    }
+
+
+class DiscardingBlobHelper:
+    """Stands in for BlobHelper, dropping what is uploaded"""
+
+    def write_stream_file(self, storage_container_name, storage_blob_name, encoded_file):
+        pass
+
+
+class TestSitemap(unittest.TestCase):
+    def setUp(self):
+        self.blobs = {}
+        blob_helper = mock.Mock()
+        blob_helper.return_value.write_stream_file.side_effect = self.write_blob
+        for patcher in (
+            mock.patch.dict("os.environ", ENVIRONMENT),
+            mock.patch("CourseSearchBuilder.build_sitemap_xml.BlobHelper", blob_helper),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_blob(self, storage_container_name, storage_blob_name, encoded_file):
+        self.blobs[storage_blob_name] = encoded_file
+
+    def write(self, sitemap, environment=None):
+        with mock.patch.dict("os.environ", environment or {}):
+            sitemap.write()
+
+    def get_index(self):
+        root = ElementTree.fromstring(self.blobs["sitemap.xml"])
+        return [
+            (entry.find("sitemap:loc", NAMESPACE).text, entry.find("sitemap:lastmod", NAMESPACE).text)
+            for entry in root.findall("sitemap:sitemap", NAMESPACE)
+        ]
+
+    def get_urls(self, blob_name):
+        root = ElementTree.fromstring(gzip.decompress(self.blobs[blob_name]))
+        return [
+            (entry.find("sitemap:loc", NAMESPACE).text, entry.find("sitemap:lastmod", NAMESPACE).text)
+            for entry in root.findall("sitemap:url", NAMESPACE)
+        ]
+
+    def test_urls_are_split_into_files_listed_in_the_index(self):
+        sitemap = Sitemap(max_urls=4)
+        for number in range(5):
+            sitemap.add_course(get_course(number, f"2022-02-0{number + 1}T10:00:00"))
+
+        self.write(sitemap)
+
+        self.assertEqual(
+            [
+                ("https://discoveruni.gov.uk/sitemap-1.xml.gz", "2022-02-02"),
+                ("https://discoveruni.gov.uk/sitemap-2.xml.gz", "2022-02-04"),
+                ("https://discoveruni.gov.uk/sitemap-3.xml.gz", "2022-02-05"),
+            ],
+            self.get_index(),
+        )
+        self.assertEqual(
+            [
+                ("https://discoveruni.gov.uk/en/course-details/10000047/COURSE0/Full-time/", "2022-02-01"),
+                ("https://discoveruni.gov.uk/cy/course-details/10000047/COURSE0/Full-time/", "2022-02-01"),
+                ("https://discoveruni.gov.uk/en/course-details/10000047/COURSE1/Full-time/", "2022-02-02"),
+                ("https://discoveruni.gov.uk/cy/course-details/10000047/COURSE1/Full-time/", "2022-02-02"),
+            ],
+            self.get_urls("sitemap-1.xml.gz"),
+        )
+        self.assertEqual(2, len(self.get_urls("sitemap-3.xml.gz")))
+
+    def test_files_are_uploaded_when_full_and_the_index_last(self):
+        sitemap = Sitemap(max_urls=4)
+        for number in range(5):
+            sitemap.add_course(get_course(number))
+
+        self.assertEqual(["sitemap-1.xml.gz", "sitemap-2.xml.gz"], list(self.blobs))
+        self.assertEqual([(1, "2022-02-09"), (2, "2022-02-09")], sitemap.files)
+
+        self.write(sitemap)
+
+        self.assertEqual(["sitemap-1.xml.gz", "sitemap-2.xml.gz", "sitemap-3.xml.gz", "sitemap.xml"], list(self.blobs))
+
+    def test_files_are_listed_under_the_files_base_url(self):
+        sitemap = Sitemap(max_urls=2)
+        for number in range(2):
+            sitemap.add_course(get_course(number, f"2022-02-0{number + 1}T10:00:00"))
+
+        self.write(sitemap, {"SitemapFilesBaseUrl": "https://storage.example/jsonfiles/"})
+
+        self.assertEqual(
+            [
+                ("https://storage.example/jsonfiles/sitemap-1.xml.gz", "2022-02-01"),
+                ("https://storage.example/jsonfiles/sitemap-2.xml.gz", "2022-02-02"),
+            ],
+            self.get_index(),
+        )
+        # The urls of the pages are still on the site
+        self.assertEqual(
+            "https://discoveruni.gov.uk/en/course-details/10000047/COURSE0/Full-time/",
+            self.get_urls("sitemap-1.xml.gz")[0][0],
+        )
+
+    def test_files_stay_under_the_byte_limit(self):
+        sitemap = Sitemap(max_bytes=1000)
+        for number in range(20):
+            sitemap.add_course(get_course(number))
+
+        self.write(sitemap)
+
+        file_blobs = [name for name in self.blobs if name.endswith(".gz")]
+        self.assertGreater(len(file_blobs), 1)
+        self.assertEqual(40, sum(len(self.get_urls(name)) for name in file_blobs))
+        for name in file_blobs:
+            self.assertLessEqual(len(gzip.decompress(self.blobs[name])), 1000)
+
+    def test_institution_urls_are_escaped(self):
+        sitemap = Sitemap()
+        sitemap.add_institution({"institution": {"pub_ukprn": "1&2"}, "created_at": "2022-02-09T19:33:43.881639"})
+
+        self.write(sitemap)
+
+        self.assertEqual(
+            [
+                ("https://discoveruni.gov.uk/en/institution-details/1&2/", "2022-02-09"),
+                ("https://discoveruni.gov.uk/cy/institution-details/1&2/", "2022-02-09"),
+            ],
+            self.get_urls("sitemap-1.xml.gz"),
+        )
+
+    def test_empty_sitemap_writes_an_empty_index(self):
+        self.write(Sitemap())
+
+        self.assertEqual(["sitemap.xml"], list(self.blobs))
+        self.assertEqual([], self.get_index())
+
+    def test_lastmod(self):
+        self.assertEqual("2022-02-09", get_lastmod({"updated_at": "2022-02-09T19:43:47.910837"}, "today"))
+        self.assertEqual(
+            "2022-02-09",
+            get_lastmod({"updated_at": "not a date", "created_at": "2022-02-09T19:43:47"}, "today"),
+        )
+        self.assertEqual("today", get_lastmod({}, "today"))
+
+    def test_file_blob_name(self):
+        self.assertEqual("sitemap-2.xml.gz", get_sitemap_file_blob_name("sitemap.xml", 2))
+        self.assertEqual("sitemaps-1.xml.gz", get_sitemap_file_blob_name("sitemaps", 1))
+
+
+@benchmark
+class TestSitemapMemory(unittest.TestCase):
+    @mock.patch.dict("os.environ", ENVIRONMENT)
+    @mock.patch("CourseSearchBuilder.build_sitemap_xml.BlobHelper", DiscardingBlobHelper)
+    def test_only_the_file_being_written_is_held(self):
+        sitemap = Sitemap(max_urls=10000)
+        course = get_course(0)
+        number_of_courses = 50000
+
+        tracemalloc.start()
+        try:
+            for number in range(number_of_courses):
+                course["course"]["kis_course_id"] = f"COURSE{number}"
+                sitemap.add_course(course)
+            sitemap.close_file()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        xml_bytes = number_of_courses * 2 * 120
+        print(f"\nsitemap of {number_of_courses * 2} urls: {peak} bytes peak, about {xml_bytes} bytes of xml")
+        self.assertLess(peak * 4, xml_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,7 @@
 import unittest
-from datetime import datetime
 
 from CourseSearchBuilder.build_sitemap_xml import build_course_details_url, build_institution_details_url, \
-    build_xml_string, build_param_lists, get_institution_params, get_course_params
+    build_url_xml, build_param_lists, get_institution_params, get_course_params
 from test_course_search_models import get_json
 
 
@@ -45,33 +44,7 @@ class TestSiteMapXml(unittest.TestCase):
         self.assertEqual(build_institution_details_url(*input_english), result_english)
         self.assertEqual(build_institution_details_url(*input_welsh), result_welsh)
 
-    def test_xml_build(self):
-        today = datetime.strftime(datetime.today(), "%Y-%m-%d")
-        xml = """
-        <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">"""
-        input = [
-            ("10008071", "AAUNDERGRADUATE5YEAR", "Full-time", "en"),
-            ("10008071", "AAUNDERGRADUATE5YEAR", "Full-time", "cy"),
-            ("10008071", "en"),
-            ("10008071", "cy"),
-        ]
-        result = f"""
-        <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-            <url>
-                <loc>https://discoveruni.gov.uk/en/course-details/10008071/AAUNDERGRADUATE5YEAR/Full-time/></loc>
-                <lastmod>{today}</lastmod>
-            </url>
-            <url>
-                <loc>https://discoveruni.gov.uk/cy/course-details/10008071/AAUNDERGRADUATE5YEAR/Full-time/></loc>
-                <lastmod>{today}</lastmod>
-            </url>
-            <url>
-                <loc>https://discoveruni.gov.uk/en/institution-details/10008071/></loc>
-                <lastmod>{today}</lastmod>
-            </url>
-            <url>
-                <loc>https://discoveruni.gov.uk/cy/institution-details/10008071/></loc>
-                <lastmod>{today}</lastmod>
-            </url>
-        </urlset>"""
-        self.assertEqual(build_xml_string(input, xml), result, "XML is not equal")
+    def test_url_xml(self):
+        url = "https://discoveruni.gov.uk/en/course-details/10008071/AAUNDERGRADUATE5YEAR/Full-time/"
+        result = f"<url><loc>{url}</loc><lastmod>2022-02-09</lastmod></url>\n"
+        self.assertEqual(build_url_xml(url, "2022-02-09"), result, "XML is not equal")
@@ -13,16 +13,19 @@ import logging
 import os
 import re
 import sys
-import time
+from collections import namedtuple
 
 import defusedxml.ElementTree as ET
-import xmltodict
 
 from CreateInst.locations import Locations
 from EtlPipeline import course_lookup_tables as lookup
 from SharedCode import exceptions
 from SharedCode.blob_helper import BlobHelper
+from SharedCode.cosmos_bulk_writer import CosmosBulkWriter
+from SharedCode.reference_sections import ReferenceSections
 from SharedCode.utils import get_collection_link
+from SharedCode.utils import element_to_dict
+from SharedCode.utils import push_element_value
 from SharedCode.utils import get_cosmos_client
 from SharedCode.utils import get_english_welsh_item
 from SharedCode.utils import get_uuid
@@ -37,6 +40,11 @@ sys.path.insert(0, CURRENTDIR)
 sys.path.insert(0, PARENTDIR)
 
 
+ScannedInstitution = namedtuple(
+    "ScannedInstitution", ["raw_inst_data", "location_ids", "total_number_of_courses"]
+)
+
+
 def validate_headers(header: str, xml: str):
     if xml.find(header):
         return True
@@ -83,7 +91,7 @@ def get_welsh_uni_names():
         uprnEl = et_test.find('UKPRN')
         mock_xml_source_file = open(os.environ["LocalTestXMLFile"], "r")
         csv_string = mock_xml_source_file.read()
-        welsh_uni_names = ["welsh one", "welsh two"]
+        welsh_uni_names = {}
         return welsh_uni_names
     else:
         storage_container_name = os.environ["AzureStorageWelshUnisContainerName"]
@@ -91,7 +99,7 @@ def get_welsh_uni_names():
         blob_helper = BlobHelper()
         csv_string = blob_helper.get_str_file(storage_container_name, storage_blob_name)
 
-        _welsh_uni_names = []
+        _welsh_uni_names = {}
         if csv_string:
             rows = csv_string.splitlines()
 
@@ -101,7 +109,10 @@ def get_welsh_uni_names():
                 )
                 raise exceptions.StopEtlPipelineErrorException
 
-            _welsh_uni_names = rows
+            # Keep the first Welsh name listed for each UKPRN
+            for row in csv.reader(rows[1:]):
+                if len(row) > 1:
+                    _welsh_uni_names.setdefault(row[0], row[1])
 
         return _welsh_uni_names
 
@@ -114,13 +125,13 @@ def get_white_list():
             os.path.join(file_path, "institution_whitelist.txt")
     ) as f:
         institutions_whitelist = f.readlines()
-        return [institution.strip() for institution in institutions_whitelist]
+        return {institution.strip() for institution in institutions_whitelist}
 
 
 class InstitutionProviderNameHandler:
     def __init__(self, white_list, welsh_uni_names):
-        self.white_list = white_list
-        self.welsh_uni_names = welsh_uni_names
+        self.white_list = set(white_list)
+        self.welsh_uni_names = dict(welsh_uni_names)
 
     @staticmethod
     def title_case(s):
@@ -141,11 +152,10 @@ class InstitutionProviderNameHandler:
         return s
 
     def get_welsh_uni_name(self, pub_ukprn, provider_name) -> str:
-        rows = csv.reader(self.welsh_uni_names)
-        for row in rows:
-            if row[0] == pub_ukprn:
-                logging.info(f"Found welsh name for {pub_ukprn}")
-                return row[1]
+        welsh_name = self.welsh_uni_names.get(pub_ukprn)
+        if welsh_name is not None:
+            logging.info(f"Found welsh name for {pub_ukprn}")
+            return welsh_name
         return provider_name
 
     def should_edit_title(self, title):
@@ -163,12 +173,16 @@ class InstitutionDocs:
     def __init__(self, xml_string, version):
         self.version = version
         self.root = ET.fromstring(xml_string)
-        self.location_lookup = Locations(self.root)
+        self.location_lookup = Locations(ReferenceSections(self.root))
+        self.pn_handler = InstitutionProviderNameHandler(
+            white_list=get_white_list(),
+            welsh_uni_names=get_welsh_uni_names()
+        )
 
-    def get_institution_element(self, institution):
-        raw_inst_data = xmltodict.parse(ET.tostring(institution))[
-            "INSTITUTION"
-        ]
+    def get_institution_element(self, institution, scanned=None):
+        if scanned is None:
+            scanned = scan_institution(institution)
+        raw_inst_data = scanned.raw_inst_data
 
         pubukprn = raw_inst_data["PUBUKPRN"]
         institution_element = {}
@@ -185,16 +199,11 @@ class InstitutionDocs:
 
         institution_element["links"] = {"institution_homepage": contact_details["website"]}
 
-        student_unions = get_student_unions(self.location_lookup, institution)
-        if student_unions:
-            institution_element["student_unions"] = get_student_unions(
-                self.location_lookup, institution
-            )
-
-        pn_handler = InstitutionProviderNameHandler(
-            white_list=get_white_list(),
-            welsh_uni_names=get_welsh_uni_names()
+        student_unions = get_location_student_unions(
+            self.location_lookup, pubukprn, scanned.location_ids
         )
+        if student_unions:
+            institution_element["student_unions"] = student_unions
 
         legal_name = raw_inst_data.get("LEGAL_NAME", "")
         first_trading_name = raw_inst_data.get("FIRST_TRADING_NAME", "")
@@ -204,13 +213,13 @@ class InstitutionDocs:
         if first_trading_name:
             institution_element["first_trading_name"] = first_trading_name
             institution_element["pub_ukprn_name"] = first_trading_name
-            institution_element["pub_ukprn_welsh_name"] = pn_handler.get_welsh_uni_name(
+            institution_element["pub_ukprn_welsh_name"] = self.pn_handler.get_welsh_uni_name(
                 pub_ukprn=pubukprn,
                 provider_name=institution_element["first_trading_name"]
             )
         else:
             institution_element["pub_ukprn_name"] = raw_inst_data.get("LEGAL_NAME", "")
-            institution_element["pub_ukprn_welsh_name"] = pn_handler.get_welsh_uni_name(
+            institution_element["pub_ukprn_welsh_name"] = self.pn_handler.get_welsh_uni_name(
                 pub_ukprn=pubukprn,
                 provider_name=institution_element["legal_name"]
             )
@@ -232,7 +241,7 @@ class InstitutionDocs:
             institution_element["qaa_url"] = raw_inst_data.get("QAA_URL")
         institution_element[
             "total_number_of_courses"
-        ] = get_total_number_of_courses(institution)
+        ] = scanned.total_number_of_courses
 
         institution_element["ukprn_name"] = institution_element["pub_ukprn_name"]
         institution_element["ukprn_welsh_name"] = institution_element["pub_ukprn_welsh_name"]
@@ -245,9 +254,8 @@ class InstitutionDocs:
         return institution_element
 
     def get_institution_doc(self, institution):
-        raw_inst_data = xmltodict.parse(ET.tostring(institution))[
-            "INSTITUTION"
-        ]
+        scanned = scan_institution(institution)
+        raw_inst_data = scanned.raw_inst_data
 
         institution_doc = {
             "_id": get_uuid(),
@@ -256,7 +264,7 @@ class InstitutionDocs:
             "institution_id": raw_inst_data["PUBUKPRN"],
             "partition_key": str(self.version),
             "institution": self.get_institution_element(
-                institution
+                institution, scanned
             ),
         }
         return institution_doc
@@ -272,34 +280,14 @@ class InstitutionDocs:
         database = cosmosdb_client.get_database_client(db_id)
         container = database.get_container_client(collection_id)
 
+        bulk_writer = CosmosBulkWriter(container, self.version)
+
         institution_count = 0
-        new_docs = []
-        sproc_count = 0
         for institution in self.root.iter("INSTITUTION"):
             institution_count += 1
-            sproc_count += 1
-            new_docs.append(self.get_institution_doc(institution))
-            if sproc_count == 100:
-                logging.info(f"Begining execution of stored procedure for {sproc_count} documents")
-                container.scripts.execute_stored_procedure(
-                    sproc="bulkImport",
-                    partition_key=str(self.version),
-                    params=[new_docs]
-                )
-                logging.info(f"Successfully loaded another {sproc_count} documents")
-                # Reset values
-                new_docs = []
-                sproc_count = 0
-                time.sleep(10)
-
-        if sproc_count > 0:
-            logging.info(f"Begining execution of stored procedure for {sproc_count} documents")
-            container.scripts.execute_stored_procedure(
-                sproc="bulkImport",
-                partition_key=str(self.version),
-                params=[new_docs]
-            )
-            logging.info(f"Successfully loaded another {sproc_count} documents")
+            bulk_writer.add(self.get_institution_doc(institution))
+
+        bulk_writer.flush()
 
         logging.info(f"Processed {institution_count} institutions")
 
@@ -309,29 +297,51 @@ def get_country(code):
     return country
 
 
+def scan_institution(institution):
+    """Walks an INSTITUTION element once and returns a ScannedInstitution
+
+    raw_inst_data is what element_to_dict returns for the institution, less
+    its KISCOURSE entries. location_ids holds each course LOCID once, in the
+    order they first appear, and total_number_of_courses counts KISCOURSE
+    elements.
+    """
+    raw_inst_data = {}
+    location_ids = []
+    seen_location_ids = set()
+    total_number_of_courses = 0
+    for child in institution:
+        if child.tag != "KISCOURSE":
+            push_element_value(raw_inst_data, child.tag, element_to_dict(child))
+            continue
+
+        total_number_of_courses += 1
+        for course_location in child.iterfind("COURSELOCATION"):
+            locid_element = course_location.find("LOCID")
+            if locid_element is None:
+                continue
+            locid = element_to_dict(locid_element)
+            if locid not in seen_location_ids:
+                seen_location_ids.add(locid)
+                location_ids.append(locid)
+
+    return ScannedInstitution(raw_inst_data, location_ids, total_number_of_courses)
+
+
 def get_student_unions(location_lookup, institution):
-    pubukprn = xmltodict.parse(ET.tostring(institution))["INSTITUTION"][
-        "PUBUKPRN"
-    ]
+    scanned = scan_institution(institution)
+    return get_location_student_unions(
+        location_lookup, scanned.raw_inst_data["PUBUKPRN"], scanned.location_ids
+    )
+
+
+def get_location_student_unions(location_lookup, pubukprn, location_ids):
     student_unions = []
-    locations_processed = []
-    for course in institution.findall("KISCOURSE"):
-        for course_location in course.findall("COURSELOCATION"):
-            raw_course_location = xmltodict.parse(
-                ET.tostring(course_location)
-            )["COURSELOCATION"]
-            if "LOCID" not in raw_course_location:
-                continue
-            locid = raw_course_location["LOCID"]
-            location_lookup_key = f"{pubukprn}{locid}"
-            if location_lookup_key in locations_processed:
-                continue
-            locations_processed.append(location_lookup_key)
-            location = location_lookup.get_location(location_lookup_key)
-            if location:
-                student_union = get_student_union(location)
-                if student_union:
-                    student_unions.append(student_union)
+    for locid in location_ids:
+        location = location_lookup.get_location(f"{pubukprn}{locid}")
+        if location:
+            student_union = get_student_union(location)
+            if student_union:
+                student_unions.append(student_union)
     return student_unions
 
 
@@ -1,5 +1,4 @@
-import defusedxml.ElementTree as ET
-import xmltodict
+from SharedCode.utils import element_to_dict
 
 
 class Locations:
@@ -23,9 +22,7 @@ class Locations:
         self.lookup_dict = {}
         for location in root.iter("LOCATION"):
             try:
-                raw_location_data = xmltodict.parse(ET.tostring(location))[
-                    "LOCATION"
-                ]
+                raw_location_data = element_to_dict(location)
                 ukprn = raw_location_data["UKPRN"]
                 if "LOCUKPRN" in raw_location_data:
                     ukprn = raw_location_data["LOCUKPRN"]
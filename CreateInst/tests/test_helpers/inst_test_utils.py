@@ -1,5 +1,9 @@
 """General purpose functions used in tests"""
+import copy
 import os
+import xml.etree.ElementTree as StdET
+
+import defusedxml.ElementTree as ET
 
 FILE_DIR = os.path.dirname(os.path.abspath(__file__))
 PARENT_DIR = os.path.dirname(FILE_DIR)
@@ -20,3 +24,22 @@ def remove_variable_elements(inst):
     for key in keys_to_delete:
         del inst[key]
     return inst
+
+
+def get_kis_root(pub_ukprns):
+    """Returns a KIS root holding a copy of the one institution fixture for each of the given PUBUKPRNs
+    and a LOCATION for each course location"""
+    institution = ET.fromstring(get_string("fixtures/one_inst.xml"))
+    root = StdET.Element("KIS")
+    for pub_ukprn in pub_ukprns:
+        copied = copy.deepcopy(institution)
+        copied.find("PUBUKPRN").text = pub_ukprn
+        root.append(copied)
+
+    for locid in sorted({locid.text for locid in institution.iter("LOCID")}):
+        location = StdET.SubElement(root, "LOCATION")
+        StdET.SubElement(location, "UKPRN").text = "10000001"
+        StdET.SubElement(location, "LOCID").text = locid
+        StdET.SubElement(location, "LOCNAME").text = f"Campus {locid}"
+        StdET.SubElement(location, "SUURL").text = f"https://example.com/su/{locid}"
+    return root
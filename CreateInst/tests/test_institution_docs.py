@@ -1,14 +1,17 @@
 import os
 import unittest
+import xml.etree.ElementTree as StdET
 from unittest import mock
 
 import defusedxml.ElementTree as ET
 import json
 
 from CreateInst.institution_docs import InstitutionDocs
+from CreateInst.institution_docs import get_white_list
 from CreateInst.institution_docs import get_country
 from CreateInst.institution_docs import get_total_number_of_courses
 from CreateInst.tests.test_helpers.inst_test_utils import get_first
+from CreateInst.tests.test_helpers.inst_test_utils import get_kis_root
 from CreateInst.tests.test_helpers.inst_test_utils import get_string
 
 
@@ -67,6 +70,34 @@ class TestStaticHelperFunctions(unittest.TestCase):
         self.assertEqual(expected_resp, resp)
 
 
+class TestInstitutionNameSources(unittest.TestCase):
+    WELSH_NAMES_CSV = "ukprn,welsh_name\n10000002,Prifysgol Dau\n10000003,Prifysgol Tri\n10000003,Dyblyg\n"
+
+    @mock.patch.dict(os.environ, {
+        "AzureStorageWelshUnisContainerName": "welsh-unis",
+        "AzureStorageWelshUnisBlobName": "welsh-unis.csv",
+    })
+    @mock.patch("CreateInst.institution_docs.BlobHelper")
+    def test_welsh_names_are_downloaded_once(self, mock_blob_helper):
+        mock_blob_helper.return_value.get_str_file.return_value = self.WELSH_NAMES_CSV
+        inst_docs = InstitutionDocs(
+            StdET.tostring(get_kis_root(["10000001", "10000002", "10000003"]), encoding="unicode"), 1
+        )
+
+        docs = [inst_docs.get_institution_doc(institution) for institution in inst_docs.root.iter("INSTITUTION")]
+
+        mock_blob_helper.return_value.get_str_file.assert_called_once()
+        welsh_names = [doc["institution"]["pub_ukprn_welsh_name"] for doc in docs]
+        self.assertEqual(["Glasgow Caledonian University", "Prifysgol Dau", "Prifysgol Tri"], welsh_names)
+
+    def test_white_list_is_a_set_of_stripped_names(self):
+        white_list = get_white_list()
+
+        self.assertIsInstance(white_list, set)
+        self.assertTrue(white_list)
+        self.assertTrue(all(name == name.strip() for name in white_list))
+
+
 # class TestNewInstitutionData(unittest.TestCase):
 #     def setUp(self) -> None:
 #         self.one_inst_many_courses = get_string("fixtures/one_inst.xml")
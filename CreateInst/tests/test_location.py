@@ -3,7 +3,9 @@ import defusedxml.ElementTree as ET
 
 
 from CreateInst.locations import Locations
+from CreateInst.tests.test_helpers.inst_test_utils import get_kis_root
 from CreateInst.tests.test_helpers.inst_test_utils import get_string
+from SharedCode.reference_sections import ReferenceSections
 
 
 class TestLocationLookup(unittest.TestCase):
@@ -22,6 +24,17 @@ class TestLocationLookup(unittest.TestCase):
         self.assertEqual(location_data["SUURL"], "http://ccsu.co.uk/")
 
 
+class TestLocationLookupFromReferenceSections(unittest.TestCase):
+    def test_matches_lookup_built_from_root(self):
+        kis_root = get_kis_root(["10000001", "10000002"])
+
+        expected = Locations(kis_root).lookup_dict
+        lookup_dict = Locations(ReferenceSections(kis_root)).lookup_dict
+
+        self.assertTrue(lookup_dict)
+        self.assertEqual(expected, lookup_dict)
+
+
 # TODO Test more of the functionality - more lookups etc
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+import timeit
+import unittest
+import xml.etree.ElementTree as StdET
+
+import xmltodict
+
+from CreateInst.institution_docs import get_location_student_unions
+from CreateInst.institution_docs import get_student_unions
+from CreateInst.institution_docs import scan_institution
+from CreateInst.locations import Locations
+from CreateInst.tests.test_helpers.inst_test_utils import get_kis_root
+from SharedCode.benchmark import benchmark
+
+
+def parse_institution_repeatedly(location_lookup, institution):
+    """The institution reads as they were before scan_institution, for comparison"""
+    raw_inst_data = xmltodict.parse(StdET.tostring(institution))["INSTITUTION"]
+    raw_inst_data = xmltodict.parse(StdET.tostring(institution))["INSTITUTION"]
+    pubukprn = xmltodict.parse(StdET.tostring(institution))["INSTITUTION"]["PUBUKPRN"]
+    location_ids = []
+    for course in institution.findall("KISCOURSE"):
+        for course_location in course.findall("COURSELOCATION"):
+            raw_course_location = xmltodict.parse(StdET.tostring(course_location))["COURSELOCATION"]
+            if "LOCID" not in raw_course_location:
+                continue
+            if raw_course_location["LOCID"] in location_ids:
+                continue
+            location_ids.append(raw_course_location["LOCID"])
+    student_unions = get_location_student_unions(location_lookup, pubukprn, location_ids)
+    return raw_inst_data, location_ids, len(institution.findall("KISCOURSE")), student_unions
+
+
+class TestScanInstitution(unittest.TestCase):
+    def setUp(self):
+        self.root = get_kis_root(["10000001"])
+        self.institution = self.root.find("INSTITUTION")
+        self.location_lookup = Locations(self.root)
+
+    def test_scan_matches_repeated_parsing(self):
+        raw_inst_data, location_ids, course_count, _student_unions = parse_institution_repeatedly(
+            self.location_lookup, self.institution
+        )
+        raw_inst_data.pop("KISCOURSE")
+
+        scanned = scan_institution(self.institution)
+
+        self.assertEqual(raw_inst_data, scanned.raw_inst_data)
+        self.assertEqual(location_ids, scanned.location_ids)
+        self.assertEqual(course_count, scanned.total_number_of_courses)
+
+    def test_location_ids_are_unique_and_in_first_seen_order(self):
+        scanned = scan_institution(self.institution)
+        all_location_ids = [locid.text for locid in self.institution.iter("LOCID")]
+
+        self.assertEqual(list(dict.fromkeys(all_location_ids)), scanned.location_ids)
+
+    def test_student_unions_match_repeated_parsing(self):
+        *_, expected = parse_institution_repeatedly(self.location_lookup, self.institution)
+
+        student_unions = get_student_unions(self.location_lookup, self.institution)
+
+        self.assertTrue(student_unions)
+        self.assertEqual(expected, student_unions)
+
+
+@benchmark
+class TestScanInstitutionBenchmark(unittest.TestCase):
+    def test_scan_is_faster_than_repeated_parsing(self):
+        root = get_kis_root(["10000001", "10000002", "10000003"])
+        institutions = root.findall("INSTITUTION")
+        location_lookup = Locations(root)
+
+        def repeated():
+            for institution in institutions:
+                parse_institution_repeatedly(location_lookup, institution)
+
+        def scanned():
+            for institution in institutions:
+                scan = scan_institution(institution)
+                get_location_student_unions(
+                    location_lookup, scan.raw_inst_data["PUBUKPRN"], scan.location_ids
+                )
+
+        repeated_time = timeit.timeit(repeated, number=1)
+        scanned_time = min(timeit.repeat(scanned, number=1, repeat=3))
+
+        print(
+            f"\n{len(institutions)} institutions, repeated parsing: "
+            f"{repeated_time / len(institutions) * 1e3:.2f}ms per institution, "
+            f"single scan: {scanned_time / len(institutions) * 1e3:.2f}ms per institution"
+        )
+        self.assertLess(scanned_time, repeated_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
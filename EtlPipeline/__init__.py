@@ -53,14 +53,14 @@ def main(msgin: func.QueueMessage, msgout: func.Out[str]):
         storage_container_name = os.environ["AzureStorageHesaContainerName"]
         storage_blob_name = os.environ["AzureStorageHesaBlobName"]
 
-        xml_string = blob_helper.get_str_file(storage_container_name, storage_blob_name)
-
-        version = dsh.get_latest_version_number()
-
         """ LOADING - Parse XML and load enriched JSON docs to database """
 
         dsh.update_status("courses", "in progress")
-        course_docs.load_course_docs(xml_string, version)
+        # The XML is decompressed and parsed as the blob downloads,
+        # so course building starts before the download completes. The start of
+        # the download overlaps the version and lookup queries.
+        with blob_helper.get_gzip_stream(storage_container_name, storage_blob_name) as xml_stream:
+            course_docs.stream_course_docs(xml_stream, dsh.get_latest_version_number)
         dsh.update_status("courses", "succeeded")
 
         function_end_datetime = datetime.today().strftime("%d-%m-%Y %H:%M:%S")
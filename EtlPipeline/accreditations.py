@@ -1,5 +1,4 @@
-import xmltodict
-import defusedxml.ElementTree as ET
+from SharedCode.utils import element_to_dict
 
 
 class Accreditations:
@@ -13,9 +12,7 @@ class Accreditations:
 
         self.lookup_dict = {}
         for accreditation in root.iter("ACCREDITATIONTABLE"):
-            raw_accreditation_data = xmltodict.parse(
-                ET.tostring(accreditation)
-            )["ACCREDITATIONTABLE"]
+            raw_accreditation_data = element_to_dict(accreditation)
 
             acckey = f"{raw_accreditation_data['ACCTYPE']}"
             self.lookup_dict[acckey] = raw_accreditation_data
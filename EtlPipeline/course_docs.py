@@ -9,22 +9,31 @@ them bubble up. This should help flush out problems
 during development and testing.
 """
 import datetime
+import gzip
 import inspect
+import json
 import logging
+import multiprocessing
 import os
 import sys
+import tempfile
 import traceback
+from collections import deque
+from collections import namedtuple
 from typing import Callable
 from typing import List
 
 import defusedxml.ElementTree as ET
-import xmltodict
 
+from EtlPipeline.fragment_cache import FragmentCache
+from EtlPipeline.lookups import add_subject_lookups
+from EtlPipeline.lookups import set_stats_subject_version
 from EtlPipeline.mappings.go.institution import GoInstitutionMappings
 from EtlPipeline.mappings.go.salary import GoSalaryMappings
 from EtlPipeline.mappings.go.voice import GoVoiceMappings
 from EtlPipeline.mappings.leo.institution import LeoInstitutionMappings
 from EtlPipeline.mappings.leo.sector import LeoSectorMappings
+from EtlPipeline.unavailable_messages import log_message_cache_stats
 
 CURRENTDIR = os.path.dirname(
     os.path.abspath(inspect.getfile(inspect.currentframe()))
@@ -46,29 +55,93 @@ from course_subjects import get_subjects
 from sector_salaries import GOSectorSalaries, LEO3SectorSalaries, LEO5SectorSalaries
 
 from SharedCode import utils
+from SharedCode.cosmos_bulk_writer import CosmosBulkWriter
+from SharedCode.exceptions import XmlValidationError
+from SharedCode.hesa_xml_stream import HesaXmlStream
+from SharedCode.reference_sections import ReferenceSections
+from SharedCode.utils import element_to_dict
 from SharedCode.utils import get_english_welsh_item
+from SharedCode.warm_up import WarmUp
+
+
+CourseDocInputs = namedtuple(
+    "CourseDocInputs",
+    ["root", "version", "enricher", "subject_enricher", "qualification_enricher"],
+)
 
 
 def load_course_docs(xml_string, version):
     """Parse HESA XML passed in and create JSON course docs in Cosmos DB."""
 
-    cosmosdb_client = utils.get_cosmos_client()
+    root = ET.fromstring(xml_string)
+    write_course_docs(root, root.iter("INSTITUTION"), version)
 
-    logging.info(
-        "adding ukrlp data into memory ahead of building course documents"
-    )
-    enricher = UkRlpCourseEnricher(version)
 
-    logging.info(
-        "adding subject data into memory ahead of building course documents"
-    )
-    subject_enricher = SubjectCourseEnricher(version)
-    g_subject_enricher = subject_enricher
+def stream_course_docs(xml_file, get_version):
+    """Read HESA XML from a file object and create JSON course docs in Cosmos DB.
+
+    Courses are built as each INSTITUTION is parsed, so the whole tree is
+    never held in memory and work can start before the file is fully read.
+    get_version is called to find the dataset version while the reference
+    data is read from the file. When SECTORSAL comes after the institutions
+    the sector salaries are added to the courses once it has been read.
+    """
+
+    hesa_stream = HesaXmlStream(xml_file)
+    inputs = warm_up_course_docs(get_version, hesa_stream.read_reference_data)
+    build_course_docs(inputs, hesa_stream.iter_institutions(), get_sector_salaries=hesa_stream.read_sector_salaries)
+
+
+def write_course_docs(root, institutions, version, workers=None):
+    """Create JSON course docs in Cosmos DB for each INSTITUTION element.
+
+    The lookup tables are built from the reference sections under root.
+    """
+
+    inputs = warm_up_course_docs(lambda: version, lambda: root)
+    build_course_docs(inputs, institutions, workers)
+
+
+def warm_up_course_docs(get_version, get_root):
+    """Fetches everything needed before the first course is built, all at once.
+
+    The dataset version, the reference data, the UKRLP names, the subjects
+    and the qualification levels are fetched on a thread pool. The UKRLP and
+    subject lookups wait for the version inside their own tasks.
+    """
+
+    warm_up = WarmUp()
+    warm_up.add("dataset version", get_version)
+    warm_up.add("reference data", get_root)
+    warm_up.add("ukrlp lookups", lambda: UkRlpCourseEnricher(warm_up.result("dataset version")))
+    warm_up.add("subject lookups", lambda: SubjectCourseEnricher(warm_up.result("dataset version")))
+    warm_up.add("qualification levels", QualificationCourseEnricher)
+    results = warm_up.run()
 
-    logging.info(
-        "adding qualification data into memory ahead of building course documents"
+    set_stats_subject_version(results["dataset version"])
+    return CourseDocInputs(
+        results["reference data"],
+        results["dataset version"],
+        results["ukrlp lookups"],
+        results["subject lookups"],
+        results["qualification levels"],
     )
-    qualification_enricher = QualificationCourseEnricher()
+
+
+def build_course_docs(inputs, institutions, workers=None, get_sector_salaries=None):
+    """Builds and uploads the course docs for each INSTITUTION element.
+
+    With more than one worker the course docs are built in a process pool
+    and collected back here, in document order, for uploading. If the
+    reference data has no SECTORSAL, get_sector_salaries returns the
+    reference data including it once the institutions have been read.
+    """
+
+    if workers is None:
+        workers = get_course_doc_workers()
+
+    root, version, enricher, subject_enricher, qualification_enricher = inputs
+    cosmosdb_client = utils.get_cosmos_client()
     db_id = os.environ.get("AzureCosmosDbDatabaseId")
     collection_id = os.environ.get("AzureCosmosDbCoursesCollectionId")
 
@@ -76,95 +149,256 @@ def load_course_docs(xml_string, version):
     database = cosmosdb_client.get_database_client(db_id)
     container = database.get_container_client(collection_id)
 
-    # Import the XML dataset
-    root = ET.fromstring(xml_string)
+    builder = CourseDocBuilder(
+        root, version, enricher, subject_enricher, qualification_enricher
+    )
+    if builder.sector_salaries_pending and get_sector_salaries is None:
+        raise XmlValidationError("SECTORSAL was not found in the HESA XML")
+
+    if workers > 1:
+        logging.info(f"Building course documents with {workers} worker processes")
+        with multiprocessing.Pool(
+            workers, initializer=init_course_doc_worker, initargs=(builder,)
+        ) as pool:
+            serialised_institutions = (
+                ET.tostring(institution) for institution in institutions
+            )
+            institution_results = imap_ordered(
+                pool,
+                build_serialised_institution,
+                serialised_institutions,
+                max_pending=workers * 2,
+            )
+            upload_course_docs(container, institution_results, version, builder, get_sector_salaries)
+    else:
+        institution_results = (
+            builder.build_institution(institution) for institution in institutions
+        )
+        upload_course_docs(container, institution_results, version, builder, get_sector_salaries)
+        builder.fragments.log_stats()
+        log_message_cache_stats()
 
-    new_docs = []
-    sproc_count = 0
 
-    # Import accreditations, common, kisaims and location nodes
-    accreditations = Accreditations(root)
-    kisaims = KisAims(root)
-    locations = Locations(root)
+def upload_course_docs(container, institution_results, version, builder=None, get_sector_salaries=None):
+    """Logs each course result and bulk loads the built course docs
 
-    go_sector_salaries = GOSectorSalaries(root)
-    leo3_sector_salaries = LEO3SectorSalaries(root)
-    leo5_sector_salaries = LEO5SectorSalaries(root)
+    Course docs built before SECTORSAL was read are held in a HeldCourseDocs
+    until the institutions have been read, then the builder adds their
+    sector salaries from get_sector_salaries and they are loaded.
+    """
+
+    bulk_writer = CosmosBulkWriter(container, version)
+
+    if builder is None or not builder.sector_salaries_pending:
+        course_count = add_course_docs(bulk_writer.add, institution_results, version)
+    else:
+        with HeldCourseDocs() as held_course_docs:
+            course_count = add_course_docs(held_course_docs.add, institution_results, version)
+
+            logging.info(f"Adding sector salaries to {course_count} held courses")
+            builder.set_sector_salaries(get_sector_salaries())
+            for course_doc in held_course_docs:
+                try:
+                    builder.add_sector_salaries(course_doc)
+                except Exception as e:
+                    course_count -= 1
+                    logging.warning(
+                        f"FAILED: Adding sector salaries for: {course_doc['institution_id']}/"
+                        f"{course_doc['course_id']}/{course_doc['course_mode']}) | end {version}"
+                    )
+                    logging.info(f"Failed error: {e} TRACEBACK: {traceback.format_exc()}")
+                    continue
+                bulk_writer.add(course_doc)
+
+    bulk_writer.flush()
+
+    logging.info(f"Processed {course_count} courses")
+
+
+def add_course_docs(add, institution_results, version):
+    """Logs each course result, passes each built course doc to add and returns how many were built"""
 
     course_count = 0
-    for institution in root.iter("INSTITUTION"):
+    for pub_ukprn, course_results in institution_results:
+        logging.info(f"Ingesting course for: ({pub_ukprn})")
+        for course_ids, course_doc, error in course_results:
+            ukprn, course_id, course_mode = course_ids
+            logging.info(f"COURSE COUNT: {course_count}")
+            logging.info(
+                f"Ingesting course for: {pub_ukprn}/{course_id}/{course_mode}) | start {version}")
+            if error is None:
+                add(course_doc)
+                logging.info(f"FINISHED COUNT: {course_count}")
+                course_count += 1
+            else:
+                e, tb = error
+                logging.warning(f"FAILED AT COUNT: {course_count}")
+                logging.warning(f"FAILED: Ingesting course for: {pub_ukprn}/{course_id}/{course_mode}) | end {version}")
+                exception_text = f"Failed error: {e} when creating the course document for course with institution_id: {ukprn} course_id: {course_id} course_mode: {course_mode} TRACEBACK: {tb}"
+                logging.info(exception_text)
+
+    return course_count
+
+
+class HeldCourseDocs:
+    """Course docs held in a compressed temporary file until their sector salaries can be added"""
+
+    def __init__(self):
+        self.temporary_file = tempfile.TemporaryFile()
+        self.held_file = gzip.GzipFile(fileobj=self.temporary_file, mode="wb", compresslevel=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.held_file.close()
+        self.temporary_file.close()
+
+    def add(self, course_doc):
+        self.held_file.write(json.dumps(course_doc).encode("utf-8") + b"\n")
+
+    def __iter__(self):
+        """Yields the held course docs in the order they were added"""
+        self.held_file.close()
+        self.temporary_file.seek(0)
+        with gzip.GzipFile(fileobj=self.temporary_file, mode="rb") as held_file:
+            for line in held_file:
+                yield json.loads(line)
+
+
+def get_course_doc_workers():
+    """Returns the number of processes to build course docs with, 1 builds them in this process"""
+    return max(1, int(os.environ.get("EtlCourseDocWorkers", "1")))
+
+
+class CourseDocBuilder:
+    """Builds the enriched course docs for an institution.
+
+    Holds the read-only lookups and enrichers so they are set up once per
+    run, or once per worker process when building in a pool.
+    """
+
+    def __init__(self, root, version, enricher, subject_enricher, qualification_enricher):
+        self.version = version
+        self.enricher = enricher
+        self.subject_enricher = subject_enricher
+        self.qualification_enricher = qualification_enricher
+
+        # Import accreditations, common, kisaims and location nodes,
+        # visiting the top level of the document once for all of them
+        reference_sections = ReferenceSections(root)
+        self.accreditations = Accreditations(reference_sections)
+        self.kisaims = KisAims(reference_sections)
+        self.locations = Locations(reference_sections)
+
+        # SECTORSAL usually follows the institutions, so the courses are
+        # built without their sector salaries until it has been read
+        self.sector_salaries_pending = reference_sections.find("SECTORSAL") is None
+        self.go_sector_salaries = None
+        self.leo3_sector_salaries = None
+        self.leo5_sector_salaries = None
+        if not self.sector_salaries_pending:
+            self.set_sector_salaries(root)
+
+        # The institution fragments include the UKRLP names, so courses
+        # are not passed through the UKRLP enricher separately
+        self.fragments = CourseFragments(enricher)
+
+    def set_sector_salaries(self, root):
+        """Builds the sector salary lookups from reference data that includes SECTORSAL"""
+        reference_sections = ReferenceSections(root)
+        self.go_sector_salaries = GOSectorSalaries(reference_sections)
+        self.leo3_sector_salaries = LEO3SectorSalaries(reference_sections)
+        self.leo5_sector_salaries = LEO5SectorSalaries(reference_sections)
+
+    def add_sector_salaries(self, course_doc):
+        """Adds the sector salaries to a course doc built before SECTORSAL was read"""
+        add_sector_salaries(
+            course_doc["course"],
+            course_doc["course_mode"],
+            course_doc["course_level"],
+            self.go_sector_salaries,
+            self.leo3_sector_salaries,
+            self.leo5_sector_salaries,
+            self.subject_enricher,
+        )
+
+    def build_institution(self, institution):
+        """Returns the institution's PUBUKPRN and a result for each of its courses.
 
-        raw_inst_data = xmltodict.parse(ET.tostring(institution))[
-            "INSTITUTION"
-        ]
+        Each course result is ((ukprn, course_id, course_mode), course_doc, error),
+        where error is None or the exception message and traceback.
+        """
+
+        raw_inst_data = element_to_dict(institution)
+        self.fragments.start_institution()
 
         ukprn = raw_inst_data["UKPRN"]
-        logging.info(f"Ingesting course for: ({raw_inst_data['PUBUKPRN']})")
+        course_results = []
         for course in institution.findall("KISCOURSE"):
-            raw_course_data = xmltodict.parse(ET.tostring(course))["KISCOURSE"]
+            raw_course_data = element_to_dict(course)
             raw_course_data['KISMODE'] = str(int(raw_course_data['KISMODE']))
             raw_course_data['KISLEVEL'] = str(int(raw_course_data['KISLEVEL']))
-            logging.info(f"COURSE COUNT: {course_count}")
-            logging.info(
-                f"Ingesting course for: {raw_inst_data['PUBUKPRN']}/{raw_course_data['KISCOURSEID']}/{raw_course_data['KISMODE']}) | start {version}")
+            course_ids = (ukprn, raw_course_data["KISCOURSEID"], raw_course_data["KISMODE"])
             try:
                 locids = get_locids(raw_course_data, ukprn)
                 course_doc = get_course_doc(
-                    accreditations,
-                    locations,
+                    self.accreditations,
+                    self.locations,
                     locids,
                     raw_inst_data,
                     raw_course_data,
-                    kisaims,
-                    version,
-                    go_sector_salaries,
-                    leo3_sector_salaries,
-                    leo5_sector_salaries,
-                    g_subject_enricher
+                    self.kisaims,
+                    self.version,
+                    self.go_sector_salaries,
+                    self.leo3_sector_salaries,
+                    self.leo5_sector_salaries,
+                    self.subject_enricher,
+                    self.fragments,
                 )
-                enricher.enrich_course(course_doc)
-                subject_enricher.enrich_course(course_doc)
-                qualification_enricher.enrich_course(course_doc)
-                new_docs.append(course_doc)
-                sproc_count += 1
-                logging.info(f"FINISHED COUNT: {course_count}")
-                course_count += 1
-
-                if sproc_count >= 5:
-                    logging.info(f"Begining execution of stored procedure for {sproc_count} documents")
-                    container.scripts.execute_stored_procedure(
-                        sproc="bulkImport",
-                        partition_key=str(version),
-                        params=[new_docs]
-                    )
-                    logging.info(f"Successfully loaded another {sproc_count} documents")
-                    # Reset values
-                    new_docs = []
-                    sproc_count = 0
+                self.subject_enricher.enrich_course(course_doc)
+                self.qualification_enricher.enrich_course(course_doc)
+                course_results.append((course_ids, course_doc, None))
             except Exception as e:
-                logging.warning(f"FAILED AT COUNT: {course_count}")
-                logging.warning(f"FAILED: Ingesting course for: {raw_inst_data['PUBUKPRN']}/{raw_course_data['KISCOURSEID']}/{raw_course_data['KISMODE']}) | end {version}")
-                institution_id = raw_inst_data["UKPRN"]
-                course_id = raw_course_data["KISCOURSEID"]
-                course_mode = raw_course_data["KISMODE"]
-                tb = traceback.format_exc()
-                exception_text = f"Failed error: {e} when creating the course document for course with institution_id: {institution_id} course_id: {course_id} course_mode: {course_mode} TRACEBACK: {tb}"
-                logging.info(exception_text)
+                course_results.append((course_ids, None, (str(e), traceback.format_exc())))
 
+        return raw_inst_data["PUBUKPRN"], course_results
 
-    if sproc_count > 0:
-        logging.info(f"Begining execution of stored procedure for {sproc_count} documents")
-        container.scripts.execute_stored_procedure(
-            sproc="bulkImport",
-            partition_key=str(version),
-            params=[new_docs]
-        )
-        logging.info(f"Successfully loaded another {sproc_count} documents")
-        # Reset values
-        new_docs = []
-        sproc_count = 0
 
-    logging.info(f"Processed {course_count} courses")
+_course_doc_builder = None
+
+
+def init_course_doc_worker(builder):
+    """Pool initializer that keeps the run's CourseDocBuilder for the worker
+
+    The subject lookups sent with the builder are shared with the statistics
+    labels, so the worker does not fetch the subjects collection again.
+    """
+    global _course_doc_builder
+    _course_doc_builder = builder
+    add_subject_lookups(builder.version, builder.subject_enricher.subject_lookups)
+    set_stats_subject_version(builder.version)
+
+
+def build_serialised_institution(institution_xml):
+    """Builds the course docs for an INSTITUTION element serialised by the parent"""
+    return _course_doc_builder.build_institution(ET.fromstring(institution_xml))
+
+
+def imap_ordered(pool, func, items, max_pending):
+    """Like pool.imap, but only reads ahead max_pending items from the iterable.
+
+    pool.imap drains its input straight away, which would pull the whole
+    HESA stream into memory when the workers fall behind the parser.
+    """
+
+    pending = deque()
+    for item in items:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
 
 
 def get_locids(raw_course_data, ukprn):
@@ -195,8 +429,12 @@ def get_course_doc(
         go_sector_salaries,
         leo3_sector_salaries,
         leo5_sector_salaries,
-        g_subject_enricher
+        g_subject_enricher,
+        fragments=None,
 ):
+    if fragments is None:
+        fragments = CourseFragments()
+
     outer_wrapper = {}
     outer_wrapper["_id"] = utils.get_uuid()
     outer_wrapper["created_at"] = datetime.datetime.utcnow().isoformat()
@@ -213,12 +451,12 @@ def get_course_doc(
 
     if "ACCREDITATION" in raw_course_data:
         course["accreditations"] = get_accreditations(
-            raw_course_data, accreditations
+            raw_course_data, accreditations, fragments
         )
 
     if "UKPRNAPPLY" in raw_course_data:
         course["application_provider"] = raw_course_data["UKPRNAPPLY"]
-    country = get_country(raw_inst_data)
+    country = fragments.get_country(raw_inst_data)
     if country:
         course["country"] = country
     distance_learning = get_code_label_entry(
@@ -233,7 +471,7 @@ def get_course_doc(
         course["foundation_year_availability"] = foundation_year
     if "HONOURS" in raw_course_data:
         course["honours_award_provision"] = int(raw_course_data["HONOURS"])
-    course["institution"] = get_institution(raw_inst_data)
+    course["institution"] = fragments.get_institution(raw_inst_data)
     course["kis_course_id"] = raw_course_data["KISCOURSEID"]
 
     # Handle the institution-level Earnings data.
@@ -260,11 +498,13 @@ def get_course_doc(
     )
     if length_of_course:
         course["length_of_course"] = length_of_course
-    links = get_links(raw_inst_data, raw_course_data)
+    links = get_links(
+        raw_inst_data, raw_course_data, fragments.get_institution_links(raw_inst_data)
+    )
     if links:
         course["links"] = links
     location_items = get_location_items(
-        locations, locids, raw_course_data, raw_inst_data["PUBUKPRN"]
+        locations, locids, raw_course_data, raw_inst_data["PUBUKPRN"], fragments
     )
     if location_items:
         course["locations"] = location_items
@@ -312,14 +552,40 @@ def get_course_doc(
         raw_course_data, course["country"]["code"]
     )
 
+    # The sector salaries are added later when SECTORSAL has not been read yet
+    if go_sector_salaries is not None:
+        add_sector_salaries(
+            course,
+            outer_wrapper["course_mode"],
+            outer_wrapper["course_level"],
+            go_sector_salaries,
+            leo3_sector_salaries,
+            leo5_sector_salaries,
+            g_subject_enricher,
+        )
+
+    outer_wrapper["course"] = course
+    return outer_wrapper
+
+
+def add_sector_salaries(
+        course,
+        course_mode,
+        course_level,
+        go_sector_salaries,
+        leo3_sector_salaries,
+        leo5_sector_salaries,
+        g_subject_enricher,
+):
+    """Adds the sector-level earnings data for a course to its course object"""
     # Extract the appropriate sector-level earnings data for the current course.
     go_sector_json_array = get_go_sector_json(
         course["go_salary_inst"],
         course["leo3_inst"],
         course["leo5_inst"],
         go_sector_salaries,
-        outer_wrapper["course_mode"],
-        outer_wrapper["course_level"],
+        course_mode,
+        course_level,
         subject_enricher=g_subject_enricher
     )
     if go_sector_json_array:
@@ -330,8 +596,8 @@ def get_course_doc(
         course["go_salary_inst"],
         course["leo5_inst"],
         leo3_sector_salaries,
-        outer_wrapper["course_mode"],
-        outer_wrapper["course_level"],
+        course_mode,
+        course_level,
         subject_enricher=g_subject_enricher
     )
     if leo3_sector_json_array:
@@ -342,18 +608,18 @@ def get_course_doc(
         course["go_salary_inst"],
         course["leo3_inst"],
         leo5_sector_salaries,
-        outer_wrapper["course_mode"],
-        outer_wrapper["course_level"],
+        course_mode,
+        course_level,
         subject_enricher=g_subject_enricher
     )
     if leo5_sector_json_array:
         course["leo5_salary_sector"] = leo5_sector_json_array
 
-    outer_wrapper["course"] = course
-    return outer_wrapper
 
+def get_accreditations(raw_course_data, acc_lookup, fragments=None):
+    if fragments is None:
+        fragments = CourseFragments()
 
-def get_accreditations(raw_course_data, acc_lookup):
     acc_list = []
     raw_xml_list = SharedUtils.get_raw_list(raw_course_data, "ACCREDITATION")
 
@@ -361,16 +627,7 @@ def get_accreditations(raw_course_data, acc_lookup):
         json_elem = {}
 
         if "ACCTYPE" in xml_elem:
-            json_elem["type"] = xml_elem["ACCTYPE"]
-            accreditations = acc_lookup.get_accreditation_data_for_key(
-                xml_elem["ACCTYPE"]
-            )
-
-            if "ACCURL" in accreditations:
-                json_elem["accreditor_url"] = accreditations["ACCURL"]
-
-            text = get_english_welsh_item("ACCTEXT", accreditations)
-            json_elem["text"] = text
+            json_elem = fragments.get_accreditation(acc_lookup, xml_elem["ACCTYPE"])
 
         if "ACCDEPENDURL" in xml_elem or "ACCDEPENDURLW" in xml_elem:
             urls = get_english_welsh_item("ACCDEPENDURL", xml_elem)
@@ -387,6 +644,19 @@ def get_accreditations(raw_course_data, acc_lookup):
     return acc_list
 
 
+def get_accreditation_type(acc_lookup, acc_type):
+    """Returns the part of an accreditation that depends only on its ACCTYPE"""
+    json_elem = {"type": acc_type}
+    accreditations = acc_lookup.get_accreditation_data_for_key(acc_type)
+
+    if "ACCURL" in accreditations:
+        json_elem["accreditor_url"] = accreditations["ACCURL"]
+
+    text = get_english_welsh_item("ACCTEXT", accreditations)
+    json_elem["text"] = text
+    return json_elem
+
+
 def get_country(raw_inst_data):
     country = {}
     if "COUNTRY" in raw_inst_data:
@@ -401,10 +671,7 @@ def get_go_inst_json(raw_go_inst_data, subject_enricher):
         if isinstance(raw_go_inst_data, dict):
             raw_go_inst_data = [raw_go_inst_data]
 
-        mapper = GoInstitutionMappings(
-            mapping_id="GO",
-            subject_enricher=subject_enricher
-        )
+        mapper = GoInstitutionMappings.get_mapper("GO", subject_enricher)
 
         return mapper.map_xml_to_json_array(
             xml_as_array=raw_go_inst_data,
@@ -424,10 +691,7 @@ def get_leo3_inst_json(raw_leo3_inst_data, subject_enricher) -> List:
         if isinstance(raw_leo3_inst_data, dict):
             raw_leo3_inst_data = [raw_leo3_inst_data]
 
-        mapper = LeoInstitutionMappings(
-            mapping_id="LEO3",
-            subject_enricher=subject_enricher
-        )
+        mapper = LeoInstitutionMappings.get_mapper("LEO3", subject_enricher)
         return mapper.map_xml_to_json_array(
             xml_as_array=raw_leo3_inst_data,
         )
@@ -442,7 +706,7 @@ def get_leo5_inst_json(raw_leo5_inst_data,subject_enricher):
         if isinstance(raw_leo5_inst_data, dict):
             raw_leo5_inst_data = [raw_leo5_inst_data]
 
-        mapper = LeoInstitutionMappings("LEO5", subject_enricher=subject_enricher)
+        mapper = LeoInstitutionMappings.get_mapper("LEO5", subject_enricher)
         return mapper.map_xml_to_json_array(
             xml_as_array=raw_leo5_inst_data,
         )
@@ -458,10 +722,7 @@ def get_go_voice_work_json(raw_go_voice_work_data, subject_enricher):
     if raw_go_voice_work_data:
         if isinstance(raw_go_voice_work_data, dict):
             raw_go_voice_work_data = [raw_go_voice_work_data]
-        mapper = GoVoiceMappings(
-            mapping_id="GO",
-            subject_enricher=subject_enricher
-        )
+        mapper = GoVoiceMappings.get_mapper("GO", subject_enricher)
         return mapper.map_xml_to_json_array(
             xml_as_array=raw_go_voice_work_data,
         )
@@ -487,28 +748,43 @@ def get_institution(raw_inst_data):
     }
 
 
-def get_links(raw_inst_data, raw_course_data):
+def get_links(raw_inst_data, raw_course_data, institution_links=None):
     links = {}
 
     item_details = [
-        ("ASSURL", "assessment_method", raw_course_data),
-        ("CRSECSTURL", "course_cost", raw_course_data),
-        ("CRSEURL", "course_page", raw_course_data),
-        ("EMPLOYURL", "employment_details", raw_course_data),
-        ("SUPPORTURL", "financial_support_details", raw_course_data),
-        ("LTURL", "learning_and_teaching_methods", raw_course_data),
-        ("SUURL", "student_union", raw_inst_data),
+        ("ASSURL", "assessment_method"),
+        ("CRSECSTURL", "course_cost"),
+        ("CRSEURL", "course_page"),
+        ("EMPLOYURL", "employment_details"),
+        ("SUPPORTURL", "financial_support_details"),
+        ("LTURL", "learning_and_teaching_methods"),
     ]
 
     for item_detail in item_details:
-        link_item = get_english_welsh_item(item_detail[0], item_detail[2])
+        link_item = get_english_welsh_item(item_detail[0], raw_course_data)
         if link_item:
             links[item_detail[1]] = link_item
 
+    if institution_links is None:
+        institution_links = get_institution_links(raw_inst_data)
+    links.update(institution_links)
+
+    return links
+
+
+def get_institution_links(raw_inst_data):
+    """Returns the links that are the same for every course at an institution"""
+    links = {}
+    student_union = get_english_welsh_item("SUURL", raw_inst_data)
+    if student_union:
+        links["student_union"] = student_union
     return links
 
 
-def get_location_items(locations, locids, raw_course_data, pub_ukprn):
+def get_location_items(locations, locids, raw_course_data, pub_ukprn, fragments=None):
+    if fragments is None:
+        fragments = CourseFragments()
+
     location_items = []
     if "COURSELOCATION" not in raw_course_data:
         return location_items
@@ -528,38 +804,89 @@ def get_location_items(locations, locids, raw_course_data, pub_ukprn):
             item[lookup_key] = course_location["UCASCOURSEID"]
 
     for locid in locids:
-        location_dict = {}
-        raw_location_data = locations.get_location_data_for_key(locid)
+        location_dict = fragments.get_location(locations, locid)
 
-        if raw_location_data is None:
-            logging.warning(f"failed to find location data in lookup table")
+        if locid in item:
+            location_dict["ucas_course_id"] = item[locid]
 
-        links, accommodation, student_union = {}, {}, {}
-        accommodation = get_english_welsh_item("ACCOMURL", raw_location_data)
-        if accommodation:
-            links["accommodation"] = accommodation
+        location_items.append(location_dict)
+    return location_items
 
-        student_union = get_english_welsh_item("SUURL", raw_location_data)
-        if student_union:
-            links["student_union"] = student_union
 
-        if links:
-            location_dict["links"] = links
+def get_location_item(locations, locid):
+    """Returns the part of a course location that depends only on the location"""
+    location_dict = {}
+    raw_location_data = locations.get_location_data_for_key(locid)
 
-        if "LATITUDE" in raw_location_data:
-            location_dict["latitude"] = raw_location_data["LATITUDE"]
-        if "LONGITUDE" in raw_location_data:
-            location_dict["longitude"] = raw_location_data["LONGITUDE"]
+    if raw_location_data is None:
+        logging.warning(f"failed to find location data in lookup table")
 
-        name = get_english_welsh_item("LOCNAME", raw_location_data)
-        if name:
-            location_dict["name"] = name
+    links, accommodation, student_union = {}, {}, {}
+    accommodation = get_english_welsh_item("ACCOMURL", raw_location_data)
+    if accommodation:
+        links["accommodation"] = accommodation
 
-        if locid in item:
-            location_dict["ucas_course_id"] = item[locid]
+    student_union = get_english_welsh_item("SUURL", raw_location_data)
+    if student_union:
+        links["student_union"] = student_union
 
-        location_items.append(location_dict)
-    return location_items
+    if links:
+        location_dict["links"] = links
+
+    if "LATITUDE" in raw_location_data:
+        location_dict["latitude"] = raw_location_data["LATITUDE"]
+    if "LONGITUDE" in raw_location_data:
+        location_dict["longitude"] = raw_location_data["LONGITUDE"]
+
+    name = get_english_welsh_item("LOCNAME", raw_location_data)
+    if name:
+        location_dict["name"] = name
+
+    return location_dict
+
+
+class CourseFragments:
+    """The fragment caches used while building course docs
+
+    The institution (with its UKRLP names when an enricher is given), its
+    country and its student union link are cached until start_institution
+    is called for the next institution. Course locations, keyed on LOCID and
+    UKPRN, and the ACCTYPE part of accreditations are cached for the run.
+    """
+
+    def __init__(self, enricher=None):
+        self.enricher = enricher
+        self.institution_cache = FragmentCache("institution")
+        self.location_cache = FragmentCache("location")
+        self.accreditation_cache = FragmentCache("accreditation")
+
+    def start_institution(self):
+        self.institution_cache.clear()
+
+    def get_institution(self, raw_inst_data):
+        return self.institution_cache.get("institution", self.build_institution, raw_inst_data)
+
+    def build_institution(self, raw_inst_data):
+        institution = get_institution(raw_inst_data)
+        if self.enricher is not None:
+            self.enricher.enrich_institution(institution)
+        return institution
+
+    def get_country(self, raw_inst_data):
+        return self.institution_cache.get("country", get_country, raw_inst_data)
+
+    def get_institution_links(self, raw_inst_data):
+        return self.institution_cache.get("links", get_institution_links, raw_inst_data)
+
+    def get_location(self, locations, locid):
+        return self.location_cache.get(locid, get_location_item, locations, locid)
+
+    def get_accreditation(self, acc_lookup, acc_type):
+        return self.accreditation_cache.get(acc_type, get_accreditation_type, acc_lookup, acc_type)
+
+    def log_stats(self):
+        for cache in (self.institution_cache, self.location_cache, self.accreditation_cache):
+            cache.log_stats()
 
 
 def process_stats(
@@ -614,7 +941,7 @@ def get_go_sector_json(
         salary_lookup=go_sector_salary_lookup
     )
 
-    mapper = GoSalaryMappings("GO", subject_enricher)
+    mapper = GoSalaryMappings.get_mapper("GO", subject_enricher)
     return mapper.map_xml_to_json_array(
         xml_as_array=go_salary_sector_xml_array,
     )
@@ -638,7 +965,7 @@ def get_leo3_sector_json(
         salary_lookup=leo3_sector_salary_lookup
     )
 
-    mapper = LeoSectorMappings("LEO3", subject_enricher)
+    mapper = LeoSectorMappings.get_mapper("LEO3", subject_enricher)
     return mapper.map_xml_to_json_array(
         xml_as_array=leo3_sector_xml_array,
     )
@@ -662,7 +989,7 @@ def get_leo5_sector_json(
         salary_lookup=leo5_sector_salary_lookup
     )
 
-    mapper = LeoSectorMappings("LEO5", subject_enricher)
+    mapper = LeoSectorMappings.get_mapper("LEO5", subject_enricher)
     return mapper.map_xml_to_json_array(
         xml_as_array=leo5_sector_xml_array,
     )
@@ -1,47 +1,80 @@
 """Data extraction and transformation for statistical data."""
 
-import json
 import logging
-import os
 from collections import OrderedDict
 from typing import Any
 from typing import Optional
 from typing import Tuple
 
-import unicodedata
-
-from EtlPipeline.validators import validate_agg
+from EtlPipeline import unavailable_messages
+from EtlPipeline.lookups import get_lookup
+from EtlPipeline.lookups import get_stats_subject_lookups
 from EtlPipeline.validators import validate_unavailable_reason_code
-from SharedCode.dataset_helper import DataSetHelper
-from SharedCode.utils import get_subject_lookups
 
 
 def get_stats(raw_course_data, country_code=None):
-    continuation = Continuation()
-    employment = Employment()
-    entry = Entry()
-    job_type = JobType()
-    job_list = JobList()
-    nhs_nss = NhsNss()
-    nss = Nss()
-    tariff = Tariff()
-
-    stats = {}
-    stats["continuation"] = continuation.get_stats(raw_course_data)
-    stats["employment"] = employment.get_stats(raw_course_data)
-    stats["entry"] = entry.get_stats(raw_course_data)
-    stats["job_type"] = job_type.get_stats(raw_course_data)
-    stats["job_list"] = job_list.get_stats(raw_course_data)
-    if need_nhs_nss(raw_course_data):
-        stats["nhs_nss"] = nhs_nss.get_stats(raw_course_data)
-    stats["nss"] = nss.get_stats(raw_course_data)
-    stats["tariff"] = tariff.get_stats(raw_course_data)
-    return stats
+    return get_stats_extractor().extract(raw_course_data, country_code)
+
+
+_stats_extractor = None
+
+
+def get_stats_extractor():
+    """Returns the StatsExtractor shared by every course in this process"""
+    global _stats_extractor
+    if _stats_extractor is None:
+        _stats_extractor = StatsExtractor()
+    return _stats_extractor
+
+
+class StatsExtractor:
+    """Builds the statistics section of a course document
+
+    The stat classes, their XML to JSON key tables and the NSS question key
+    sets are set up once here and reused for every course passed to extract.
+    """
+
+    def __init__(self):
+        self.continuation = Continuation()
+        self.employment = Employment()
+        self.entry = Entry()
+        self.job_type = JobType()
+        self.job_list = JobList()
+        self.nhs_nss = NhsNss()
+        self.nss = Nss()
+        self.tariff = Tariff()
+
+    def extract(self, raw_course_data, country_code=None):
+        stats = {}
+        stats["continuation"] = self.continuation.get_stats(raw_course_data)
+        stats["employment"] = self.employment.get_stats(raw_course_data)
+        stats["entry"] = self.entry.get_stats(raw_course_data)
+        stats["job_type"] = self.job_type.get_stats(raw_course_data)
+        stats["job_list"] = self.job_list.get_stats(raw_course_data)
+        if need_nhs_nss(raw_course_data):
+            stats["nhs_nss"] = self.nhs_nss.get_stats(raw_course_data)
+        stats["nss"] = self.nss.get_stats(raw_course_data)
+        stats["tariff"] = self.tariff.get_stats(raw_course_data)
+        return stats
 
 
 class Continuation:
     """Extracts and transforms the Continuation course element"""
 
+    KEYS = {
+        "CONTUNAVAILREASON": "unavailable",
+        "CONTPOP": "number_of_students",
+        "CONTAGG": "aggregation_level",
+        "CONTAGGYEAR": "aggregation_year",
+        "CONTYEAR1": "aggregation_year_1",
+        "CONTSBJ": "subject",
+        "UCONT": "continuing_with_provider",
+        "UDORMANT": "dormant",
+        "UGAINED": "gained",
+        "ULEFT": "left",
+        "ULOWER": "lower",
+    }
+
     def __init__(self):
         self.xml_element_key = "CONTINUATION"
         self.xml_subj_key = "CONTSBJ"
@@ -57,27 +90,34 @@ class Continuation:
 
     @staticmethod
     def get_key(xml_key):
-        return {
-            "CONTUNAVAILREASON": "unavailable",
-            "CONTPOP": "number_of_students",
-            "CONTAGG": "aggregation_level",
-            "CONTAGGYEAR": "aggregation_year",
-            "CONTYEAR1": "aggregation_year_1",
-            "CONTSBJ": "subject",
-            "UCONT": "continuing_with_provider",
-            "UDORMANT": "dormant",
-            "UGAINED": "gained",
-            "ULEFT": "left",
-            "ULOWER": "lower",
-        }.get(xml_key)
+        return Continuation.KEYS.get(xml_key)
 
     def get_stats(self, raw_course_data):
-        return self.shared_utils.get_json_list(raw_course_data, self.get_key)
+        return self.shared_utils.get_json_list(raw_course_data, self.KEYS.get)
 
 
 class Employment:
     """Extracts and transforms the Employment course element"""
 
+    KEYS = {
+        "EMPUNAVAILREASON": "unavailable",
+        "EMPPOP": "number_of_students",
+        "EMPRESPONSE": "response_not_used",
+        "EMPSAMPLE": "sample_not_used",
+        "EMPRESP_RATE": "response_rate",
+        "EMPAGG": "aggregation_level",
+        "EMPAGGYEAR": "aggregation_year",
+        "EMPYEAR1": "aggregation_year_1",
+        "EMPSBJ": "subject",
+        "WORKSTUDY": "in_work_or_study",
+        "PREVWORKSTUD": "unemp_prev_emp_since_grad",
+        "STUDY": "doing_further_study",
+        "UNEMP": "unemp_not_work_since_grad",
+        "BOTH": "in_work_and_study",
+        "NOAVAIL": "other",
+        "WORK": "in_work",
+    }
+
     def __init__(self):
         self.xml_element_key = "EMPLOYMENT"
         self.xml_subj_key = "EMPSBJ"
@@ -93,32 +133,34 @@ class Employment:
 
     @staticmethod
     def get_key(xml_key):
-        return {
-            "EMPUNAVAILREASON": "unavailable",
-            "EMPPOP": "number_of_students",
-            "EMPRESPONSE": "response_not_used",
-            "EMPSAMPLE": "sample_not_used",
-            "EMPRESP_RATE": "response_rate",
-            "EMPAGG": "aggregation_level",
-            "EMPAGGYEAR": "aggregation_year",
-            "EMPYEAR1": "aggregation_year_1",
-            "EMPSBJ": "subject",
-            "WORKSTUDY": "in_work_or_study",
-            "PREVWORKSTUD": "unemp_prev_emp_since_grad",
-            "STUDY": "doing_further_study",
-            "UNEMP": "unemp_not_work_since_grad",
-            "BOTH": "in_work_and_study",
-            "NOAVAIL": "other",
-            "WORK": "in_work",
-        }.get(xml_key)
+        return Employment.KEYS.get(xml_key)
 
     def get_stats(self, raw_course_data):
-        return self.shared_utils.get_json_list(raw_course_data, self.get_key)
+        return self.shared_utils.get_json_list(raw_course_data, self.KEYS.get)
 
 
 class Entry:
     """Extracts and transforms the Entry course element"""
 
+    KEYS = {
+        "ENTUNAVAILREASON": "unavailable",
+        "ENTPOP": "number_of_students",
+        "ENTRESPONSE": "response_not_used",
+        "ENTSAMPLE": "sample_not_used",
+        "ENTAGG": "aggregation_level",
+        "ENTAGGYEAR": "aggregation_year",
+        "ENTYEAR1": "aggregation_year_1",
+        "ENTSBJ": "subject",
+        "ACCESS": "access",
+        "ALEVEL": "a-level",
+        "BACC": "baccalaureate",
+        "DEGREE": "degree",
+        "FOUNDTN": "foundation",
+        "NOQUALS": "none",
+        "OTHER": "other_qualifications",
+        "OTHERHE": "another_higher_education_qualifications",
+    }
+
     def __init__(self):
         self.xml_element_key = "ENTRY"
         self.xml_subj_key = "ENTSBJ"
@@ -134,32 +176,30 @@ class Entry:
 
     @staticmethod
     def get_key(xml_key):
-        return {
-            "ENTUNAVAILREASON": "unavailable",
-            "ENTPOP": "number_of_students",
-            "ENTRESPONSE": "response_not_used",
-            "ENTSAMPLE": "sample_not_used",
-            "ENTAGG": "aggregation_level",
-            "ENTAGGYEAR": "aggregation_year",
-            "ENTYEAR1": "aggregation_year_1",
-            "ENTSBJ": "subject",
-            "ACCESS": "access",
-            "ALEVEL": "a-level",
-            "BACC": "baccalaureate",
-            "DEGREE": "degree",
-            "FOUNDTN": "foundation",
-            "NOQUALS": "none",
-            "OTHER": "other_qualifications",
-            "OTHERHE": "another_higher_education_qualifications",
-        }.get(xml_key)
+        return Entry.KEYS.get(xml_key)
 
     def get_stats(self, raw_course_data):
-        return self.shared_utils.get_json_list(raw_course_data, self.get_key)
+        return self.shared_utils.get_json_list(raw_course_data, self.KEYS.get)
 
 
 class JobType:
     """Extracts and transforms the JobType course element"""
 
+    KEYS = {
+        "JOBUNAVAILREASON": "unavailable",
+        "JOBPOP": "number_of_students",
+        "JOBRESPONSE": "response_not_used",
+        "JOBSAMPLE": "sample_not_used",
+        "JOBAGG": "aggregation_level",
+        "JOBAGGYEAR": "aggregation_year",
+        "JOBYEAR1": "aggregation_year_1",
+        "JOBSBJ": "subject",
+        "JOBRESP_RATE": "response_rate",
+        "PROFMAN": "professional_or_managerial_jobs",
+        "OTHERJOB": "non_professional_or_managerial_jobs",
+        "UNKWN": "unknown_professions",
+    }
+
     def __init__(self):
         self.xml_element_key = "JOBTYPE"
         self.xml_subj_key = "JOBSBJ"
@@ -175,23 +215,10 @@ class JobType:
 
     @staticmethod
     def get_key(xml_key):
-        return {
-            "JOBUNAVAILREASON": "unavailable",
-            "JOBPOP": "number_of_students",
-            "JOBRESPONSE": "response_not_used",
-            "JOBSAMPLE": "sample_not_used",
-            "JOBAGG": "aggregation_level",
-            "JOBAGGYEAR": "aggregation_year",
-            "JOBYEAR1": "aggregation_year_1",
-            "JOBSBJ": "subject",
-            "JOBRESP_RATE": "response_rate",
-            "PROFMAN": "professional_or_managerial_jobs",
-            "OTHERJOB": "non_professional_or_managerial_jobs",
-            "UNKWN": "unknown_professions",
-        }.get(xml_key)
+        return JobType.KEYS.get(xml_key)
 
     def get_stats(self, raw_course_data):
-        return self.shared_utils.get_json_list(raw_course_data, self.get_key)
+        return self.shared_utils.get_json_list(raw_course_data, self.KEYS.get)
 
 
 class JobList:
@@ -237,6 +264,7 @@ class JobList:
         self.data_fields_lookup = self.shared_utils.get_lookup(
             "common_data_fields"
         )
+        self.data_fields = SharedUtils.get_data_fields(self.data_fields_lookup)
 
     def get_stats(self, raw_course_data):
         """Extracts and transforms the COMMON entries in a KISCOURSE"""
@@ -259,16 +287,14 @@ class JobList:
     def get_json_data(self, xml_elem):
         """Extracts and transforms a COMMON entry with data in a KISCOURSE"""
 
-        lookup = self.data_fields_lookup
         json_data = {}
-        for xml_key in lookup:
-            if lookup[xml_key][1] == "M":
-                json_data[
-                    lookup[xml_key][0]
-                ] = self.shared_utils.get_json_value(xml_elem.get(xml_key))
+        for xml_key, json_key, mandatory in self.data_fields:
+            if mandatory:
+                json_data[json_key] = self.shared_utils.get_json_value(
+                    xml_elem.get(xml_key)
+                )
             else:
                 if xml_key in xml_elem:
-                    json_key = lookup.get(xml_key, [])[0]
                     if json_key == "subject":
                         json_data[json_key] = self.shared_utils.get_subject(
                             xml_elem
@@ -305,6 +331,7 @@ class Nss:
     """Extracts and transforms the NSS course element"""
 
     NUM_QUESTIONS = 28
+    QUESTION_KEYS = frozenset(f"Q{i}" for i in range(1, NUM_QUESTIONS + 1))
 
     def __init__(self):
         self.xml_element_key = "NSS"
@@ -318,9 +345,8 @@ class Nss:
         self.nss_data_fields_lookup = self.shared_utils.get_lookup(
             "nss_data_fields"
         )
-        self.is_question_lookup = [
-            f"Q{i}" for i in range(1, Nss.NUM_QUESTIONS + 1)
-        ]
+        self.data_fields = SharedUtils.get_data_fields(self.nss_data_fields_lookup)
+        self.is_question_lookup = Nss.QUESTION_KEYS
 
     def is_question(self, xml_key):
         # print("xml_key:", xml_key)
@@ -340,19 +366,17 @@ class Nss:
         return self.shared_utils.get_json_value(xml_elem.get(xml_key))
 
     def get_json_data(self, xml_elem):
-        lookup = self.nss_data_fields_lookup
         json_data = dict()
-        for xml_key in lookup:
-            if lookup[xml_key][1] == "M":
+        for xml_key, json_key, mandatory in self.data_fields:
+            if mandatory:
                 try:
-                    json_data[lookup[xml_key][0]] = self.get_mandatory_field(
+                    json_data[json_key] = self.get_mandatory_field(
                         xml_elem, xml_key
                     )
                 except KeyError as e:
                     logging.info("this institution has no nss data except unavailable reason")
             else:
                 if xml_key in xml_elem:
-                    json_key = lookup.get(xml_key)[0]
                     if json_key == "subject":
                         json_data[json_key] = self.shared_utils.get_subject(
                             xml_elem
@@ -435,6 +459,7 @@ class NhsNss:
     """Extracts and transforms the NHS NSS course element"""
 
     NUM_QUESTIONS = 6
+    QUESTION_KEYS = frozenset(f"NHSQ{i}" for i in range(1, NUM_QUESTIONS + 1))
 
     def __init__(self):
         self.xml_element_key = "NHSNSS"
@@ -448,9 +473,8 @@ class NhsNss:
         self.data_fields_lookup = self.shared_utils.get_lookup(
             "nhs_data_fields"
         )
-        self.is_question_lookup = [
-            f"NHSQ{i}" for i in range(1, NhsNss.NUM_QUESTIONS + 1)
-        ]
+        self.data_fields = SharedUtils.get_data_fields(self.data_fields_lookup)
+        self.is_question_lookup = NhsNss.QUESTION_KEYS
 
     def is_question(self, xml_key):
         return xml_key in self.is_question_lookup
@@ -469,16 +493,14 @@ class NhsNss:
         return self.shared_utils.get_json_value(xml_elem.get(xml_key))
 
     def get_json_data(self, xml_elem):
-        lookup = self.data_fields_lookup
         json_data = dict()
-        for xml_key in lookup:
-            if lookup.get(xml_key)[1] == "M":
-                json_data[lookup[xml_key][0]] = self.get_mandatory_field(
+        for xml_key, json_key, mandatory in self.data_fields:
+            if mandatory:
+                json_data[json_key] = self.get_mandatory_field(
                     xml_elem, xml_key
                 )
             else:
                 if xml_key in xml_elem:
-                    json_key = lookup.get(xml_key)[0]
                     if json_key == "subject":
                         json_data[json_key] = self.shared_utils.get_subject(
                             xml_elem
@@ -528,6 +550,7 @@ class Tariff:
         self.tariff_description_lookup = self.shared_utils.get_lookup(
             "tariff_description"
         )
+        self.tariff_descriptions = tuple(self.tariff_description_lookup.items())
 
     def get_tariff_description(self, xml_key):
         return self.tariff_description_lookup.get(xml_key)
@@ -536,10 +559,10 @@ class Tariff:
         return [
             {
                 "code": xml_key,
-                "description": self.get_tariff_description(xml_key),
+                "description": description,
                 "entrants": int(xml_elem.get(xml_key, 0)),
             }
-            for xml_key in self.tariff_description_lookup.keys()
+            for xml_key, description in self.tariff_descriptions
         ]
 
     def get_json_data(self, xml_elem):
@@ -579,17 +602,6 @@ class Tariff:
 class SharedUtils:
     """Functionality required by several stats related classes"""
 
-    try:
-        dsh = DataSetHelper()  # TODO: warning presented as dsh wasn't assigned, but the catch all
-        # Exception below would have masked this - leading to no subject codes.
-        version = dsh.get_latest_version_number()
-        subj_codes = get_subject_lookups(version)
-        logging.info("Using database subject codes.")
-
-    except Exception:
-        logging.info("Using local subject codes.")
-        subj_codes = {}
-
     def __init__(
             self,
             xml_element_key,
@@ -609,27 +621,7 @@ class SharedUtils:
 
     @staticmethod
     def get_lookup(lookup_name):
-        cwd = os.path.dirname(os.path.abspath(__file__))
-        filename = {
-            "subj_code_english": "subj_code_english.json",
-            "subj_code_welsh": "subj_code_welsh.json",
-            "unavail_reason_english": "unavailreason_english.json",
-            "unavail_reason_welsh": "unavailreason_welsh.json",
-            "tariff_description": "tariff_description.json",
-            # "salary_data_fields": "salary_data_fields.json",
-            "nss_question_description": "nss_question_description.json",
-            "nss_data_fields": "nss_data_fields.json",
-            "nhs_question_description": "nhs_question_description.json",
-            "nhs_data_fields": "nhs_data_fields.json",
-            # "leo_unavail_reason_english": "leo_unavailreason_english.json",
-            # "leo_unavail_reason_welsh": "leo_unavailreason_welsh.json",
-            # "leo_data_fields": "leo_data_fields.json",
-            "common_data_fields": "common_data_fields.json",
-            "earnings_unavail_reason_english": "earnings_unavailreason_english.json",
-            "earnings_unavail_reason_welsh": "earnings_unavailreason_welsh.json",
-        }.get(lookup_name)
-        with open(os.path.join(cwd, f"lookup_files/{filename}")) as infile:
-            return json.load(infile)
+        return get_lookup(lookup_name)
 
     def get_subject(self, xml_elem):
         subj_key = xml_elem[self.xml_subj_key]
@@ -640,13 +632,15 @@ class SharedUtils:
         return subject
 
     def get_english_sbj_label(self, code):
-        if SharedUtils.subj_codes != {}:
-            return SharedUtils.subj_codes[code].get("english_name")
+        subj_codes = get_stats_subject_lookups()
+        if subj_codes:
+            return subj_codes[code].get("english_name")
         return self.subj_code_english.get(code)
 
     def get_welsh_sbj_label(self, code):
-        if SharedUtils.subj_codes != {}:
-            return SharedUtils.subj_codes[code].get("welsh_name")
+        subj_codes = get_stats_subject_lookups()
+        if subj_codes:
+            return subj_codes[code].get("welsh_name")
         return self.subj_code_welsh.get(code)
 
     def get_json_list(self, raw_course_data, get_key):
@@ -721,35 +715,18 @@ class SharedUtils:
     def get_unavailable_reason_str(
             self, unavail_reason_code, subj_key, agg, xml_elem, resp_rate_state, welsh=False
     ):
-        validate_unavailable_reason_code(unavail_reason_code)
-        if welsh:
-            unavail_reason_lookup = self.unavail_reason_welsh
-        else:
-            unavail_reason_lookup = self.unavail_reason_english
+        # The message is rendered once per distinct set of inputs, see unavailable_messages
+        has_data = self.has_data(xml_elem)
+        subj = None
+        if has_data:
+            if welsh:
+                subj = self.get_unavailable_reason_subj_welsh(subj_key)
+            else:
+                subj = self.get_unavailable_reason_subj_english(subj_key)
 
-        if not self.has_data(xml_elem):
-            reason_str = unavail_reason_lookup["no-data"].get(unavail_reason_code)
-            return unicodedata.normalize("NFKD", reason_str)
-
-        validate_agg(unavail_reason_code, agg, unavail_reason_lookup)
-
-        # if unavail_reason_code == 0 and agg and agg != "14" and agg != "" and agg is not None:
-        #     partial_reason_str = unavail_reason_lookup["data"][unavail_reason_code][agg][resp_rate_state]
-        # elif unavail_reason_code != 0:
-        #     partial_reason_str = unavail_reason_lookup["data"][unavail_reason_code][agg]
-        # The lookup tables do not contain entries for code=0, agg=14 or code=0, agg=None.
-        #    No unavail message needs to be displayed in either of these scenarios.
-        if unavail_reason_code == '0':
-            partial_reason_str = unavail_reason_lookup["data"][unavail_reason_code].get(agg).get(resp_rate_state)
-        else:
-            partial_reason_str = unavail_reason_lookup["data"][unavail_reason_code].get(agg)
-
-        partial_reason_str = unicodedata.normalize("NFKD", partial_reason_str)
-        if welsh:
-            subj = self.get_unavailable_reason_subj_welsh(subj_key)
-        else:
-            subj = self.get_unavailable_reason_subj_english(subj_key)
-        return partial_reason_str.replace("[Subject]", subj)
+        return unavailable_messages.get_unavailable_reason(
+            unavail_reason_code, has_data, agg, resp_rate_state, subj, welsh
+        )
 
     def get_unavailable_reason_subj_english(self, sbj_key):
         if sbj_key:
@@ -766,6 +743,14 @@ class SharedUtils:
         """Returns True if the stats XML element has data otherwise False"""
         return xml_elem is not None and len(xml_elem) > 1
 
+    @staticmethod
+    def get_data_fields(lookup):
+        """Returns (xml_key, json_key, is_mandatory) for each entry of a data fields lookup"""
+        return tuple(
+            (xml_key, json_key, mandatory == "M")
+            for xml_key, (json_key, mandatory) in lookup.items()
+        )
+
     @staticmethod
     def get_json_value(xml_value):
         if xml_value and xml_value.isdigit():
@@ -791,22 +776,4 @@ def need_nhs_nss(course):
 def get_earnings_unavail_text(inst_or_sect, data_source, key_level_3) -> Tuple[str, str]:
     """Returns the relevant unavail reason text in English and Welsh"""
 
-    shared_utils = SharedUtils(
-        data_source,  # xml_element_key
-        "SBJ",
-        "AGG",
-        'UNAVAILREASON',  # xml_unavail_reason_key
-    )
-
-    earnings_unavail_reason_lookup_english = shared_utils.get_lookup(
-        "earnings_unavail_reason_english"
-    )
-    earnings_unavail_reason_lookup_welsh = shared_utils.get_lookup(
-        "earnings_unavail_reason_welsh"
-    )
-
-    unavail_text_english = earnings_unavail_reason_lookup_english[inst_or_sect][data_source][key_level_3]
-    unavail_text_welsh = earnings_unavail_reason_lookup_welsh[inst_or_sect][data_source][key_level_3]
-
-    return unicodedata.normalize("NFKD", unavail_text_english), \
-        unicodedata.normalize("NFKD", unavail_text_welsh)
\ No newline at end of file
+    return unavailable_messages.get_earnings_unavail_text(inst_or_sect, data_source, key_level_3)
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""Memoisation for the parts of course docs that many courses share.
+
+Fragments are JSON-like values (dicts, lists and scalars). A cached
+fragment is never handed out itself: each caller gets its own copy, so a
+course doc can be changed after it is built without touching the cache or
+any other course doc.
+"""
+
+import logging
+
+
+def copy_fragment(fragment):
+    """Returns a copy of a JSON-like fragment, copying every nested dict and list"""
+    if isinstance(fragment, dict):
+        return {key: copy_fragment(value) for key, value in fragment.items()}
+    if isinstance(fragment, list):
+        return [copy_fragment(value) for value in fragment]
+    return fragment
+
+
+class FragmentCache:
+    """Builds each fragment once per key and returns copies of it
+
+    hits and misses count the calls to get that found a cached fragment and
+    the calls that had to build one. clear drops the fragments but keeps the
+    counters, so a cache scoped to one institution can report on the run.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.fragments = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build, *args):
+        try:
+            fragment = self.fragments[key]
+            self.hits += 1
+        except KeyError:
+            fragment = self.fragments[key] = build(*args)
+            self.misses += 1
+        return copy_fragment(fragment)
+
+    def clear(self):
+        self.fragments = {}
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def log_stats(self):
+        logging.info(
+            f"{self.name} fragment cache: {self.hits} hits, {self.misses} misses "
+            f"({self.hit_rate:.0%} hit rate)"
+        )
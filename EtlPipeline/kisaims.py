@@ -1,5 +1,4 @@
-import xmltodict
-import defusedxml.ElementTree as ET
+from SharedCode.utils import element_to_dict
 
 
 class KisAims:
@@ -13,7 +12,7 @@ class KisAims:
 
         self.lookup_dict = {}
         for kisaim in root.iter("KISAIM"):
-            raw_kisaim_data = xmltodict.parse(ET.tostring(kisaim))["KISAIM"]
+            raw_kisaim_data = element_to_dict(kisaim)
             key = f"{raw_kisaim_data['KISAIMCODE']}"
             self.lookup_dict[key] = raw_kisaim_data["KISAIMLABEL"]
 
@@ -1,5 +1,4 @@
-import xmltodict
-import defusedxml.ElementTree as ET
+from SharedCode.utils import element_to_dict
 
 
 class Locations:
@@ -13,9 +12,7 @@ class Locations:
 
         self.lookup_dict = {}
         for location in root.iter("LOCATION"):
-            raw_location_data = xmltodict.parse(ET.tostring(location))[
-                "LOCATION"
-            ]
+            raw_location_data = element_to_dict(location)
             lockey = (
                 f"{raw_location_data.get('LOCID')}{raw_location_data['UKPRN']}"
             )
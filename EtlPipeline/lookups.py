@@ -0,0 +1,161 @@
+"""Process-wide registries for the EtlPipeline lookups.
+
+Each file in EtlPipeline/lookup_files is parsed the first time it is asked
+for and then shared by every caller in the process. The parsed data is
+frozen (dicts become read-only mappings and lists become tuples) so no
+caller can change what another sees.
+
+The subjects collection is fetched from Cosmos DB once per dataset version,
+on first use, and shared the same way.
+"""
+
+import json
+import logging
+import os
+import threading
+from types import MappingProxyType
+
+from SharedCode import utils
+
+LOOKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lookup_files")
+
+LOOKUP_FILES = {
+    "subj_code_english": "subj_code_english.json",
+    "subj_code_welsh": "subj_code_welsh.json",
+    "unavail_reason_english": "unavailreason_english.json",
+    "unavail_reason_welsh": "unavailreason_welsh.json",
+    "tariff_description": "tariff_description.json",
+    "nss_question_description": "nss_question_description.json",
+    "nss_data_fields": "nss_data_fields.json",
+    "nhs_question_description": "nhs_question_description.json",
+    "nhs_data_fields": "nhs_data_fields.json",
+    "common_data_fields": "common_data_fields.json",
+    "earnings_unavail_reason_english": "earnings_unavailreason_english.json",
+    "earnings_unavail_reason_welsh": "earnings_unavailreason_welsh.json",
+}
+
+
+def freeze(value):
+    """Returns a read-only copy of a parsed JSON value"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class LookupRegistry:
+    """Loads each lookup file once and hands out the same frozen copy"""
+
+    def __init__(self, lookup_dir=LOOKUP_DIR):
+        self.lookup_dir = lookup_dir
+        self.lookups = {}
+        self.lock = threading.Lock()
+
+    def get(self, lookup_name):
+        lookup = self.lookups.get(lookup_name)
+        if lookup is None:
+            with self.lock:
+                lookup = self.lookups.get(lookup_name)
+                if lookup is None:
+                    lookup = self.load(lookup_name)
+                    self.lookups[lookup_name] = lookup
+        return lookup
+
+    def load(self, lookup_name):
+        filename = LOOKUP_FILES[lookup_name]
+        with open(os.path.join(self.lookup_dir, filename)) as infile:
+            return freeze(json.load(infile))
+
+    def reload(self):
+        """Discards every loaded lookup so the files are read again on next access"""
+        with self.lock:
+            self.lookups = {}
+
+
+lookup_registry = LookupRegistry()
+
+
+def get_lookup(lookup_name):
+    return lookup_registry.get(lookup_name)
+
+
+def reload_lookups():
+    lookup_registry.reload()
+
+
+
+class SubjectLookupLoader:
+    """Fetches the subjects collection once per dataset version.
+
+    SubjectCourseEnricher and the statistics subject labels share what is
+    fetched. The statistics labels come from the version set with
+    set_stats_version and fall back to the local subject code files when
+    no version is set or the collection cannot be read.
+    """
+
+    def __init__(self):
+        self.subject_lookups = {}
+        self.stats_version = None
+        self.stats_subject_lookups = None
+        self.lock = threading.Lock()
+
+    def get(self, version):
+        with self.lock:
+            if version not in self.subject_lookups:
+                self.subject_lookups[version] = utils.get_subject_lookups(version)
+            return self.subject_lookups[version]
+
+    def add(self, version, subject_lookups):
+        """Shares subject lookups already fetched for a version, such as those sent to a worker process"""
+        with self.lock:
+            self.subject_lookups.setdefault(version, subject_lookups)
+
+    def set_stats_version(self, version):
+        with self.lock:
+            self.stats_version = version
+            self.stats_subject_lookups = None
+
+    def get_stats_subject_lookups(self):
+        """Returns the subject lookups for statistics labels, or {} to use the local files"""
+        stats_subject_lookups = self.stats_subject_lookups
+        if stats_subject_lookups is None:
+            stats_subject_lookups = {}
+            if self.stats_version is not None:
+                try:
+                    stats_subject_lookups = self.get(self.stats_version)
+                    logging.info("Using database subject codes.")
+                except Exception:
+                    logging.info("Using local subject codes.")
+            self.stats_subject_lookups = stats_subject_lookups
+        return stats_subject_lookups
+
+    def reload(self):
+        """Discards every fetched version and the statistics version"""
+        with self.lock:
+            self.subject_lookups = {}
+            self.stats_version = None
+            self.stats_subject_lookups = None
+
+
+subject_lookup_loader = SubjectLookupLoader()
+
+
+def get_subject_lookups(version):
+    return subject_lookup_loader.get(version)
+
+
+def add_subject_lookups(version, subject_lookups):
+    subject_lookup_loader.add(version, subject_lookups)
+
+
+def set_stats_subject_version(version):
+    subject_lookup_loader.set_stats_version(version)
+
+
+def get_stats_subject_lookups():
+    return subject_lookup_loader.get_stats_subject_lookups()
+
+
+def reload_subject_lookups():
+    subject_lookup_loader.reload()
@@ -1,3 +1,4 @@
+from collections import namedtuple
 from typing import Any
 from typing import Dict
 from typing import List
@@ -11,6 +12,30 @@ class InvalidMappingId(Exception):
     pass
 
 
+# How a mapped value is handled, decided once when a plan is compiled
+COPY_VALUE = 0
+UNAVAILABLE_VALUE = 1
+SUBJECT_VALUE = 2
+
+# Every casing of "NA", so a value can be checked without lowercasing it
+NA_VALUES = frozenset({"na", "nA", "Na", "NA"})
+
+
+def is_na(value: Any) -> bool:
+    """Returns whether value is "na" in any casing, as value.lower() == "na"
+
+    A string is checked without lowercasing it. Anything else is lowercased
+    as before, so a value that is not a string, such as the None of an empty
+    element, still raises AttributeError.
+    """
+    if type(value) is str:
+        return value in NA_VALUES
+    return value.lower() == "na"
+
+
+MappingStep = namedtuple("MappingStep", ["xml_key", "json_key", "handling"])
+
+
 class BaseMappings:
     """
     Base Mappings:
@@ -22,6 +47,11 @@ class BaseMappings:
     OPTIONS = []
     unavailable_keys = []
 
+    # Compiled plans by (mapping class, mapping_id) and mappers by mapping class,
+    # shared by every course in the run
+    _plans = {}
+    _mappers = {}
+
     def __init__(self, mapping_id, subject_enricher):
         if mapping_id not in self.OPTIONS:
             raise InvalidMappingId(f"Invalid mapping_id {mapping_id}for {self}")
@@ -29,9 +59,41 @@ class BaseMappings:
         self.mapping_id = mapping_id
         self.subject_enricher = subject_enricher
 
+    @classmethod
+    def get_mapper(cls, mapping_id, subject_enricher):
+        """Returns a mapper for mapping_id, reusing the last one made for this class
+
+        A new mapper is only made when the mapping_id or subject enricher
+        differs from the last call, which happens once per worker process.
+        """
+        mapper = cls._mappers.get((cls, mapping_id))
+        if mapper is None or mapper.subject_enricher is not subject_enricher:
+            mapper = cls._mappers[(cls, mapping_id)] = cls(mapping_id, subject_enricher)
+        return mapper
+
     def get_mappings(self) -> List[Tuple[str, str]]:
         raise NotImplemented
 
+    def get_plan(self) -> Tuple[MappingStep, ...]:
+        """Returns the compiled get_mappings(), built once per class and mapping_id"""
+        key = (type(self), self.mapping_id)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._plans[key] = self.compile_mappings(self.get_mappings())
+        return plan
+
+    def compile_mappings(self, mappings: List[Tuple[str, str]]) -> Tuple[MappingStep, ...]:
+        steps = []
+        for xml_key, json_key in mappings:
+            if json_key in self.unavailable_keys:
+                handling = UNAVAILABLE_VALUE
+            elif json_key == "subject":
+                handling = SUBJECT_VALUE
+            else:
+                handling = COPY_VALUE
+            steps.append(MappingStep(xml_key, json_key, handling))
+        return tuple(steps)
+
     def map_xml_to_json_array(
             self,
             xml_as_array: List[Any],
@@ -39,26 +101,31 @@ class BaseMappings:
     ) -> List[Dict[str, Any]]:
         json_array = []
         # Can overwrite mappings if needed, otherwise the default is get_mappings()
-        if not mappings:
-            mappings = self.get_mappings()
+        if mappings:
+            plan = self.compile_mappings(mappings)
+        else:
+            plan = self.get_plan()
 
         if xml_as_array and len(xml_as_array) > 0:
             for elem in xml_as_array:
                 json_data = {}
-                for xml_key, json_key in mappings:
-
+                for xml_key, json_key, handling in plan:
                     # If key isn't there or it's NA (should be NA as of September 2021)
-                    if self.in_and_not_na(key=xml_key, data=elem):
+                    if xml_key not in elem:
+                        continue
+                    value = elem[xml_key]
+                    if is_na(value):
+                        continue
 
-                        if json_key in self.unavailable_keys:
-                            json_data[json_key] = elem.get(xml_key)
-                            self.custom_unavailable(json_data=json_data, elem=elem, key=json_key)
+                    if handling == COPY_VALUE:
+                        json_data[json_key] = value
 
-                        elif json_key == "subject":
-                            json_data[json_key] = get_subject(elem.get(xml_key), self.subject_enricher)
+                    elif handling == UNAVAILABLE_VALUE:
+                        json_data[json_key] = value
+                        self.custom_unavailable(json_data=json_data, elem=elem, key=json_key)
 
-                        else:
-                            json_data[json_key] = elem.get(xml_key)
+                    else:
+                        json_data[json_key] = get_subject(value, self.subject_enricher)
 
                 self.per_course_unavailable(json_data=json_data)
 
@@ -81,7 +148,4 @@ class BaseMappings:
 
     @staticmethod
     def in_and_not_na(key: str, data: Dict[str, Any]) -> bool:
-        if key in data:
-            if data.get(key).lower() != "na":
-                return True
-        return False
+        return key in data and not is_na(data[key])
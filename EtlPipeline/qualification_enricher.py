@@ -27,7 +27,7 @@ class QualificationCourseEnricher:
                 )
                 raise exceptions.StopEtlPipelineErrorException
 
-            self.qualification_levels = rows
+            self.qualification_levels = self.build_qualification_index(rows[1:])
 
     def validate_column_headers(self, header_row):
         logging.info(f"Validating header row, headers: {header_row}")
@@ -48,6 +48,15 @@ class QualificationCourseEnricher:
 
         return valid
 
+    @staticmethod
+    def build_qualification_index(rows):
+        """Returns a dict of qualification code to level, keeping the first row for each code"""
+        qualification_levels = {}
+        for row in csv.reader(rows):
+            if len(row) > 1:
+                qualification_levels.setdefault(row[0], row[1])
+        return qualification_levels
+
     def enrich_course(self, course):
         """Takes a course and enriches ukprn names with UKRLP data"""
 
@@ -55,8 +64,4 @@ class QualificationCourseEnricher:
         course["course"]["qualification"]["level"] = self.get_qualification_level(qualification_code)
 
     def get_qualification_level(self, code):
-        rows = csv.reader(self.qualification_levels)
-        for row in rows:
-            if row[0] == code:
-                return row[1]
-        return ""
\ No newline at end of file
+        return self.qualification_levels.get(code, "")
\ No newline at end of file
@@ -1,5 +1,4 @@
-import xmltodict
-import defusedxml.ElementTree as ET
+from SharedCode.utils import element_to_dict
 
 
 class SectorSalaries:
@@ -20,9 +19,7 @@ class SectorSalaries:
 
         sector_sal_root = root.find('SECTORSAL')
         for sector_salary in sector_sal_root.iter(sector_salary_type):
-            raw_sector_salary_data = xmltodict.parse(
-                ET.tostring(sector_salary)
-            )[sector_salary_type]
+            raw_sector_salary_data = element_to_dict(sector_salary)
             raw_sector_salary_data['KISMODE'] = str(int(raw_sector_salary_data['KISMODE']))
             raw_sector_salary_data['KISLEVEL'] = str(int(raw_sector_salary_data['KISLEVEL']))
 
@@ -1,13 +1,13 @@
 import logging
 
-from SharedCode import utils
+from EtlPipeline.lookups import get_subject_lookups
 
 
 class SubjectCourseEnricher:
     """Handles enriching courses with UKRLP data"""
 
     def __init__(self, version):
-        self.subject_lookups = utils.get_subject_lookups(version)
+        self.subject_lookups = get_subject_lookups(version)
 
     def enrich_course(self, course):
         """Takes a course and enriches subject object with subject names"""
@@ -0,0 +1,113 @@
+import io
+import json
+import unittest
+from multiprocessing.pool import ThreadPool
+from unittest import mock
+
+import defusedxml.ElementTree as ET
+
+from EtlPipeline import course_docs
+from EtlPipeline.lookups import reload_subject_lookups
+from EtlPipeline.tests.test_helpers.testing_utils import get_string
+from SharedCode.fake_cosmos_container import FakeCosmosContainer
+
+QUALIFICATIONS_CSV = "code,level\n021,6\n"
+SUBJECT_LOOKUPS = {
+    "CAH01-01-01": {"code": "CAH01-01-01", "english_name": "Medicine", "welsh_name": "Meddygaeth", "level": 3},
+    "CAH17-01-08": {"code": "CAH17-01-08", "english_name": "Marketing", "welsh_name": "Marchnata", "level": 3},
+}
+
+
+def write_course_docs(workers, stream=False):
+    """Returns the docs uploaded for the fixtures without the fields that change per run
+
+    With stream the fixture is read with stream_course_docs, which reaches
+    its SECTORSAL after the institutions.
+    """
+    container = FakeCosmosContainer()
+    cosmos_client = mock.MagicMock()
+    cosmos_client.get_database_client.return_value.get_container_client.return_value = container
+    xml_string = get_string("fixtures/multi_inst_courses.xml")
+
+    with mock.patch("SharedCode.utils.get_cosmos_client", return_value=cosmos_client), \
+            mock.patch("SharedCode.utils.get_ukrlp_lookups", return_value={}), \
+            mock.patch("SharedCode.utils.get_subject_lookups", return_value=SUBJECT_LOOKUPS), \
+            mock.patch("SharedCode.blob_helper.BlobServiceClient"), \
+            mock.patch("SharedCode.blob_helper.BlobHelper.get_str_file", return_value=QUALIFICATIONS_CSV), \
+            mock.patch.dict("os.environ", {
+                "AzureStorageQualificationsContainerName": "qualifications",
+                "AzureStorageQualificationsBlobName": "qualification-levels.csv",
+                "AzureStorageAccountConnectionString": "UseDevelopmentStorage=true",
+                "EtlCourseDocWorkers": str(workers),
+            }):
+        if stream:
+            course_docs.stream_course_docs(io.BytesIO(xml_string.encode("utf-8")), lambda: 1)
+        else:
+            root = ET.fromstring(xml_string)
+            course_docs.write_course_docs(root, root.iter("INSTITUTION"), 1, workers=workers)
+
+    docs = sorted(container.documents, key=lambda doc: (doc["institution_id"], doc["course_id"], doc["course_mode"]))
+    for doc in docs:
+        for key in ("_id", "created_at", "updated_at"):
+            doc.pop(key, None)
+    return docs
+
+
+class TestCourseDocWorkers(unittest.TestCase):
+    def tearDown(self):
+        # write_course_docs points the statistics subject labels at the mocked subjects collection
+        reload_subject_lookups()
+
+    def test_worker_pool_matches_single_process(self):
+        expected = write_course_docs(workers=1)
+        docs = write_course_docs(workers=2)
+
+        self.assertTrue(expected)
+        self.assertEqual(json.dumps(expected), json.dumps(docs))
+
+    def test_sector_salaries_read_after_the_institutions_are_added(self):
+        expected = write_course_docs(workers=1)
+        self.assertTrue(any("go_salary_sector" in doc["course"] for doc in expected))
+
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                self.assertEqual(json.dumps(expected), json.dumps(write_course_docs(workers, stream=True)))
+
+    def test_failed_courses_are_logged_in_order(self):
+        with self.assertLogs(level="WARNING") as single_logs:
+            write_course_docs(workers=1)
+        with self.assertLogs(level="WARNING") as pool_logs:
+            write_course_docs(workers=2)
+
+        self.assertEqual(single_logs.output, pool_logs.output)
+
+    def test_workers_default_to_one(self):
+        with mock.patch.dict("os.environ", {}, clear=True):
+            self.assertEqual(1, course_docs.get_course_doc_workers())
+        with mock.patch.dict("os.environ", {"EtlCourseDocWorkers": "4"}):
+            self.assertEqual(4, course_docs.get_course_doc_workers())
+
+
+class TestImapOrdered(unittest.TestCase):
+    def test_results_keep_input_order(self):
+        with ThreadPool(3) as pool:
+            results = list(course_docs.imap_ordered(pool, lambda x: x * 2, range(10), max_pending=3))
+
+        self.assertEqual([x * 2 for x in range(10)], results)
+
+    def test_reads_ahead_at_most_max_pending_items(self):
+        pulled = []
+
+        def items():
+            for item in range(10):
+                pulled.append(item)
+                yield item
+
+        with ThreadPool(2) as pool:
+            results = course_docs.imap_ordered(pool, lambda x: x, items(), max_pending=2)
+            self.assertEqual(0, next(results))
+            self.assertEqual(2, len(pulled))
+
+
+if __name__ == "__main__":
+    unittest.main()
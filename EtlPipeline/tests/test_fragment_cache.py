@@ -0,0 +1,133 @@
+import timeit
+import unittest
+
+import defusedxml.ElementTree as ET
+import xmltodict
+
+from EtlPipeline.accreditations import Accreditations
+from EtlPipeline.course_docs import CourseFragments
+from EtlPipeline.course_docs import get_accreditations
+from EtlPipeline.course_docs import get_location_items
+from EtlPipeline.course_docs import get_locids
+from EtlPipeline.fragment_cache import FragmentCache
+from EtlPipeline.locations import Locations
+from EtlPipeline.tests.test_helpers.testing_utils import get_string
+from SharedCode.benchmark import benchmark
+
+
+class TestFragmentCache(unittest.TestCase):
+    def test_fragment_is_built_once_per_key(self):
+        builds = []
+
+        def build(value):
+            builds.append(value)
+            return {"value": value}
+
+        cache = FragmentCache("test")
+        cache.get("a", build, 1)
+        cache.get("a", build, 1)
+        cache.get("b", build, 2)
+
+        self.assertEqual([1, 2], builds)
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+        self.assertAlmostEqual(1 / 3, cache.hit_rate)
+
+    def test_each_caller_gets_its_own_copy(self):
+        cache = FragmentCache("test")
+        first = cache.get("a", lambda: {"links": {"url": "a"}, "names": ["x"]})
+        first["links"]["url"] = "changed"
+        first["names"].append("y")
+
+        self.assertEqual({"links": {"url": "a"}, "names": ["x"]}, cache.get("a", dict))
+
+    def test_clear_keeps_counters(self):
+        cache = FragmentCache("test")
+        cache.get("a", dict)
+        cache.get("a", dict)
+        cache.clear()
+        cache.get("a", dict)
+
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+        self.assertEqual(0.0, FragmentCache("empty").hit_rate)
+
+    def test_log_stats(self):
+        cache = FragmentCache("location")
+        cache.get("a", dict)
+        cache.get("a", dict)
+
+        with self.assertLogs(level="INFO") as logs:
+            cache.log_stats()
+
+        self.assertIn("location fragment cache: 1 hits, 1 misses (50% hit rate)", logs.output[0])
+
+
+class TestCourseFragments(unittest.TestCase):
+    def setUp(self):
+        self.locations = Locations(ET.fromstring(get_string("fixtures/course_with_locations.xml")))
+        self.accreditations = Accreditations(
+            ET.fromstring(get_string("fixtures/course_with_accreditations.xml"))
+        )
+        self.location_course = xmltodict.parse(
+            get_string("fixtures/course_with_locations.xml")
+        )["KIS"]["KISCOURSE"]
+        self.accreditation_course = xmltodict.parse(
+            get_string("fixtures/course_with_accreditations.xml")
+        )["KIS"]["KISCOURSE"]
+
+    def test_cached_locations_match_uncached(self):
+        pub_ukprn = "10007814"
+        locids = get_locids(self.location_course, pub_ukprn)
+        expected = get_location_items(self.locations, locids, self.location_course, pub_ukprn)
+
+        fragments = CourseFragments()
+        for _ in range(3):
+            locations = get_location_items(
+                self.locations, locids, self.location_course, pub_ukprn, fragments
+            )
+            self.assertEqual(expected, locations)
+
+        self.assertEqual(len(locids), fragments.location_cache.misses)
+        self.assertEqual(2 * len(locids), fragments.location_cache.hits)
+
+    def test_cached_accreditations_match_uncached(self):
+        expected = get_accreditations(self.accreditation_course, self.accreditations)
+
+        fragments = CourseFragments()
+        get_accreditations(self.accreditation_course, self.accreditations, fragments)
+        accreditations = get_accreditations(self.accreditation_course, self.accreditations, fragments)
+
+        self.assertEqual(expected, accreditations)
+        self.assertEqual(fragments.accreditation_cache.misses, fragments.accreditation_cache.hits)
+
+    def test_institution_fragments_are_dropped_for_the_next_institution(self):
+        fragments = CourseFragments()
+        first = {"UKPRN": "1", "PUBUKPRN": "1"}
+        second = {"UKPRN": "2", "PUBUKPRN": "2"}
+
+        self.assertEqual("1", fragments.get_institution(first)["pub_ukprn"])
+        fragments.start_institution()
+        self.assertEqual("2", fragments.get_institution(second)["pub_ukprn"])
+
+
+@benchmark
+class TestCourseFragmentsBenchmark(unittest.TestCase):
+    def test_cached_locations_are_faster_than_rebuilding(self):
+        locations = Locations(ET.fromstring(get_string("fixtures/course_with_locations.xml")))
+        course = xmltodict.parse(get_string("fixtures/course_with_locations.xml"))["KIS"]["KISCOURSE"]
+        pub_ukprn = "10007814"
+        locids = get_locids(course, pub_ukprn)
+        fragments = CourseFragments()
+
+        uncached = timeit.timeit(
+            lambda: get_location_items(locations, locids, course, pub_ukprn), number=2000
+        )
+        cached = timeit.timeit(
+            lambda: get_location_items(locations, locids, course, pub_ukprn, fragments), number=2000
+        )
+
+        print(f"\nlocations uncached: {uncached:.3f}s, cached: {cached:.3f}s")
+        self.assertLess(cached, uncached)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import builtins
+import unittest
+from unittest import mock
+
+from EtlPipeline.course_stats import SharedUtils
+from EtlPipeline.course_stats import get_earnings_unavail_text
+from EtlPipeline.course_stats import get_stats
+from EtlPipeline.lookups import LookupRegistry
+from EtlPipeline.lookups import SubjectLookupLoader
+from EtlPipeline.lookups import get_lookup
+from EtlPipeline.lookups import lookup_registry
+from EtlPipeline.lookups import reload_lookups
+from EtlPipeline.lookups import reload_subject_lookups
+from EtlPipeline.lookups import set_stats_subject_version
+from EtlPipeline.subject_enricher import SubjectCourseEnricher
+
+SUBJECT_LOOKUPS = {
+    "CAH01-01-01": {"code": "CAH01-01-01", "english_name": "Medicine (db)", "welsh_name": "Meddygaeth (db)"},
+}
+
+
+class TestLookupRegistry(unittest.TestCase):
+    def test_lookup_is_loaded_once(self):
+        registry = LookupRegistry()
+        with mock.patch.object(builtins, "open", wraps=builtins.open) as mock_open:
+            first = registry.get("tariff_description")
+            second = registry.get("tariff_description")
+
+        self.assertIs(first, second)
+        self.assertEqual(1, mock_open.call_count)
+
+    def test_lookup_is_read_only(self):
+        lookup = get_lookup("common_data_fields")
+
+        with self.assertRaises(TypeError):
+            lookup["COMAGG"] = ["changed", "M"]
+        self.assertEqual(("aggregation_level", "M"), lookup["COMAGG"])
+
+    def test_reload_reads_files_again(self):
+        first = get_lookup("nss_question_description")
+        reload_lookups()
+        second = get_lookup("nss_question_description")
+
+        self.assertIsNot(first, second)
+        self.assertEqual(dict(first), dict(second))
+
+    def test_unknown_lookup_raises_key_error(self):
+        with self.assertRaises(KeyError):
+            get_lookup("not_a_lookup")
+
+    def test_shared_utils_instances_share_lookups(self):
+        first = SharedUtils("CONTINUATION", "CONTSBJ", "CONTAGG", "CONTUNAVAILREASON")
+        second = SharedUtils("EMPLOYMENT", "EMPSBJ", "EMPAGG", "EMPUNAVAILREASON")
+
+        self.assertIs(first.unavail_reason_english, second.unavail_reason_english)
+        self.assertIs(first.subj_code_welsh, second.subj_code_welsh)
+
+    def test_no_files_opened_once_warm(self):
+        get_earnings_unavail_text("institution", "go", "1")
+        get_stats({
+            "CONTINUATION": {"CONTUNAVAILREASON": "1"},
+            "EMPLOYMENT": {"EMPUNAVAILREASON": "1"},
+            "ENTRY": {"ENTUNAVAILREASON": "1"},
+            "JOBTYPE": {"JOBUNAVAILREASON": "1"},
+            "COMMON": {"COMUNAVAILREASON": "1"},
+            "NHSNSS": {"NHSUNAVAILREASON": "1"},
+            "NSS": {"NSSUNAVAILREASON": "1"},
+            "TARIFF": {"TARUNAVAILREASON": "1"},
+        })
+
+        with mock.patch.object(builtins, "open", wraps=builtins.open) as mock_open:
+            get_earnings_unavail_text("sector", "leo", "region_is_ni")
+            SharedUtils("TARIFF", "TARSBJ", "TARAGG", "TARUNAVAILREASON")
+
+        mock_open.assert_not_called()
+        self.assertTrue(lookup_registry.lookups)
+
+
+class TestSubjectLookupLoader(unittest.TestCase):
+    def tearDown(self):
+        reload_subject_lookups()
+
+    @mock.patch("SharedCode.utils.get_subject_lookups", return_value=SUBJECT_LOOKUPS)
+    def test_each_version_is_fetched_once(self, mock_get_subject_lookups):
+        loader = SubjectLookupLoader()
+
+        self.assertIs(loader.get(1), loader.get(1))
+        loader.get(2)
+
+        self.assertEqual([mock.call(1), mock.call(2)], mock_get_subject_lookups.call_args_list)
+
+    @mock.patch("SharedCode.utils.get_subject_lookups", return_value=SUBJECT_LOOKUPS)
+    def test_enricher_and_stats_labels_share_one_fetch(self, mock_get_subject_lookups):
+        enricher = SubjectCourseEnricher(3)
+        set_stats_subject_version(3)
+        shared_utils = SharedUtils("CONTINUATION", "CONTSBJ", "CONTAGG", "CONTUNAVAILREASON")
+
+        self.assertEqual("Medicine (db)", shared_utils.get_english_sbj_label("CAH01-01-01"))
+        self.assertEqual("Meddygaeth (db)", shared_utils.get_welsh_sbj_label("CAH01-01-01"))
+        self.assertIs(SUBJECT_LOOKUPS, enricher.subject_lookups)
+        mock_get_subject_lookups.assert_called_once_with(3)
+
+    @mock.patch("SharedCode.utils.get_subject_lookups")
+    def test_stats_labels_use_local_files_without_a_version(self, mock_get_subject_lookups):
+        shared_utils = SharedUtils("CONTINUATION", "CONTSBJ", "CONTAGG", "CONTUNAVAILREASON")
+
+        self.assertEqual(
+            shared_utils.subj_code_english["CAH01-01-01"],
+            shared_utils.get_english_sbj_label("CAH01-01-01"),
+        )
+        mock_get_subject_lookups.assert_not_called()
+
+    @mock.patch("SharedCode.utils.get_subject_lookups", side_effect=Exception("no connection"))
+    def test_stats_labels_fall_back_to_local_files_once(self, mock_get_subject_lookups):
+        set_stats_subject_version(4)
+        shared_utils = SharedUtils("CONTINUATION", "CONTSBJ", "CONTAGG", "CONTUNAVAILREASON")
+
+        with self.assertLogs(level="INFO") as logs:
+            shared_utils.get_english_sbj_label("CAH01-01-01")
+        shared_utils.get_welsh_sbj_label("CAH01-01-01")
+
+        self.assertIn("INFO:root:Using local subject codes.", logs.output)
+        mock_get_subject_lookups.assert_called_once_with(4)
+
+
+if __name__ == "__main__":
+    unittest.main()
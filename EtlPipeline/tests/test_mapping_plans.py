@@ -0,0 +1,161 @@
+import timeit
+import unittest
+from collections import defaultdict
+
+import defusedxml.ElementTree as ET
+import xmltodict
+
+from EtlPipeline.mappings.base import COPY_VALUE
+from EtlPipeline.mappings.base import SUBJECT_VALUE
+from EtlPipeline.mappings.base import UNAVAILABLE_VALUE
+from EtlPipeline.mappings.go.institution import GoInstitutionMappings
+from EtlPipeline.mappings.go.voice import GoVoiceMappings
+from EtlPipeline.mappings.leo.institution import LeoInstitutionMappings
+from EtlPipeline.tests.test_helpers.testing_utils import get_string
+from EtlPipeline.utils import get_subject
+from SharedCode.benchmark import benchmark
+
+# The mapper class and mapping_id used for each KISCOURSE element
+COURSE_ELEMENTS = [
+    ("GOSALARY", GoInstitutionMappings, "GO"),
+    ("LEO3", LeoInstitutionMappings, "LEO3"),
+    ("LEO5", LeoInstitutionMappings, "LEO5"),
+    ("GOVOICEWORK", GoVoiceMappings, "GO"),
+]
+
+
+class FakeSubjectEnricher:
+    def __init__(self):
+        self.subject_lookups = defaultdict(lambda: {"english_name": "English", "welsh_name": "Welsh"})
+
+
+def get_course_elements():
+    """Returns a list of {element name: list of raw elements} for each course in the fixture"""
+    root = ET.fromstring(get_string("fixtures/multi_inst_courses.xml"))
+    courses = []
+    for course in root.iter("KISCOURSE"):
+        raw_course_data = xmltodict.parse(ET.tostring(course))["KISCOURSE"]
+        elements = {}
+        for element, _mapper_class, _mapping_id in COURSE_ELEMENTS:
+            raw_data = raw_course_data.get(element)
+            if raw_data:
+                elements[element] = raw_data if isinstance(raw_data, list) else [raw_data]
+        courses.append(elements)
+    return courses
+
+
+def map_uncompiled(mapper, xml_as_array):
+    """Maps the elements the way BaseMappings did before plans were compiled"""
+    json_array = []
+    for elem in xml_as_array:
+        json_data = {}
+        for xml_key, json_key in mapper.get_mappings():
+            if xml_key in elem and elem.get(xml_key).lower() != "na":
+                if json_key in mapper.unavailable_keys:
+                    json_data[json_key] = elem.get(xml_key)
+                    mapper.custom_unavailable(json_data=json_data, elem=elem, key=json_key)
+                elif json_key == "subject":
+                    json_data[json_key] = get_subject(elem.get(xml_key), mapper.subject_enricher)
+                else:
+                    json_data[json_key] = elem.get(xml_key)
+        mapper.per_course_unavailable(json_data=json_data)
+        mapper.final_unavailable(json_data)
+        json_array.append(json_data)
+    return json_array
+
+
+def map_courses(courses, subject_enricher, compiled):
+    for elements in courses:
+        for element, mapper_class, mapping_id in COURSE_ELEMENTS:
+            if element not in elements:
+                continue
+            if compiled:
+                mapper_class.get_mapper(mapping_id, subject_enricher).map_xml_to_json_array(elements[element])
+            else:
+                map_uncompiled(mapper_class(mapping_id, subject_enricher), elements[element])
+
+
+class TestMappingPlans(unittest.TestCase):
+    def setUp(self):
+        self.subject_enricher = FakeSubjectEnricher()
+
+    def test_plan_is_compiled_once_per_class_and_mapping_id(self):
+        leo3 = LeoInstitutionMappings("LEO3", self.subject_enricher)
+
+        self.assertIs(leo3.get_plan(), LeoInstitutionMappings("LEO3", None).get_plan())
+        self.assertIsNot(leo3.get_plan(), LeoInstitutionMappings("LEO5", None).get_plan())
+        self.assertEqual([step[:2] for step in leo3.get_plan()], leo3.get_mappings())
+
+    def test_plan_flags_subject_and_unavailable_keys(self):
+        handling = {
+            step.json_key: step.handling
+            for step in GoInstitutionMappings("GO", self.subject_enricher).get_plan()
+        }
+
+        self.assertEqual(UNAVAILABLE_VALUE, handling["unavail_reason"])
+        self.assertEqual(SUBJECT_VALUE, handling["subject"])
+        self.assertEqual(COPY_VALUE, handling["pop"])
+
+    def test_mapper_is_reused_for_the_same_subject_enricher(self):
+        mapper = GoVoiceMappings.get_mapper("GO", self.subject_enricher)
+
+        self.assertIs(mapper, GoVoiceMappings.get_mapper("GO", self.subject_enricher))
+        self.assertIsNot(mapper, GoVoiceMappings.get_mapper("GO", FakeSubjectEnricher()))
+        self.assertIsInstance(GoInstitutionMappings.get_mapper("GO", self.subject_enricher), GoInstitutionMappings)
+
+    def test_mappings_can_still_be_overridden(self):
+        mapper = GoInstitutionMappings.get_mapper("GO", self.subject_enricher)
+        elem = {"GOSALPOP": "30", "GOINSTMED": "NA"}
+
+        self.assertEqual(
+            [{"population": "30"}],
+            mapper.map_xml_to_json_array([elem], mappings=[("GOSALPOP", "population"), ("GOINSTMED", "med")]),
+        )
+
+    def test_empty_value_raises_as_uncompiled_mappings_do(self):
+        mapper = GoInstitutionMappings.get_mapper("GO", self.subject_enricher)
+        elem = {"GOSALPOP": None}
+
+        with self.assertRaises(AttributeError):
+            map_uncompiled(mapper, [elem])
+        with self.assertRaises(AttributeError):
+            mapper.map_xml_to_json_array([elem])
+
+    def test_compiled_plans_match_uncompiled_mappings(self):
+        courses = get_course_elements()
+        mapped = 0
+        for elements in courses:
+            for element, mapper_class, mapping_id in COURSE_ELEMENTS:
+                if element not in elements:
+                    continue
+                with self.subTest(element=element):
+                    expected = map_uncompiled(mapper_class(mapping_id, self.subject_enricher), elements[element])
+                    mapper = mapper_class.get_mapper(mapping_id, self.subject_enricher)
+                    self.assertEqual(expected, mapper.map_xml_to_json_array(elements[element]))
+                    mapped += 1
+
+        self.assertTrue(mapped)
+
+
+@benchmark
+class TestMappingPlansBenchmark(unittest.TestCase):
+    def test_mapping_cost_per_course(self):
+        courses = get_course_elements()
+        subject_enricher = FakeSubjectEnricher()
+        # Warm up the lookups used for the unavailable messages
+        map_courses(courses, subject_enricher, compiled=True)
+
+        runs = 20
+        uncompiled = min(timeit.repeat(lambda: map_courses(courses, subject_enricher, False), number=runs, repeat=5))
+        compiled = min(timeit.repeat(lambda: map_courses(courses, subject_enricher, True), number=runs, repeat=5))
+
+        per_course = 1e6 / (runs * len(courses))
+        print(
+            f"\nmapping per course: {uncompiled * per_course:.0f}us uncompiled, "
+            f"{compiled * per_course:.0f}us compiled ({len(courses)} courses)"
+        )
+        self.assertLess(compiled, uncompiled)
+
+
+if __name__ == "__main__":
+    unittest.main()
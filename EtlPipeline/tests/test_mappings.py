@@ -17,3 +17,8 @@ class TestMappings(unittest.TestCase):
         self.assertFalse(BaseMappings.in_and_not_na(key="Doesn't exist", data=data))
         self.assertFalse(BaseMappings.in_and_not_na(key="lower_case", data=data))
         self.assertTrue(BaseMappings.in_and_not_na(key="exists", data=data))
+
+    def test_empty_value_is_not_skipped(self):
+        data = {"empty": None}
+        with self.assertRaises(AttributeError):
+            BaseMappings.in_and_not_na(key="empty", data=data)
@@ -0,0 +1,103 @@
+import csv
+import timeit
+import unittest
+from unittest import mock
+
+from SharedCode import exceptions
+from SharedCode.benchmark import benchmark
+from qualification_enricher import QualificationCourseEnricher
+
+ENVIRON = {
+    "AzureStorageQualificationsContainerName": "qualifications",
+    "AzureStorageQualificationsBlobName": "qualification-levels.csv",
+}
+
+
+def get_enricher(csv_string):
+    with mock.patch("qualification_enricher.BlobHelper") as blob_helper, \
+            mock.patch.dict("os.environ", ENVIRON):
+        blob_helper.return_value.get_str_file.return_value = csv_string
+        return QualificationCourseEnricher()
+
+
+def get_course(code):
+    return {"course": {"qualification": {"code": code, "label": "BSc"}}}
+
+
+def get_csv_string(codes):
+    rows = ["code,level,english_label,welsh_label"]
+    rows.extend(f"{code:03d},{code % 8},Label {code},Label {code}" for code in range(codes))
+    return "\n".join(rows)
+
+
+class TestQualificationCourseEnricher(unittest.TestCase):
+    def test_enrich_course_sets_level(self):
+        enricher = get_enricher("code,level\n021,6\n036,5\n")
+        course = get_course("036")
+        enricher.enrich_course(course)
+
+        self.assertEqual("5", course["course"]["qualification"]["level"])
+
+    def test_missing_code_gives_empty_level(self):
+        enricher = get_enricher("code,level\n021,6\n")
+        course = get_course("999")
+        enricher.enrich_course(course)
+
+        self.assertEqual("", course["course"]["qualification"]["level"])
+
+    def test_first_row_for_a_code_is_used(self):
+        enricher = get_enricher("code,level\n021,6\n\n021,4\n")
+
+        self.assertEqual("6", enricher.get_qualification_level("021"))
+
+    def test_quoted_values_are_parsed(self):
+        enricher = get_enricher('code,level\n"021","6"\n')
+
+        self.assertEqual("6", enricher.get_qualification_level("021"))
+
+    def test_invalid_headers_stop_the_pipeline(self):
+        with self.assertLogs(level="ERROR"):
+            with self.assertRaises(exceptions.StopEtlPipelineErrorException):
+                get_enricher("level,code\n6,021\n")
+
+
+@benchmark
+class TestQualificationCourseEnricherBenchmark(unittest.TestCase):
+    def test_indexed_lookup_is_faster_than_scanning_rows(self):
+        codes = 500
+        csv_string = get_csv_string(codes)
+        enricher = get_enricher(csv_string)
+        rows = csv_string.splitlines()
+        courses = [get_course(f"{code % codes:03d}") for code in range(0, 7 * codes, 7)]
+
+        # The lookup as it was before the index: a csv.reader over every row for each course
+        def scan_rows(code):
+            for row in csv.reader(rows):
+                if row[0] == code:
+                    return row[1]
+            return ""
+
+        def scanned():
+            for course in courses:
+                course["course"]["qualification"]["level"] = scan_rows(
+                    course["course"]["qualification"]["code"]
+                )
+
+        def indexed():
+            for course in courses:
+                enricher.enrich_course(course)
+
+        scanned_time = min(timeit.repeat(scanned, number=5, repeat=3))
+        indexed_time = min(timeit.repeat(indexed, number=5, repeat=3))
+
+        enrichments = len(courses) * 5
+        print(
+            f"\nqualification lookup over {codes} codes, scanning rows: "
+            f"{scanned_time / enrichments * 1e6:.1f}us per course, "
+            f"indexed: {indexed_time / enrichments * 1e6:.2f}us per course"
+        )
+        self.assertLess(indexed_time, scanned_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
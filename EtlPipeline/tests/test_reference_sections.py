@@ -0,0 +1,81 @@
+import copy
+import timeit
+import unittest
+
+import defusedxml.ElementTree as ET
+
+from EtlPipeline.accreditations import Accreditations
+from EtlPipeline.kisaims import KisAims
+from EtlPipeline.locations import Locations
+from EtlPipeline.sector_salaries import GOSectorSalaries
+from EtlPipeline.sector_salaries import LEO3SectorSalaries
+from EtlPipeline.sector_salaries import LEO5SectorSalaries
+from EtlPipeline.tests.test_helpers.testing_utils import get_string
+from SharedCode.benchmark import benchmark
+from SharedCode.reference_sections import ReferenceSections
+
+LOOKUP_CLASSES = [
+    Accreditations,
+    KisAims,
+    Locations,
+    GOSectorSalaries,
+    LEO3SectorSalaries,
+    LEO5SectorSalaries,
+]
+
+
+def build_lookups(root):
+    return [lookup_class(root) for lookup_class in LOOKUP_CLASSES]
+
+
+class TestReferenceSections(unittest.TestCase):
+    def setUp(self):
+        self.root = ET.fromstring(get_string("fixtures/multi_inst_courses.xml"))
+
+    def test_lookups_match_lookups_built_from_root(self):
+        expected = build_lookups(self.root)
+        lookups = build_lookups(ReferenceSections(self.root))
+
+        for expected_lookup, lookup in zip(expected, lookups):
+            with self.subTest(lookup=type(lookup).__name__):
+                self.assertTrue(lookup.lookup_dict)
+                self.assertEqual(expected_lookup.lookup_dict, lookup.lookup_dict)
+
+    def test_iter_keeps_document_order(self):
+        sections = ReferenceSections(self.root)
+
+        self.assertEqual(self.root.findall("LOCATION"), list(sections.iter("LOCATION")))
+        self.assertEqual([], list(sections.iter("NOT_A_SECTION")))
+
+    def test_find_returns_first_section_or_none(self):
+        sections = ReferenceSections(self.root)
+
+        self.assertIs(self.root.find("KISAIM"), sections.find("KISAIM"))
+        self.assertIsNone(sections.find("NOT_A_SECTION"))
+
+
+@benchmark
+class TestReferenceSectionsBenchmark(unittest.TestCase):
+    def test_single_pass_is_faster_than_one_pass_per_lookup(self):
+        root = ET.fromstring(get_string("fixtures/multi_inst_courses.xml"))
+        # Repeat the institutions so courses outnumber reference rows, as in the full dataset
+        institutions = root.findall("INSTITUTION")
+        for _ in range(20):
+            for institution in institutions:
+                root.append(copy.deepcopy(institution))
+
+        per_lookup_time = min(timeit.repeat(lambda: build_lookups(root), number=5, repeat=3))
+        single_pass_time = min(
+            timeit.repeat(lambda: build_lookups(ReferenceSections(root)), number=5, repeat=3)
+        )
+
+        print(
+            f"\nreference lookups over {len(list(root.iter('KISCOURSE')))} courses, "
+            f"one pass per lookup: {per_lookup_time / 5 * 1e3:.1f}ms, "
+            f"single pass: {single_pass_time / 5 * 1e3:.1f}ms"
+        )
+        self.assertLess(single_pass_time, per_lookup_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import copy
+import json
+import timeit
+import unittest
+
+import defusedxml.ElementTree as ET
+
+from EtlPipeline.course_stats import StatsExtractor
+from EtlPipeline.course_stats import get_stats
+from EtlPipeline.course_stats import get_stats_extractor
+from EtlPipeline.tests.test_helpers.testing_utils import get_string
+from SharedCode.benchmark import benchmark
+from SharedCode.utils import element_to_dict
+
+
+def get_raw_courses():
+    """Returns (fixture, raw course data, expected statistics) for each course in the expected response"""
+    expected = json.loads(get_string("fixtures/25_courses_stats_resp.json"))
+    raw_courses = {}
+    for fixture in {item["fixture"] for item in expected}:
+        root = ET.fromstring(get_string(f"fixtures/{fixture}"))
+        for course in root.iter("KISCOURSE"):
+            raw_course_data = element_to_dict(course)
+            key = (fixture, raw_course_data["KISCOURSEID"], raw_course_data["KISMODE"])
+            raw_courses[key] = raw_course_data
+
+    return [
+        (
+            item["fixture"],
+            raw_courses[(item["fixture"], item["course_id"], item["mode"])],
+            item["statistics"],
+        )
+        for item in expected
+    ]
+
+
+class TestStatsExtractor(unittest.TestCase):
+    def setUp(self):
+        self.raw_courses = get_raw_courses()
+
+    def test_extract_matches_expected_output(self):
+        extractor = StatsExtractor()
+        for fixture, raw_course_data, expected in self.raw_courses:
+            with self.subTest(fixture=fixture, course_id=raw_course_data["KISCOURSEID"]):
+                stats = extractor.extract(copy.deepcopy(raw_course_data))
+                self.assertEqual(
+                    json.dumps(expected, ensure_ascii=False),
+                    json.dumps(stats, ensure_ascii=False),
+                )
+
+    def test_reused_extractor_matches_new_extractor(self):
+        extractor = StatsExtractor()
+        for _ in range(2):
+            for fixture, raw_course_data, _expected in self.raw_courses:
+                with self.subTest(fixture=fixture, course_id=raw_course_data["KISCOURSEID"]):
+                    self.assertEqual(
+                        json.dumps(StatsExtractor().extract(copy.deepcopy(raw_course_data))),
+                        json.dumps(extractor.extract(copy.deepcopy(raw_course_data))),
+                    )
+
+    def test_get_stats_uses_shared_extractor(self):
+        self.assertIs(get_stats_extractor(), get_stats_extractor())
+        _fixture, raw_course_data, expected = self.raw_courses[0]
+        self.assertEqual(expected, get_stats(copy.deepcopy(raw_course_data), "XF"))
+
+
+@benchmark
+class TestStatsExtractorBenchmark(unittest.TestCase):
+    def test_reused_extractor_is_faster_than_extractor_per_course(self):
+        raw_courses = [raw_course_data for _, raw_course_data, _ in get_raw_courses()]
+        extractor = StatsExtractor()
+
+        # Nss.get_stats appends NSSCOUNTRY entries to the raw data, so each run gets fresh copies
+        def per_course():
+            for raw_course_data in copy.deepcopy(raw_courses):
+                StatsExtractor().extract(raw_course_data)
+
+        def reused():
+            for raw_course_data in copy.deepcopy(raw_courses):
+                extractor.extract(raw_course_data)
+
+        per_course_time = min(timeit.repeat(per_course, number=10, repeat=3))
+        reused_time = min(timeit.repeat(reused, number=10, repeat=3))
+
+        courses = len(raw_courses) * 10
+        print(
+            f"\nStatsExtractor per course: {per_course_time / courses * 1e6:.1f}us per course, "
+            f"reused: {reused_time / courses * 1e6:.1f}us per course"
+        )
+        self.assertLess(reused_time, per_course_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
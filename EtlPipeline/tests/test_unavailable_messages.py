@@ -0,0 +1,133 @@
+import itertools
+import timeit
+import unittest
+from unittest import mock
+
+from EtlPipeline.course_stats import SharedUtils
+from EtlPipeline.unavailable_messages import clear_message_caches
+from EtlPipeline.unavailable_messages import get_earnings_unavail_text
+from EtlPipeline.unavailable_messages import get_hit_rate
+from EtlPipeline.unavailable_messages import get_message_cache_stats
+from EtlPipeline.unavailable_messages import get_unavailable_reason
+from EtlPipeline.unavailable_messages import log_message_cache_stats
+from EtlPipeline.utils import get_earnings_agg_unavail_messages
+from SharedCode.benchmark import benchmark
+from SharedCode.exceptions import StopEtlPipelineErrorException
+
+# (unavail_reason_code, agg) pairs found in the lookup files
+DATA_REASONS = [("0", "11"), ("0", "21"), ("0", "24"), ("1", "12"), ("1", "23"), ("2", "13"), ("2", "22")]
+
+
+def get_elements():
+    """Returns CONTINUATION elements covering every kind of unavailable message"""
+    elements = [{"CONTUNAVAILREASON": code} for code in ("0", "1", "2")]
+    for (code, agg), subject in itertools.product(DATA_REASONS, ("CAH09-01-01", None)):
+        elem = {"CONTUNAVAILREASON": code, "CONTAGG": agg, "CONTPOP": "10"}
+        if subject:
+            elem["CONTSBJ"] = subject
+        elements.append(elem)
+        elements.append(dict(elem, CONTRESP_RATE="80"))
+    return elements
+
+
+class TestUnavailableMessages(unittest.TestCase):
+    def setUp(self):
+        clear_message_caches()
+        self.shared_utils = SharedUtils("CONTINUATION", "CONTSBJ", "CONTAGG", "CONTUNAVAILREASON")
+
+    def tearDown(self):
+        clear_message_caches()
+
+    def test_cached_messages_match_uncached(self):
+        for elem in get_elements():
+            with self.subTest(elem=elem):
+                expected = self.render_uncached(elem)
+                self.assertEqual(expected, self.shared_utils.get_unavailable(elem))
+                self.assertEqual(expected, self.shared_utils.get_unavailable(elem))
+
+    def render_uncached(self, elem):
+        """Renders the unavailable messages for elem bypassing the cache"""
+        clear_message_caches()
+        with mock.patch(
+                "EtlPipeline.unavailable_messages.get_unavailable_reason",
+                get_unavailable_reason.__wrapped__,
+        ):
+            unavailable = self.shared_utils.get_unavailable(elem)
+        self.assertEqual(0, get_unavailable_reason.cache_info().currsize)
+        return unavailable
+
+    def test_repeated_messages_are_hits(self):
+        elem = {"CONTUNAVAILREASON": "1", "CONTAGG": "12", "CONTSBJ": "CAH09-01-01", "CONTPOP": "10"}
+        for _ in range(3):
+            self.shared_utils.get_unavailable(elem)
+
+        cache_info = get_message_cache_stats()["unavailable reason"]
+        # One English and one Welsh message
+        self.assertEqual((4, 2), (cache_info.hits, cache_info.misses))
+        self.assertAlmostEqual(2 / 3, get_hit_rate(cache_info))
+
+    def test_invalid_codes_raise_every_time(self):
+        for _ in range(2):
+            with self.assertLogs(level="ERROR"):
+                with self.assertRaises(StopEtlPipelineErrorException):
+                    self.shared_utils.get_unavailable({"CONTUNAVAILREASON": "1", "CONTAGG": "99", "CONTPOP": "10"})
+
+        self.assertEqual(0, get_unavailable_reason.cache_info().currsize)
+
+    def test_earnings_texts_are_cached(self):
+        expected = get_earnings_unavail_text.__wrapped__("sector", "leo", "region_is_ni")
+
+        self.assertEqual(expected, get_earnings_unavail_text("sector", "leo", "region_is_ni"))
+        self.assertIs(
+            get_earnings_unavail_text("sector", "leo", "region_is_ni"),
+            get_earnings_unavail_text("sector", "leo", "region_is_ni"),
+        )
+
+    def test_earnings_agg_messages_are_new_dicts(self):
+        subject = {"code": "CAH09-01-01", "english_label": "Maths", "welsh_label": "Mathemateg"}
+        first = get_earnings_agg_unavail_messages("21", subject)
+        first["english"] = "changed"
+        second = get_earnings_agg_unavail_messages("21", subject)
+
+        self.assertTrue(second["english"].startswith("The data displayed is from students on this and other courses in Maths."))
+        self.assertIn("chyrsiau Mathemateg eraill", second["welsh"])
+        self.assertEqual({}, get_earnings_agg_unavail_messages("11", subject))
+
+    def test_log_message_cache_stats(self):
+        get_earnings_unavail_text("institution", "go", "1")
+        get_earnings_unavail_text("institution", "go", "1")
+
+        with self.assertLogs(level="INFO") as logs:
+            log_message_cache_stats()
+
+        self.assertIn("earnings unavailable text message cache: 1 hits, 1 misses (50% hit rate, 1 cached)", logs.output[1])
+
+
+@benchmark
+class TestUnavailableMessagesBenchmark(unittest.TestCase):
+    def test_cached_messages_are_faster(self):
+        shared_utils = SharedUtils("CONTINUATION", "CONTSBJ", "CONTAGG", "CONTUNAVAILREASON")
+        elements = get_elements() * 20
+
+        def render_all():
+            for elem in elements:
+                shared_utils.get_unavailable(elem)
+
+        with mock.patch(
+                "EtlPipeline.unavailable_messages.get_unavailable_reason",
+                get_unavailable_reason.__wrapped__,
+        ):
+            uncached = min(timeit.repeat(render_all, number=5, repeat=3))
+        cached = min(timeit.repeat(render_all, number=5, repeat=3))
+
+        cache_info = get_unavailable_reason.cache_info()
+        print(
+            f"\nunavailable messages: {uncached:.3f}s uncached, {cached:.3f}s cached "
+            f"({get_hit_rate(cache_info):.0%} hit rate)"
+        )
+        self.assertLess(cached, uncached)
+        clear_message_caches()
+
+
+if __name__ == "__main__":
+    unittest.main()
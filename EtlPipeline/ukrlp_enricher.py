@@ -12,22 +12,19 @@ class UkRlpCourseEnricher:
     def enrich_course(self, course):
         """Takes a course and enriches ukprn names with UKRLP data"""
 
-        ukprn = course["course"]["institution"]["ukprn"]
-        course["course"]["institution"]["ukprn_name"] = self.get_ukprn_name(
-            ukprn
-        )
-        course["course"]["institution"]["ukprn_welsh_name"] = self.get_ukprn_welsh_name(
-            ukprn
-        )
-
-        pub_ukprn = course["course"]["institution"]["pub_ukprn"]
-        course["course"]["institution"][
-            "pub_ukprn_name"
-        ] = self.get_ukprn_name(pub_ukprn)
-        course["course"]["institution"][
-            "pub_ukprn_welsh_name"
-        ] = self.get_ukprn_welsh_name(pub_ukprn)
-        course["course"]["institution"]["pub_ukprn_country"] = self.get_country(pub_ukprn)
+        self.enrich_institution(course["course"]["institution"])
+
+    def enrich_institution(self, institution):
+        """Takes a course's institution object and enriches ukprn names with UKRLP data"""
+
+        ukprn = institution["ukprn"]
+        institution["ukprn_name"] = self.get_ukprn_name(ukprn)
+        institution["ukprn_welsh_name"] = self.get_ukprn_welsh_name(ukprn)
+
+        pub_ukprn = institution["pub_ukprn"]
+        institution["pub_ukprn_name"] = self.get_ukprn_name(pub_ukprn)
+        institution["pub_ukprn_welsh_name"] = self.get_ukprn_welsh_name(pub_ukprn)
+        institution["pub_ukprn_country"] = self.get_country(pub_ukprn)
 
     def get_ukprn_name(self, ukprn):
         """Returns a name for the ukprn"""
@@ -0,0 +1,118 @@
+"""Rendered unavailable-reason messages, cached for the run.
+
+Every stats element of every course without data gets an unavailable
+message in English and Welsh, and the earnings sections add their own
+texts. The messages only depend on a small set of inputs (the reason code,
+whether there is data, the aggregation code, the response rate state, the
+subject label and the language), so each one is rendered once and kept in
+a bounded LRU cache. Invalid codes raise before anything is cached.
+
+The lookup files the messages come from do not change during a run.
+Subject labels are part of the cache key, so changing the subject lookups
+never returns a stale message.
+"""
+
+import functools
+import logging
+import unicodedata
+
+from EtlPipeline.lookups import get_lookup
+from EtlPipeline.validators import validate_agg
+from EtlPipeline.validators import validate_unavailable_reason_code
+
+MESSAGE_CACHE_SIZE = 1024
+
+EARNINGS_AGG_UNAVAIL_MESSAGE_ENGLISH = "The data displayed is from students on this and other " \
+    "courses in [Subject].\n\nThis includes data from this and related courses at the same university or " \
+    "college. There was not enough data to publish more specific information. This does not reflect on " \
+    "the quality of the course."
+EARNINGS_AGG_UNAVAIL_MESSAGE_WELSH = "Daw'r data a ddangosir gan fyfyrwyr ar y cwrs hwn a chyrsiau " \
+    "[Subject] eraill.\n\nMae hwn yn cynnwys data o'r cwrs hwn a chyrsiau cysylltiedig yn yr un brifysgol " \
+    "neu goleg. Nid oedd digon o ddata ar gael i gyhoeddi gwybodaeth fwy manwl. Nid yw hyn yn adlewyrchu " \
+    "ansawdd y cwrs."
+
+
+@functools.lru_cache(maxsize=MESSAGE_CACHE_SIZE)
+def get_unavailable_reason(unavail_reason_code, has_data, agg, resp_rate_state, subject_label, welsh):
+    """Returns the unavailable reason for a stats element
+
+    subject_label replaces [Subject] in the message and is not used when
+    the element has no data.
+    """
+    validate_unavailable_reason_code(unavail_reason_code)
+    if welsh:
+        unavail_reason_lookup = get_lookup("unavail_reason_welsh")
+    else:
+        unavail_reason_lookup = get_lookup("unavail_reason_english")
+
+    if not has_data:
+        reason_str = unavail_reason_lookup["no-data"].get(unavail_reason_code)
+        return unicodedata.normalize("NFKD", reason_str)
+
+    validate_agg(unavail_reason_code, agg, unavail_reason_lookup)
+
+    # The lookup tables do not contain entries for code=0, agg=14 or code=0, agg=None.
+    #    No unavail message needs to be displayed in either of these scenarios.
+    if unavail_reason_code == '0':
+        partial_reason_str = unavail_reason_lookup["data"][unavail_reason_code].get(agg).get(resp_rate_state)
+    else:
+        partial_reason_str = unavail_reason_lookup["data"][unavail_reason_code].get(agg)
+
+    partial_reason_str = unicodedata.normalize("NFKD", partial_reason_str)
+    return partial_reason_str.replace("[Subject]", subject_label)
+
+
+@functools.lru_cache(maxsize=MESSAGE_CACHE_SIZE)
+def get_earnings_unavail_text(inst_or_sect, data_source, key_level_3):
+    """Returns the relevant earnings unavail reason text in English and Welsh"""
+
+    earnings_unavail_reason_lookup_english = get_lookup(
+        "earnings_unavail_reason_english"
+    )
+    earnings_unavail_reason_lookup_welsh = get_lookup(
+        "earnings_unavail_reason_welsh"
+    )
+
+    unavail_text_english = earnings_unavail_reason_lookup_english[inst_or_sect][data_source][key_level_3]
+    unavail_text_welsh = earnings_unavail_reason_lookup_welsh[inst_or_sect][data_source][key_level_3]
+
+    return unicodedata.normalize("NFKD", unavail_text_english), \
+        unicodedata.normalize("NFKD", unavail_text_welsh)
+
+
+@functools.lru_cache(maxsize=MESSAGE_CACHE_SIZE)
+def get_earnings_agg_unavail_messages(english_label, welsh_label):
+    """Returns the English and Welsh messages shown when earnings are aggregated across a subject"""
+
+    return EARNINGS_AGG_UNAVAIL_MESSAGE_ENGLISH.replace("[Subject]", english_label), \
+        EARNINGS_AGG_UNAVAIL_MESSAGE_WELSH.replace("[Subject]", welsh_label)
+
+
+MESSAGE_CACHES = {
+    "unavailable reason": get_unavailable_reason,
+    "earnings unavailable text": get_earnings_unavail_text,
+    "earnings aggregation message": get_earnings_agg_unavail_messages,
+}
+
+
+def get_hit_rate(cache_info):
+    lookups = cache_info.hits + cache_info.misses
+    return cache_info.hits / lookups if lookups else 0.0
+
+
+def get_message_cache_stats():
+    """Returns the functools cache_info() of each message cache by name"""
+    return {name: cached.cache_info() for name, cached in MESSAGE_CACHES.items()}
+
+
+def log_message_cache_stats():
+    for name, cache_info in get_message_cache_stats().items():
+        logging.info(
+            f"{name} message cache: {cache_info.hits} hits, {cache_info.misses} misses "
+            f"({get_hit_rate(cache_info):.0%} hit rate, {cache_info.currsize} cached)"
+        )
+
+
+def clear_message_caches():
+    for cached in MESSAGE_CACHES.values():
+        cached.cache_clear()
@@ -1,3 +1,4 @@
+from EtlPipeline import unavailable_messages
 from EtlPipeline.course_stats import SharedUtils
 
 
@@ -27,16 +28,7 @@ def get_earnings_agg_unavail_messages(agg_value, subject):
     earnings_agg_unavail_messages = {}
 
     if agg_value in ['21', '22']:
-        message_english = "The data displayed is from students on this and other " \
-                          "courses in [Subject].\n\nThis includes data from this and related courses at the same university or " \
-                          "college. There was not enough data to publish more specific information. This does not reflect on " \
-                          "the quality of the course."
-        message_welsh = "Daw'r data a ddangosir gan fyfyrwyr ar y cwrs hwn a chyrsiau " \
-                        "[Subject] eraill.\n\nMae hwn yn cynnwys data o'r cwrs hwn a chyrsiau cysylltiedig yn yr un brifysgol " \
-                        "neu goleg. Nid oedd digon o ddata ar gael i gyhoeddi gwybodaeth fwy manwl. Nid yw hyn yn adlewyrchu " \
-                        "ansawdd y cwrs."
-
-        earnings_agg_unavail_messages['english'] = message_english.replace("[Subject]", subject['english_label'])
-        earnings_agg_unavail_messages['welsh'] = message_welsh.replace("[Subject]", subject['welsh_label'])
+        earnings_agg_unavail_messages['english'], earnings_agg_unavail_messages['welsh'] = \
+            unavailable_messages.get_earnings_agg_unavail_messages(subject['english_label'], subject['welsh_label'])
 
     return earnings_agg_unavail_messages
@@ -12,11 +12,17 @@ import azure.functions as func
 from SharedCode.blob_helper import BlobHelper
 # from SharedCode.mail_helper import MailHelper
 
+from . import manifest
 from . import search
 
 
 def main(req: func.HttpRequest,) -> None:
-    """Create the postcode search index"""
+    """Create the postcode search index
+
+    Only the postcodes that changed since the last run are sent to the
+    index, unless the request asks for a full rebuild with rebuild=true or
+    there is no manifest of the last run to compare against.
+    """
 
     logging.info(f"PostcodeSearchBuilder request triggered")
 
@@ -36,22 +42,42 @@ def main(req: func.HttpRequest,) -> None:
     try:
         blob_helper = BlobHelper()
 
-        # Read the Blob into a BytesIO object
+        # Stream the Blob
         storage_container_name = os.environ["AzureStoragePostcodesContainerName"]
         storage_blob_name = os.environ["AzureStoragePostcodesBlobName"]
-
-        csv_string = blob_helper.get_str_file(storage_container_name, storage_blob_name)
-
-        rows = csv_string.splitlines()
-        number_of_postcodes = len(rows)
-
-        # Create postcode search index
-        search.build_index(search_url, api_key, api_version, index_name)
-
-        # Add postcode documents to postcode search index
-        logging.info(f'attempting to load postcodes to azure search\n\
+        manifest_blob_name = os.environ.get("AzureStoragePostcodesManifestBlobName", "postcodes-manifest.csv.gz")
+
+        schema_fingerprint = search.get_schema_fingerprint()
+        previous_manifest = None
+        if req.params.get("rebuild", "").lower() == "true":
+            logging.info("full rebuild of the postcode search index requested")
+        elif search.index_exists(search_url, api_key, api_version, index_name):
+            previous_manifest = manifest.read_manifest(
+                blob_helper, storage_container_name, manifest_blob_name, schema_fingerprint
+            )
+
+        # The blob is decompressed and parsed as the postcodes are loaded,
+        # so only the batches being uploaded are held in memory
+        with blob_helper.get_gzip_text_stream(storage_container_name, storage_blob_name) as rows:
+
+            if previous_manifest is None:
+                manifest.clear_manifest(blob_helper, storage_container_name, manifest_blob_name)
+
+                # Create postcode search index
+                search.build_index(search_url, api_key, api_version, index_name)
+
+            # Add postcode documents to postcode search index
+            logging.info('attempting to load postcodes to azure search')
+            postcode_manifest = manifest.ManifestWriter(schema_fingerprint)
+            number_of_postcodes = search.load_index(
+                search_url, api_key, api_version, index_name, rows, postcode_manifest, previous_manifest
+            )
+
+        logging.info(f'loaded postcodes to azure search\n\
                         number_of_postcodes: {number_of_postcodes}\n')
-        search.load_index(search_url, api_key, api_version, index_name, rows)
+
+        # Only written once the index matches it
+        manifest.write_manifest(blob_helper, storage_container_name, manifest_blob_name, postcode_manifest)
 
         function_end_datetime = datetime.today().strftime("%d-%m-%Y %H:%M:%S")
         function_end_date = datetime.today().strftime("%d.%m.%Y")
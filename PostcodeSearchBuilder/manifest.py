@@ -0,0 +1,170 @@
+"""Fingerprints of the postcodes in the search index, kept between runs.
+
+After each load the id and a fingerprint of the search document fields of
+every postcode in the index are written to a gzip csv blob, headed by a
+fingerprint of the index schema. The next run compares the postcode file
+against it, so only postcodes that were added, changed or removed are
+sent to the index. A missing manifest, one written for a different schema
+or one that cannot be read means the index has to be rebuilt in full. The
+manifest is cleared before a full rebuild starts, so a rebuild that fails
+part way is rebuilt in full again.
+
+Neither manifest is held as a dict of every postcode. The manifest being
+written is streamed to a compressed temporary file as the postcodes are
+loaded, and the previous one is held as sorted arrays of 64 bit keys of the
+ids and their fingerprints, with the ids of the postcodes that were removed
+read from the blob again once the load has finished.
+"""
+
+import array
+import gzip
+import hashlib
+import logging
+import tempfile
+import zlib
+
+import numpy
+from azure.core.exceptions import ResourceNotFoundError
+
+SCHEMA_ROW_ID = "schema"
+LINES_PER_WRITE = 10000
+
+
+def get_fingerprint(document):
+    """Returns a 64 bit fingerprint of serialised search document fields, or of the index schema"""
+    return int.from_bytes(hashlib.blake2b(document, digest_size=8).digest(), "big")
+
+
+def get_id_key(postcode_id):
+    """Returns a 64 bit key of a postcode id, which the previous manifest is looked up by"""
+    return int.from_bytes(hashlib.blake2b(postcode_id.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def read_manifest(blob_helper, storage_container_name, storage_blob_name, schema_fingerprint):
+    """Returns the PreviousManifest of the last run, or None if there is none to compare against"""
+    keys = array.array("Q")
+    fingerprints = array.array("Q")
+    try:
+        with blob_helper.get_gzip_text_stream(storage_container_name, storage_blob_name) as lines:
+            header_row = next(lines, "").rstrip("\r\n")
+            if header_row != f"{SCHEMA_ROW_ID},{schema_fingerprint:016x}":
+                logging.info(f"postcode manifest was cleared or is for a different index schema\n\
+                                manifest: {storage_blob_name}")
+                return None
+
+            for line in lines:
+                postcode_id, fingerprint = line.rstrip("\r\n").rsplit(",", 1)
+                fingerprints.append(int(fingerprint, 16))
+                keys.append(get_id_key(postcode_id))
+    except ResourceNotFoundError:
+        logging.info(f"no postcode manifest found\n\
+                        manifest: {storage_blob_name}")
+        return None
+    except (ValueError, EOFError, OSError, zlib.error):
+        # A truncated or corrupt manifest, which gzip.BadGzipFile is an OSError of
+        logging.warning(f"postcode manifest could not be read\n\
+                          manifest: {storage_blob_name}", exc_info=True)
+        return None
+
+    logging.info(f"read postcode manifest\n\
+                    manifest: {storage_blob_name}\n\
+                    number_of_postcodes: {len(keys)}")
+    return PreviousManifest(
+        blob_helper, storage_container_name, storage_blob_name,
+        numpy.frombuffer(keys, dtype=numpy.uint64), numpy.frombuffer(fingerprints, dtype=numpy.uint64),
+    )
+
+
+def clear_manifest(blob_helper, storage_container_name, storage_blob_name):
+    """Replaces the manifest with one that read_manifest will not compare against"""
+    blob_helper.write_stream_file(
+        storage_container_name, storage_blob_name, gzip.compress(f"{SCHEMA_ROW_ID},\n".encode("utf-8"))
+    )
+
+
+def write_manifest(blob_helper, storage_container_name, storage_blob_name, manifest_writer):
+    """Uploads the postcode fingerprints recorded by a ManifestWriter for the next run to compare against"""
+    with manifest_writer.close() as manifest_file:
+        blob_helper.write_stream_file(storage_container_name, storage_blob_name, manifest_file)
+
+
+class ManifestWriter:
+    """Records the fingerprint of each postcode loaded, compressing them into a temporary file"""
+
+    def __init__(self, schema_fingerprint):
+        self.temporary_file = tempfile.TemporaryFile()
+        self.manifest_file = gzip.GzipFile(fileobj=self.temporary_file, mode="wb")
+        self.manifest_file.write(f"{SCHEMA_ROW_ID},{schema_fingerprint:016x}\n".encode("utf-8"))
+        self.lines = []
+
+    def add(self, postcode_ids, fingerprints):
+        for postcode_id, fingerprint in zip(postcode_ids, fingerprints):
+            self.lines.append(f"{postcode_id},{fingerprint:016x}\n")
+        if len(self.lines) >= LINES_PER_WRITE:
+            self.write_lines()
+
+    def write_lines(self):
+        self.manifest_file.write("".join(self.lines).encode("utf-8"))
+        self.lines = []
+
+    def close(self):
+        """Returns the compressed manifest as a binary file read from its start"""
+        self.write_lines()
+        self.manifest_file.close()
+        self.temporary_file.seek(0)
+        return self.temporary_file
+
+
+class PreviousManifest:
+    """The postcode fingerprints of the last run, which each postcode loaded is checked against
+
+    keys and fingerprints are arrays in the order of the lines of the
+    manifest blob. They are sorted by key so a batch of postcodes is looked
+    up at once, and each postcode found is marked as seen. Those never seen
+    are no longer in the postcode file, and their ids are read from the
+    blob again by iter_removed_ids.
+    """
+
+    def __init__(self, blob_helper, storage_container_name, storage_blob_name, keys, fingerprints):
+        self.blob_helper = blob_helper
+        self.storage_container_name = storage_container_name
+        self.storage_blob_name = storage_blob_name
+
+        self.line_numbers = numpy.argsort(keys, kind="stable").astype(numpy.uint32)
+        self.keys = keys[self.line_numbers]
+        self.fingerprints = fingerprints[self.line_numbers]
+        self.seen = numpy.zeros(len(keys), dtype=bool)
+        # Only the first line of an id that appears more than once is looked up or removed
+        self.seen[1:] = self.keys[1:] == self.keys[:-1]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get_changed(self, postcode_ids, fingerprints):
+        """Returns whether each postcode is new or has a different fingerprint, marking those found as seen"""
+        if not len(self.keys):
+            return [True] * len(postcode_ids)
+
+        keys = numpy.fromiter((get_id_key(postcode_id) for postcode_id in postcode_ids),
+                              dtype=numpy.uint64, count=len(postcode_ids))
+        fingerprints = numpy.fromiter(fingerprints, dtype=numpy.uint64, count=len(postcode_ids))
+
+        positions = numpy.minimum(numpy.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[positions] == keys
+        self.seen[positions[found]] = True
+
+        return (~found | (self.fingerprints[positions] != fingerprints)).tolist()
+
+    def get_removed_count(self):
+        return len(self.seen) - int(numpy.count_nonzero(self.seen))
+
+    def iter_removed_ids(self):
+        """Yields the ids of the postcodes that were never seen, reading them from the manifest blob"""
+        removed = numpy.zeros(len(self.seen), dtype=bool)
+        removed[self.line_numbers[~self.seen]] = True
+
+        with self.blob_helper.get_gzip_text_stream(self.storage_container_name, self.storage_blob_name) as lines:
+            next(lines, None)
+            for line_number, line in enumerate(lines):
+                if removed[line_number]:
+                    yield line.rstrip("\r\n").rsplit(",", 1)[0]
@@ -1,4 +1,23 @@
+import json
 import logging
+import re
+from collections import Counter
+
+import numpy
+
+MIN_LATITUDE = 49
+MAX_LATITUDE = 61
+MIN_LONGITUDE = -11
+MAX_LONGITUDE = 2.5
+
+# Serialised the way json.dumps serialises the documents build_postcode_search_doc returns,
+# the search action followed by the fields of the postcode
+SEARCH_ACTION_JSON = '{"@search.action": %s, '
+POSTCODE_FIELDS_JSON = '"id": %s, "geo": {"type": "Point", ' \
+    '"coordinates": [%s, %s]}, "latitude": %s, "longitude": %s, "postcode": %s}'
+REJECT_REASONS = ("malformed", "missing coordinates", "invalid coordinates", "outside the UK")
+# Printable ASCII other than quotes and backslashes, which JSON strings hold as they are
+PLAIN_JSON_STRING = re.compile(r'[ !#-\[\]-~]*\Z')
 
 
 def build_postcode_search_doc(postcode_list):
@@ -46,7 +65,7 @@ def build_postcode_search_doc(postcode_list):
 
 
 def validate_latitude(latitude):
-    if latitude < 49 or latitude > 61:
+    if latitude < MIN_LATITUDE or latitude > MAX_LATITUDE:
         logging.warning(f"latitude not valid for a UK postcode\n\
                           latitude:{latitude}")
         return True
@@ -55,7 +74,7 @@ def validate_latitude(latitude):
 
 
 def validate_longitude(longitude):
-    if longitude < -11 or longitude > 2.5:
+    if longitude < MIN_LONGITUDE or longitude > MAX_LONGITUDE:
         logging.warning(f"longitude not valid for a UK postcode\n\
                           longitude:{longitude}")
         return True
@@ -64,6 +83,9 @@ def validate_longitude(longitude):
 
 
 def validate_header(header_row):
+    if len(header_row) < 4:
+        return True
+
     invalid = False
     if header_row[0] != "id":
         invalid = True
@@ -86,3 +108,116 @@ def is_float(value):
         return True, new_value
     except ValueError:
         return False, None
+
+
+def build_postcode_fields_json(rows):
+    """Returns the id and serialised fields of each valid row in a chunk of postcode csv rows
+
+    The fields are formatted straight from the columns without building each
+    dict first, and make a search document following get_search_action_json.
+    """
+    ids, postcodes, latitudes, longitudes = get_valid_postcodes(rows)
+    # repr is how json.dumps writes floats, and each coordinate appears twice
+    return [
+        (postcode_id, (POSTCODE_FIELDS_JSON % (id_json, longitude, latitude, latitude, longitude, postcode_json)).encode("utf-8"))
+        for postcode_id, id_json, postcode_json, latitude, longitude in zip(
+            ids, get_json_strings(ids), get_json_strings(postcodes), map(repr, latitudes), map(repr, longitudes)
+        )
+    ]
+
+
+def get_search_action_json(action):
+    """Returns the start of a serialised search document with action as its search action"""
+    return (SEARCH_ACTION_JSON % json.dumps(action)).encode("utf-8")
+
+
+def get_json_strings(values):
+    """Returns each of values as a JSON string, quoting them directly when none needs escaping"""
+    if PLAIN_JSON_STRING.match("".join(values)):
+        return [f'"{value}"' for value in values]
+    return [json.dumps(value) for value in values]
+
+
+def get_valid_postcodes(rows):
+    """Returns the ids, postcodes, latitudes and longitudes of the valid rows in a chunk
+
+    Rows are checked as build_postcode_search_doc checks them, with the
+    coordinates of the whole chunk validated together using NumPy.
+    Coordinates that are not finite are also rejected, and the rejected
+    rows are summarised in one warning for the chunk instead of one for
+    each row.
+    """
+    rejects = Counter()
+    number_of_rows = len(rows)
+    if rows and min(map(len, rows)) < 4:
+        rows = [row for row in rows if len(row) >= 4]
+        rejects["malformed"] = number_of_rows - len(rows)
+    if not rows:
+        log_rejects(rejects, number_of_rows)
+        return [], [], [], []
+
+    # zip stops at the shortest row, so the first four columns are complete
+    ids, postcodes, latitudes, longitudes = list(zip(*rows))[:4]
+
+    valid, latitudes, longitudes = validate_coordinates(latitudes, longitudes, rejects)
+
+    log_rejects(rejects, number_of_rows)
+
+    ids = [ids[i].strip() for i in valid]
+    postcodes = [postcodes[i].strip().lower().replace(" ", "") for i in valid]
+    return ids, postcodes, latitudes, longitudes
+
+
+def log_rejects(rejects, number_of_rows):
+    """Logs one warning summarising the rows of a chunk that were rejected, if any were"""
+    if rejects:
+        reasons = {reason: rejects[reason] for reason in REJECT_REASONS if rejects[reason]}
+        logging.warning(f"rejected {sum(rejects.values())} of {number_of_rows} postcodes\n\
+                          reasons: {reasons}")
+
+
+def validate_coordinates(latitudes, longitudes, rejects):
+    """Returns the indexes of the valid coordinates and their values as floats, counting rejects
+
+    The whole columns are checked at once with NumPy.
+    """
+    latitudes, missing_latitudes, invalid_latitudes = parse_coordinates(latitudes)
+    longitudes, missing_longitudes, invalid_longitudes = parse_coordinates(longitudes)
+
+    missing = missing_latitudes | missing_longitudes
+    invalid = ~missing & (
+        invalid_latitudes | invalid_longitudes | ~numpy.isfinite(latitudes) | ~numpy.isfinite(longitudes)
+    )
+    outside = ~missing & ~invalid & (
+        (latitudes < MIN_LATITUDE) | (latitudes > MAX_LATITUDE)
+        | (longitudes < MIN_LONGITUDE) | (longitudes > MAX_LONGITUDE)
+    )
+    valid = ~(missing | invalid | outside)
+
+    for reason, rejected in (("missing coordinates", missing), ("invalid coordinates", invalid), ("outside the UK", outside)):
+        if rejected.any():
+            rejects[reason] += int(rejected.sum())
+
+    return numpy.flatnonzero(valid).tolist(), latitudes[valid].tolist(), longitudes[valid].tolist()
+
+
+def parse_coordinates(values):
+    """Returns a column of coordinates as floats, with masks of the missing values and those that are not numbers
+
+    NumPy parses the whole column in one call. Only a column with a missing
+    or invalid value is looked at a value at a time.
+    """
+    not_any = numpy.zeros(len(values), dtype=bool)
+    try:
+        return numpy.array(values, dtype=numpy.float64), not_any, not_any
+    except ValueError:
+        pass
+
+    values = [value.strip() for value in values]
+    missing = numpy.array([value == "" for value in values], dtype=bool)
+    try:
+        return numpy.array([value or "nan" for value in values], dtype=numpy.float64), missing, not_any
+    except ValueError:
+        parsed = [is_float(value) if value else (True, numpy.nan) for value in values]
+        floats = numpy.array([value if is_number else numpy.nan for is_number, value in parsed], dtype=numpy.float64)
+        return floats, missing, numpy.array([not is_number for is_number, value in parsed], dtype=bool)
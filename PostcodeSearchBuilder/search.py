@@ -1,9 +1,14 @@
+import csv
 import logging
 import requests
 import json
 import os
 
+from SharedCode.exceptions import SearchUploadError
+from SharedCode.search_uploader import SearchUploader
+
 from . import exceptions
+from . import manifest
 from . import models
 
 
@@ -18,16 +23,60 @@ def build_index(url, api_key, api_version, index_name):
         raise
 
 
-def load_index(url, api_key, api_version, index_name, rows):
+def index_exists(url, api_key, api_version, index_name):
+    index = Index(url, api_key, api_version, index_name)
+
+    return index.exists()
+
+
+def load_index(url, api_key, api_version, index_name, rows,
+               postcode_manifest=None, previous_manifest=None):
 
     try:
-        load = Loader(url, api_key, api_version, index_name, rows)
+        load = Loader(url, api_key, api_version, index_name, rows,
+                      postcode_manifest, previous_manifest)
 
-        load.postcode_documents()
+        return load.postcode_documents()
     except Exception:
         raise
 
 
+def get_schema_fingerprint():
+    """Returns a fingerprint of the postcode index schema, which changes whenever the schema does"""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(cwd, 'schemas/postcode.json'), 'rb') as schema_file:
+        return manifest.get_fingerprint(schema_file.read())
+
+
+def iter_postcode_chunks(rows, batch_size):
+    """Yields the rows of the postcode csv after its header in lists of up to batch_size
+
+    rows are the lines of the postcode csv, header first, and can be a file
+    object streaming the blob. They are parsed as they are needed, so only
+    one chunk of rows is held at a time.
+    """
+    reader = csv.reader(rows)
+
+    header_row = [r.strip() for r in next(reader, [])]
+    if models.validate_header(header_row):
+        logging.error(f'invalid header row\n\
+                        header_row: {header_row}')
+        raise exceptions.StopEtlPipelineErrorException
+    logging.info('skipping header row')
+
+    chunk = []
+    for row in reader:
+        if row:
+            chunk.append(row)
+
+        if len(chunk) == batch_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
 class Index():
     """Creates a new index"""
     def __init__(self, url, api_key, api_version, index_name):
@@ -69,6 +118,30 @@ class Index():
 
             raise exceptions.StopEtlPipelineErrorException
 
+    def exists(self):
+
+        try:
+            get_url = self.url + "/indexes/" + self.index_name + \
+                self.query_string
+
+            response = requests.get(get_url, headers=self.headers)
+
+        except requests.exceptions.RequestException as e:
+            logging.exception('unexpected error getting index', exc_info=True)
+            raise exceptions.StopEtlPipelineErrorException(e)
+
+        if response.status_code == 404:
+            return False
+
+        if response.status_code != 200:
+            logging.error(f'unexpected response when getting search index\n\
+                            index-name: {self.index_name}\n\
+                            status: {response.status_code}')
+
+            raise exceptions.StopEtlPipelineErrorException
+
+        return True
+
     def create(self):
         self.build_postcode_schema()
 
@@ -99,75 +172,107 @@ class Index():
 
 
 class Loader():
-    """Loads postcode documents into search index"""
-    def __init__(self, url, api_key, api_version, index_name, rows):
+    """Loads postcode documents into search index
+
+    rows are the lines of the postcode csv, such as a text stream of the
+    blob, and are read a batch at a time. Batches are uploaded by a
+    SearchUploader, so the next batch of rows is read while earlier ones are
+    still being uploaded.
+
+    When postcode_manifest is a manifest.ManifestWriter the fingerprint of
+    every postcode is recorded in it. When previous_manifest is the
+    manifest.PreviousManifest of the postcodes already in the index, only
+    the postcodes that changed are sent, as mergeOrUpload actions, and the
+    postcodes that are no longer in the file are deleted.
+    """
+
+    bulk_postcode_count = 1000
+
+    def __init__(self, url, api_key, api_version, index_name, rows,
+                 postcode_manifest=None, previous_manifest=None):
 
-        self.url = url
-        self.headers = {
-            'Content-Type': 'application/json',
-            'api-key': api_key,
-            'odata': 'verbose'
-        }
-        self.query_string = '?api-version=' + api_version
         self.index_name = index_name
+        self.uploader = SearchUploader(url, api_key, api_version, index_name,
+                                       max_batch_docs=self.bulk_postcode_count)
 
         self.rows = rows
+        self.postcode_manifest = postcode_manifest
+        self.previous_manifest = previous_manifest
+        # Postcodes already in the index are replaced rather than uploaded
+        action = "upload" if previous_manifest is None else "mergeOrUpload"
+        self.action_json = models.get_search_action_json(action)
+        self.changed_count = 0
+        self.deleted_count = 0
 
     def postcode_documents(self):
+        """Loads every postcode in rows and returns the number loaded"""
 
-        number_of_docs = len(self.rows)
         postcode_count = 0
-        bulk_postcode_count = 1000
-        documents = {}
-        search_postcodes = []
-        for row in self.rows:
-            postcode_count += 1
-            postcode_list = [r.strip() for r in row.split(',')]
+        for chunk in iter_postcode_chunks(self.rows, self.bulk_postcode_count):
+            postcode_fields = models.build_postcode_fields_json(chunk)
+            postcode_count += len(postcode_fields)
+
+            self.bulk_create_postcodes(self.get_changed_postcodes(postcode_fields))
+
+            logging.info(
+                f'queued {postcode_count} postcodes for upload to azure search\n\
+                    index: {self.index_name}\n')
+
+        if self.previous_manifest is not None:
+            # Whatever was not seen in the previous manifest is no longer in the file
+            self.deleted_count = self.previous_manifest.get_removed_count()
+            self.bulk_create_postcodes(
+                (postcode_id, get_delete_json(postcode_id))
+                for postcode_id in self.previous_manifest.iter_removed_ids()
+            )
+            logging.info(f'{self.changed_count} postcodes changed and {self.deleted_count} were removed\n\
+                            index: {self.index_name}')
 
-            if postcode_count == 1:
-                if models.validate_header(postcode_list):
-                    logging.error(f"invalid header row\n\
-                                    header_row: {postcode_list}")
-                    raise exceptions.StopEtlPipelineErrorException
-                    break
+        try:
+            self.uploader.flush()
+        except SearchUploadError as e:
+            logging.error(f'failed to bulk load postcode search documents\n\
+                            index-name: {self.index_name}\n\
+                            error: {e}')
 
-                logging.info("skipping header row")
-                continue
+            raise exceptions.StopEtlPipelineErrorException(e)
 
-            search_postcode = models.build_postcode_search_doc(postcode_list)
-            if search_postcode:
-                search_postcodes.append(search_postcode)
+        return postcode_count
 
-            if postcode_count % bulk_postcode_count == 0 or\
-               postcode_count == number_of_docs:
+    def bulk_create_postcodes(self, search_postcodes):
+        """Queues a batch of (id, serialised document) postcodes with the uploader"""
+        for postcode_id, document in search_postcodes:
+            self.uploader.add_json(postcode_id, document)
 
-                documents['value'] = search_postcodes
+    def get_changed_postcodes(self, postcode_fields):
+        """Returns the documents of the postcodes that need uploading, recording the fingerprint of each one
 
-                self.bulk_create_postcodes(documents)
+        postcode_fields are the ids and serialised fields of a batch of
+        postcodes. The fingerprints are of the fields, so they do not depend
+        on the search action the documents are sent with.
+        """
+        if self.postcode_manifest is None and self.previous_manifest is None:
+            return [(postcode_id, self.action_json + fields) for postcode_id, fields in postcode_fields]
 
-                logging.info(
-                    f'successfully loaded {postcode_count} postcodes into azure search\n\
-                        index: {self.index_name}\n')
+        postcode_ids = [postcode_id for postcode_id, fields in postcode_fields]
+        fingerprints = [manifest.get_fingerprint(fields) for postcode_id, fields in postcode_fields]
+        if self.postcode_manifest is not None:
+            self.postcode_manifest.add(postcode_ids, fingerprints)
 
-                # Empty variables
-                documents = {}
-                search_postcodes = []
+        if self.previous_manifest is None:
+            changed = [True] * len(postcode_fields)
+        else:
+            changed = self.previous_manifest.get_changed(postcode_ids, fingerprints)
 
-    def bulk_create_postcodes(self, documents):
-        try:
-            url = self.url + "/indexes/" + self.index_name + \
-                "/docs/index" + self.query_string
+        changed_postcodes = [
+            (postcode_id, self.action_json + fields)
+            for (postcode_id, fields), is_changed in zip(postcode_fields, changed)
+            if is_changed
+        ]
 
-            response = requests.post(url, headers=self.headers, json=documents)
+        self.changed_count += len(changed_postcodes)
+        return changed_postcodes
 
-        except requests.exceptions.RequestException as e:
-            logging.exception('unexpected error creating index', exc_info=True)
-            raise exceptions.StopEtlPipelineErrorException(e)
-
-        if response.status_code != 200:
-            logging.error(f'failed to bulk load postcode search documents\n\
-                            index-name: {self.index_name}\n\
-                            status: {response.status_code}\n\
-                            documents: {documents}')
 
-            raise exceptions.StopEtlPipelineErrorException
+def get_delete_json(postcode_id):
+    return json.dumps({"@search.action": "delete", "id": postcode_id}).encode("utf-8")
@@ -0,0 +1,298 @@
+import gzip
+import io
+import json
+import unittest
+from unittest import mock
+
+from azure.core.exceptions import ResourceNotFoundError
+
+import PostcodeSearchBuilder
+from PostcodeSearchBuilder import exceptions
+from PostcodeSearchBuilder import manifest
+from PostcodeSearchBuilder import search
+from SharedCode.fake_search_session import FakeSearchSession
+
+HEADER = "id,postcode,latitude,longitude"
+ROWS = [
+    "1,CF5 1AB,51.4860,-3.2282",
+    "2,CF10 3AT,51.4816,-3.1791",
+    "3,SW1A 1AA,51.5010,-0.1419",
+]
+
+ENVIRONMENT = {
+    "Environment": "test",
+    "SearchAPIKey": "key",
+    "SearchURL": "https://search.example",
+    "AzureSearchAPIVersion": "2019-05-06",
+    "PostcodeIndexName": "postcodes",
+    "AzureStoragePostcodesContainerName": "postcodes",
+    "AzureStoragePostcodesBlobName": "postcodes.csv.gz",
+}
+
+
+class FakeBlobHelper:
+    def __init__(self):
+        self.blobs = {}
+
+    def get_gzip_text_stream(self, storage_container_name, storage_blob_name):
+        if storage_blob_name not in self.blobs:
+            raise ResourceNotFoundError("blob not found")
+        stream = gzip.GzipFile(fileobj=io.BytesIO(self.blobs[storage_blob_name]), mode="rb")
+        return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    def write_stream_file(self, storage_container_name, storage_blob_name, encoded_file):
+        if hasattr(encoded_file, "read"):
+            encoded_file = encoded_file.read()
+        self.blobs[storage_blob_name] = encoded_file
+
+    def get_fingerprints(self, storage_blob_name):
+        """Returns the fingerprints of a manifest blob by id"""
+        lines = gzip.decompress(self.blobs[storage_blob_name]).decode("utf-8").splitlines()[1:]
+        return {postcode_id: int(fingerprint, 16) for postcode_id, fingerprint in (line.rsplit(",", 1) for line in lines)}
+
+
+class RecordingSearchSession(FakeSearchSession):
+    """Keeps the last document posted for each key as well as the index contents"""
+
+    def __init__(self, documents=None, outcomes=()):
+        super().__init__(outcomes)
+        self.posted = {}
+        self.documents = dict(documents or {})
+
+    def post(self, url, headers, data):
+        for doc in json.loads(data)["value"]:
+            self.posted[doc["id"]] = doc
+        return super().post(url, headers, data)
+
+
+def load_postcodes(session, rows, postcode_manifest=None, previous_manifest=None):
+    with mock.patch("SharedCode.search_uploader.get_session", return_value=session):
+        loader = search.Loader(
+            "https://search.example", "key", "2019-05-06", "postcodes", [HEADER] + rows,
+            postcode_manifest, previous_manifest,
+        )
+    loader.postcode_documents()
+    return loader
+
+
+def get_actions(session):
+    return sorted(
+        (doc["@search.action"], doc["id"])
+        for post in session.posts
+        for doc in (session.posted[key] for key in post)
+    )
+
+
+def write_manifest(blob_helper, fingerprints, schema_fingerprint=1):
+    manifest_writer = manifest.ManifestWriter(schema_fingerprint)
+    manifest_writer.add(list(fingerprints), list(fingerprints.values()))
+    manifest.write_manifest(blob_helper, "postcodes", "manifest.csv.gz", manifest_writer)
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.blob_helper = FakeBlobHelper()
+
+    def read(self, schema_fingerprint=1):
+        return manifest.read_manifest(self.blob_helper, "postcodes", "manifest.csv.gz", schema_fingerprint)
+
+    def test_manifest_round_trip(self):
+        fingerprints = {"1": 2 ** 64 - 1, "a,b": 0, "3": 3}
+
+        write_manifest(self.blob_helper, fingerprints)
+        previous_manifest = self.read()
+
+        self.assertEqual(fingerprints, self.blob_helper.get_fingerprints("manifest.csv.gz"))
+        self.assertEqual(3, len(previous_manifest))
+        self.assertEqual(
+            [False, True, True],
+            previous_manifest.get_changed(["1", "a,b", "4"], [2 ** 64 - 1, 1, 0]),
+        )
+        self.assertEqual(1, previous_manifest.get_removed_count())
+        self.assertEqual(["3"], list(previous_manifest.iter_removed_ids()))
+
+    def test_repeated_id_is_removed_once(self):
+        manifest_writer = manifest.ManifestWriter(1)
+        manifest_writer.add(["1", "2", "1"], [1, 2, 1])
+        manifest.write_manifest(self.blob_helper, "postcodes", "manifest.csv.gz", manifest_writer)
+        previous_manifest = self.read()
+
+        self.assertEqual([False], previous_manifest.get_changed(["2"], [2]))
+        self.assertEqual(["1"], list(previous_manifest.iter_removed_ids()))
+
+    def test_empty_manifest_has_every_postcode_changed(self):
+        write_manifest(self.blob_helper, {})
+        previous_manifest = self.read()
+
+        self.assertEqual([True, True], previous_manifest.get_changed(["1", "2"], [1, 2]))
+        self.assertEqual([], list(previous_manifest.iter_removed_ids()))
+
+    def test_manifest_is_not_used_for_another_schema(self):
+        write_manifest(self.blob_helper, {"1": 1})
+
+        with self.assertLogs(level="INFO"):
+            self.assertIsNone(self.read(schema_fingerprint=2))
+
+    def test_missing_or_cleared_manifest_is_not_used(self):
+        with self.assertLogs(level="INFO"):
+            self.assertIsNone(self.read())
+
+        write_manifest(self.blob_helper, {"1": 1})
+        manifest.clear_manifest(self.blob_helper, "postcodes", "manifest.csv.gz")
+        with self.assertLogs(level="INFO"):
+            self.assertIsNone(self.read())
+
+    def test_corrupt_manifest_is_not_used(self):
+        write_manifest(self.blob_helper, {"1": 1, "2": 2})
+        written = self.blob_helper.blobs["manifest.csv.gz"]
+        header = f"schema,{1:016x}\n"
+        corrupt_blobs = {
+            "truncated": written[:-10],
+            "not gzip": b"schema,0000000000000001\n",
+            "corrupt data": written[:10] + bytes(len(written) - 18) + written[-8:],
+            "malformed line": gzip.compress(f"{header}1,0000000000000001\n2\n".encode("utf-8")),
+            "malformed fingerprint": gzip.compress(f"{header}1,fingerprint\n".encode("utf-8")),
+        }
+
+        for name, blob in corrupt_blobs.items():
+            with self.subTest(name):
+                self.blob_helper.blobs["manifest.csv.gz"] = blob
+                with self.assertLogs(level="WARNING"):
+                    self.assertIsNone(self.read())
+
+
+class TestLoaderDelta(unittest.TestCase):
+    def setUp(self):
+        self.blob_helper = FakeBlobHelper()
+        first_session = RecordingSearchSession()
+        self.load(first_session, ROWS)
+        self.index = first_session.documents
+        self.first_manifest = self.blob_helper.get_fingerprints("manifest.csv.gz")
+
+    def load(self, session, rows, previous_manifest=None):
+        """Loads rows, writing the manifest of the load over the previous one"""
+        manifest_writer = manifest.ManifestWriter(1)
+        loader = load_postcodes(session, rows, manifest_writer, previous_manifest)
+        manifest.write_manifest(self.blob_helper, "postcodes", "manifest.csv.gz", manifest_writer)
+        return loader
+
+    def refresh(self, session, rows):
+        with self.assertLogs(level="INFO"):
+            previous_manifest = manifest.read_manifest(self.blob_helper, "postcodes", "manifest.csv.gz", 1)
+        return self.load(session, rows, previous_manifest)
+
+    def test_full_load_records_every_postcode(self):
+        self.assertEqual({"1", "2", "3"}, set(self.first_manifest))
+        self.assertEqual({"1", "2", "3"}, set(self.index))
+
+    def test_unchanged_file_uploads_nothing(self):
+        session = RecordingSearchSession(self.index)
+
+        loader = self.refresh(session, ROWS)
+
+        self.assertEqual([], session.posts)
+        self.assertEqual((0, 0), (loader.changed_count, loader.deleted_count))
+
+    def test_only_changes_are_sent(self):
+        session = RecordingSearchSession(self.index)
+        rows = [
+            "1,CF5 1AB,51.4860,-3.2282",
+            "2,CF10 3AT,51.4900,-3.1791",
+            "4,BT1 1AA,54.5973,-5.9301",
+        ]
+
+        loader = self.refresh(session, rows)
+        postcode_manifest = self.blob_helper.get_fingerprints("manifest.csv.gz")
+
+        self.assertEqual(
+            [("delete", "3"), ("mergeOrUpload", "2"), ("mergeOrUpload", "4")],
+            get_actions(session),
+        )
+        self.assertEqual((2, 1), (loader.changed_count, loader.deleted_count))
+        self.assertEqual({"1", "2", "4"}, set(session.documents))
+        self.assertEqual(51.49, session.documents["2"]["latitude"])
+        self.assertEqual(self.first_manifest["1"], postcode_manifest["1"])
+        self.assertNotEqual(self.first_manifest["2"], postcode_manifest["2"])
+
+    def test_postcodes_that_become_invalid_are_deleted(self):
+        session = RecordingSearchSession(self.index)
+
+        with self.assertLogs(level="WARNING"):
+            self.refresh(session, ROWS[:2] + ["3,SW1A 1AA,,"])
+
+        self.assertEqual([("delete", "3")], get_actions(session))
+
+
+class TestMainRefresh(unittest.TestCase):
+    def setUp(self):
+        self.blob_helper = FakeBlobHelper()
+        self.index_exists = False
+
+    def run_main(self, rows, params=None, outcomes=()):
+        self.blob_helper.blobs["postcodes.csv.gz"] = gzip.compress("\n".join([HEADER] + rows).encode("utf-8"))
+        session = RecordingSearchSession(outcomes=outcomes)
+        req = mock.Mock(params=params or {})
+
+        with mock.patch.dict("os.environ", ENVIRONMENT), \
+                mock.patch.object(PostcodeSearchBuilder, "BlobHelper", return_value=self.blob_helper), \
+                mock.patch.object(search, "index_exists", side_effect=lambda *args: self.index_exists), \
+                mock.patch.object(search, "build_index") as mock_build_index, \
+                mock.patch("SharedCode.search_uploader.get_session", return_value=session):
+            PostcodeSearchBuilder.main(req)
+
+        self.index_exists = True
+        return mock_build_index.called, session
+
+    def test_first_run_rebuilds_then_later_runs_refresh(self):
+        rebuilt, session = self.run_main(ROWS)
+        self.assertTrue(rebuilt)
+        self.assertEqual(3, len(session.posted))
+        self.assertIn("postcodes-manifest.csv.gz", self.blob_helper.blobs)
+
+        rebuilt, session = self.run_main(ROWS[:2])
+        self.assertFalse(rebuilt)
+        self.assertEqual([("delete", "3")], get_actions(session))
+
+        rebuilt, session = self.run_main(ROWS[:2])
+        self.assertFalse(rebuilt)
+        self.assertEqual([], session.posts)
+
+    def test_rebuild_can_be_requested(self):
+        self.run_main(ROWS)
+
+        rebuilt, session = self.run_main(ROWS, params={"rebuild": "true"})
+
+        self.assertTrue(rebuilt)
+        self.assertEqual([("upload", "1"), ("upload", "2"), ("upload", "3")], get_actions(session))
+
+    def test_missing_index_is_rebuilt(self):
+        self.run_main(ROWS)
+        self.index_exists = False
+
+        rebuilt, session = self.run_main(ROWS)
+
+        self.assertTrue(rebuilt)
+
+    def test_corrupt_manifest_is_rebuilt(self):
+        self.run_main(ROWS)
+        self.blob_helper.blobs["postcodes-manifest.csv.gz"] = self.blob_helper.blobs["postcodes-manifest.csv.gz"][:-10]
+
+        with self.assertLogs(level="WARNING"):
+            rebuilt, session = self.run_main(ROWS)
+
+        self.assertTrue(rebuilt)
+        self.assertEqual([("upload", "1"), ("upload", "2"), ("upload", "3")], get_actions(session))
+
+    def test_failed_rebuild_is_rebuilt_again(self):
+        self.run_main(ROWS)
+        with self.assertLogs(level="ERROR"):
+            with self.assertRaises(exceptions.StopEtlPipelineErrorException):
+                self.run_main(ROWS, params={"rebuild": "true"}, outcomes=[400])
+
+        rebuilt, session = self.run_main(ROWS)
+
+        self.assertTrue(rebuilt)
+
+
+if __name__ == "__main__":
+    unittest.main()
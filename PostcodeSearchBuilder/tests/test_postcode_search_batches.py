@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+import os
+import random
+import time
+import unittest
+from unittest import mock
+
+from PostcodeSearchBuilder import models
+from SharedCode.benchmark import benchmark
+
+# Set POSTCODE_BENCHMARK_ROWS=1000000 to benchmark a full size postcode file
+BENCHMARK_ROWS = int(os.environ.get("POSTCODE_BENCHMARK_ROWS", 100000))
+
+ROWS = [
+    ["1", "CF5 1AB", "51.4860", "-3.2282"],
+    ["2", " cf10 3at ", " 51.4816 ", "-3.1791"],
+    ["3", "XX1 1XX", "", ""],
+    ["4", "10014", "-74.0094", "40.7366"],
+    ["5", "10014", "-74.0094", "forty"],
+    ["6", "SW1A 1AA", "nan", "-0.1419"],
+    ["7", "SW1A 2AA"],
+    ['8"', "BT1 1AA", "54.5973", "-5.9301", "extra"],
+]
+
+
+def get_scalar_docs(rows):
+    """Returns the documents build_postcode_search_doc builds for rows"""
+    with mock.patch.object(models.logging, "warning"):
+        docs = [models.build_postcode_search_doc([r.strip() for r in row]) for row in rows if len(row) >= 4]
+    return [doc for doc in docs if doc]
+
+
+def get_documents(rows, action="upload"):
+    """Returns the ids and serialised search documents of the valid rows, as Loader sends them"""
+    action_json = models.get_search_action_json(action)
+    return [(postcode_id, action_json + fields) for postcode_id, fields in models.build_postcode_fields_json(rows)]
+
+
+def get_synthetic_csv(number_of_rows):
+    """Returns a postcode csv with one row in every thousand missing its coordinates"""
+    rng = random.Random(1)
+    lines = ["id,postcode,latitude,longitude"]
+    for i in range(number_of_rows):
+        latitude = "" if i % 997 == 0 else f"{rng.uniform(49.5, 60):.6f}"
+        lines.append(f"{i},CF{i % 99} {i % 9}AB,{latitude},{rng.uniform(-8, 1.7):.6f}")
+    return "\r\n".join(lines) + "\r\n"
+
+
+class TestBuildPostcodeFieldsJson(unittest.TestCase):
+    def test_json_matches_json_of_single_row_documents(self):
+        # NaN coordinates pass the single row checks but are rejected in chunks
+        expected = [(doc["id"], json.dumps(doc).encode("utf-8")) for doc in get_scalar_docs(ROWS) if doc["id"] != "6"]
+
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(expected, get_documents(ROWS))
+
+    def test_fields_follow_any_search_action(self):
+        upload_doc = json.loads(get_documents(ROWS[:1])[0][1])
+        merge_doc = json.loads(get_documents(ROWS[:1], "mergeOrUpload")[0][1])
+
+        self.assertEqual("upload", upload_doc.pop("@search.action"))
+        self.assertEqual("mergeOrUpload", merge_doc.pop("@search.action"))
+        self.assertEqual(upload_doc, merge_doc)
+
+    def test_rejects_are_summarised_once_per_chunk(self):
+        with self.assertLogs(level="WARNING") as logs:
+            models.build_postcode_fields_json(ROWS)
+
+        self.assertEqual(1, len(logs.output))
+        self.assertIn("rejected 5 of 8 postcodes", logs.output[0])
+        self.assertIn(
+            "{'malformed': 1, 'missing coordinates': 1, 'invalid coordinates': 2, 'outside the UK': 1}",
+            logs.output[0],
+        )
+
+    def test_valid_chunk_logs_nothing(self):
+        with mock.patch.object(models.logging, "warning") as mock_warning:
+            self.assertEqual(2, len(models.build_postcode_fields_json(ROWS[:2])))
+        mock_warning.assert_not_called()
+
+    def test_empty_chunk(self):
+        self.assertEqual([], models.build_postcode_fields_json([]))
+
+
+@benchmark
+class TestBuildPostcodeFieldsJsonBenchmark(unittest.TestCase):
+    def test_chunks_are_faster_than_single_rows(self):
+        text = get_synthetic_csv(BENCHMARK_ROWS)
+
+        def prepare_rows():
+            reader = csv.reader(io.StringIO(text))
+            next(reader)
+            for row in reader:
+                doc = models.build_postcode_search_doc([r.strip() for r in row])
+                if doc:
+                    json.dumps(doc).encode("utf-8")
+
+        def prepare_chunks():
+            reader = csv.reader(io.StringIO(text))
+            next(reader)
+            chunk = []
+            for row in reader:
+                chunk.append(row)
+                if len(chunk) == 1000:
+                    get_documents(chunk)
+                    chunk = []
+            get_documents(chunk)
+
+        timings = {}
+        with mock.patch.object(models.logging, "warning"):
+            for prepare in (prepare_rows, prepare_chunks):
+                start = time.perf_counter()
+                prepare()
+                timings[prepare] = time.perf_counter() - start
+
+        print(
+            f"\npostcode preparation of {BENCHMARK_ROWS} rows: {timings[prepare_rows]:.2f}s a row at a time, "
+            f"{timings[prepare_chunks]:.2f}s in chunks ({timings[prepare_rows] / timings[prepare_chunks]:.1f}x)"
+        )
+        self.assertLess(timings[prepare_chunks], timings[prepare_rows])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import gzip
+import io
+import tracemalloc
+import unittest
+from unittest import mock
+
+from PostcodeSearchBuilder import exceptions
+from PostcodeSearchBuilder import search
+from SharedCode.benchmark import benchmark
+from SharedCode.fake_search_session import FakeSearchSession
+
+HEADER = "id,postcode,latitude,longitude"
+
+
+def get_rows(count):
+    return [HEADER] + [f"{i},CF5 {i}AB,51.4860,-3.2282" for i in range(count)]
+
+
+def iter_rows(count):
+    yield HEADER
+    for i in range(count):
+        yield f"{i},CF5 {i}AB,51.4860,-3.2282"
+
+
+def get_text_stream(text):
+    """Returns a text stream of a gzip blob, as BlobHelper.get_gzip_text_stream does"""
+    blob = io.BytesIO(gzip.compress(text.encode("utf-8-sig")))
+    return io.TextIOWrapper(gzip.GzipFile(fileobj=blob, mode="rb"), encoding="utf-8-sig", errors="ignore", newline="")
+
+
+def load_postcodes(session, rows):
+    with mock.patch("SharedCode.search_uploader.get_session", return_value=session):
+        loader = search.Loader("https://search.example", "key", "2019-05-06", "postcodes", rows)
+    return loader.postcode_documents()
+
+
+class TestIterPostcodeChunks(unittest.TestCase):
+    def test_rows_are_parsed_from_a_gzip_text_stream(self):
+        rows = get_text_stream(
+            "id,postcode,latitude,longitude\r\n"
+            "1,CF5 1AB,51.4860,-3.2282\r\n"
+            "\r\n"
+            '2," CF10 3AT ",51.4816,-3.1791\r\n'
+            "3,XX1 1XX,,\r\n"
+        )
+
+        chunks = list(search.iter_postcode_chunks(rows, 1000))
+
+        self.assertEqual(
+            [[["1", "CF5 1AB", "51.4860", "-3.2282"],
+              ["2", " CF10 3AT ", "51.4816", "-3.1791"],
+              ["3", "XX1 1XX", "", ""]]],
+            chunks,
+        )
+
+    def test_rows_are_read_a_chunk_at_a_time(self):
+        rows = iter_rows(25)
+
+        chunks = search.iter_postcode_chunks(rows, 10)
+
+        self.assertEqual(10, len(next(chunks)))
+        # The header and the ten rows of the first chunk
+        self.assertEqual("10,CF5 10AB,51.4860,-3.2282", next(rows))
+        self.assertEqual([10, 4], [len(chunk) for chunk in chunks])
+
+    def test_invalid_header_stops_the_pipeline(self):
+        for rows in (["id,postcode,lat,long", "1,CF5 1AB,51.4860,-3.2282"], ["id,postcode"], []):
+            with self.subTest(rows=rows):
+                with self.assertLogs(level="ERROR"):
+                    with self.assertRaises(exceptions.StopEtlPipelineErrorException):
+                        list(search.iter_postcode_chunks(iter(rows), 10))
+
+
+class TestLoaderPostcodeDocuments(unittest.TestCase):
+    def test_postcodes_are_uploaded_in_batches(self):
+        session = FakeSearchSession()
+
+        number_of_postcodes = load_postcodes(session, get_rows(2500))
+
+        self.assertEqual(2500, number_of_postcodes)
+        self.assertEqual(2500, len(session.documents))
+        self.assertEqual([1000, 1000, 500], [len(post) for post in session.posts])
+        self.assertTrue(session.closed)
+
+    def test_postcodes_are_loaded_from_a_gzip_text_stream(self):
+        session = FakeSearchSession()
+        rows = get_text_stream(
+            "id,postcode,latitude,longitude\r\n"
+            "1,CF5 1AB,51.4860,-3.2282\r\n"
+            '2," CF10 3AT ",51.4816,-3.1791\r\n'
+            "3,XX1 1XX,,\r\n"
+        )
+
+        with self.assertLogs(level="WARNING"):
+            number_of_postcodes = load_postcodes(session, rows)
+
+        self.assertEqual(2, number_of_postcodes)
+        self.assertEqual(["1", "2"], sorted(session.documents))
+        self.assertEqual("cf103at", session.documents["2"]["postcode"])
+
+    @mock.patch("SharedCode.cosmos_bulk_writer.time.sleep")
+    def test_failed_postcodes_are_retried(self, mock_sleep):
+        session = FakeSearchSession([{"3": 503}])
+
+        load_postcodes(session, get_rows(5))
+
+        self.assertEqual([5, 1], [len(post) for post in session.posts])
+        self.assertEqual(5, len(session.documents))
+
+    def test_upload_errors_stop_the_pipeline(self):
+        session = FakeSearchSession([400])
+
+        with self.assertLogs(level="ERROR"):
+            with self.assertRaises(exceptions.StopEtlPipelineErrorException):
+                load_postcodes(session, get_rows(5))
+
+
+@benchmark
+class TestLoaderMemory(unittest.TestCase):
+    def get_peak_bytes(self, count):
+        # Uploaded documents are dropped, so only what the reader holds is measured
+        with mock.patch.object(search.Loader, "bulk_create_postcodes", lambda loader, documents: None):
+            loader = search.Loader("https://search.example", "key", "2019-05-06", "postcodes", iter_rows(count))
+            tracemalloc.start()
+            try:
+                loader.postcode_documents()
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    def test_peak_memory_does_not_grow_with_the_number_of_rows(self):
+        small = self.get_peak_bytes(10000)
+        large = self.get_peak_bytes(50000)
+
+        print(f"\npostcode load peak memory: {small / 1024:.0f} KiB for 10000 rows, {large / 1024:.0f} KiB for 50000 rows")
+        self.assertLess(large, small * 1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
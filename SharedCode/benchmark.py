@@ -0,0 +1,19 @@
+"""Keeps the benchmark tests out of the unit test run.
+
+The benchmark test classes time an optimisation, or measure its memory,
+against the code it replaced and print the figures. Timings and memory
+vary on shared build agents, so the classes decorated with benchmark are
+skipped unless RUN_BENCHMARKS=true is set.
+"""
+
+import os
+import unittest
+
+
+def benchmarks_enabled():
+    return os.environ.get("RUN_BENCHMARKS", "").lower() == "true"
+
+
+def benchmark(test_class):
+    """Skips a benchmark test class unless RUN_BENCHMARKS=true"""
+    return unittest.skipUnless(benchmarks_enabled(), "benchmarks only run with RUN_BENCHMARKS=true")(test_class)
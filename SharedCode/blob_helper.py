@@ -38,6 +38,23 @@ class BlobHelper:
 
         return file_string
 
+    def get_gzip_stream(self, storage_container_name, storage_blob_name):
+        """Returns a file object that decompresses the gzip blob while it downloads"""
+        blob_client = self.blob_service.get_blob_client(container=storage_container_name, blob=storage_blob_name)
+
+        # The downloader fetches chunks on demand as the gzip reader asks for them
+        return gzip.GzipFile(fileobj=blob_client.download_blob(), mode="rb")
+
+    def get_gzip_text_stream(self, storage_container_name, storage_blob_name):
+        """Returns the lines of a gzip text blob, decoded as get_str_file does, while it downloads"""
+        return io.TextIOWrapper(
+            self.get_gzip_stream(storage_container_name, storage_blob_name),
+            encoding="utf-8-sig",
+            errors="ignore",
+            newline="",
+        )
+
     def write_stream_file(self, storage_container_name, storage_blob_name, encoded_file):
+        """Uploads encoded_file, which is bytes, a binary file or an iterable of bytes chunks"""
         blob_client = self.blob_service.get_blob_client(container=storage_container_name, blob=storage_blob_name)
         blob_client.upload_blob(encoded_file, overwrite=True)  # `overwrite=True` replaces existing blob
\ No newline at end of file
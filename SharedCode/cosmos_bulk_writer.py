@@ -0,0 +1,341 @@
+"""Concurrent batched writes through the bulkImport stored procedure.
+
+Documents are grouped into batches by serialised size rather than count and
+a bounded number of batches are in flight at once. Pacing is driven by the
+server: every batch waits while Cosmos DB has asked for a pause (429 with
+x-ms-retry-after-ms) and, when a request unit budget is configured, while
+the request charges reported so far are ahead of that budget.
+
+bulkImport returns how many documents it created before reaching the
+execution bounds of a stored procedure, so the documents after those are
+sent again until the whole batch has been created.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from SharedCode.exceptions import BulkWriteError
+
+DEFAULT_MAX_BATCH_BYTES = 1024 * 1024
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_MAX_RETRIES = 9
+DEFAULT_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30
+
+REQUEST_CHARGE_HEADER = "x-ms-request-charge"
+RETRY_AFTER_HEADER = "x-ms-retry-after-ms"
+TOO_MANY_REQUESTS = 429
+
+
+BatchResult = namedtuple(
+    "BatchResult",
+    [
+        "number",
+        "documents",
+        "size_bytes",
+        "attempts",
+        "error",
+        "request_charge",
+        "writing_seconds",
+        "throttled_seconds",
+    ],
+)
+
+
+class BulkWriteReport:
+    """The outcome of every batch sent by a CosmosBulkWriter"""
+
+    def __init__(self, batches):
+        self.batches = sorted(batches, key=lambda batch: batch.number)
+
+    @property
+    def failed_batches(self):
+        return [batch for batch in self.batches if batch.error is not None]
+
+    @property
+    def documents_written(self):
+        return sum(batch.documents for batch in self.batches if batch.error is None)
+
+    @property
+    def documents_failed(self):
+        return sum(batch.documents for batch in self.failed_batches)
+
+    @property
+    def request_charge(self):
+        return sum(batch.request_charge for batch in self.batches)
+
+    @property
+    def writing_seconds(self):
+        return sum(batch.writing_seconds for batch in self.batches)
+
+    @property
+    def throttled_seconds(self):
+        return sum(batch.throttled_seconds for batch in self.batches)
+
+    def log(self):
+        for batch in self.batches:
+            if batch.error is None:
+                logging.info(
+                    f"Batch {batch.number}: loaded {batch.documents} documents "
+                    f"({batch.size_bytes} bytes, {batch.request_charge:.0f} RU) in {batch.attempts} attempt(s)"
+                )
+            else:
+                logging.error(
+                    f"Batch {batch.number}: failed to load {batch.documents} documents "
+                    f"after {batch.attempts} attempt(s): {batch.error}"
+                )
+        logging.info(
+            f"Bulk write finished: {self.documents_written} documents loaded in "
+            f"{len(self.batches)} batches, {len(self.failed_batches)} batches failed"
+        )
+        logging.info(
+            f"Bulk write spent {self.writing_seconds:.1f}s writing and "
+            f"{self.throttled_seconds:.1f}s throttled, using {self.request_charge:.0f} RU"
+        )
+
+
+class RequestPacer:
+    """Holds back new requests while the server needs them slowed down.
+
+    A throttled response pauses every batch until its retry-after delay has
+    passed. With request_units_per_second set, each request charge also moves
+    the next start time on by the time that charge takes at the budget rate.
+    """
+
+    def __init__(self, request_units_per_second=None):
+        self.request_units_per_second = request_units_per_second
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Sleeps until requests may resume and returns the seconds slept"""
+        with self.lock:
+            delay = self.resume_at - time.monotonic()
+        if delay <= 0:
+            return 0.0
+        time.sleep(delay)
+        return delay
+
+    def record_throttle(self, retry_after_seconds):
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + retry_after_seconds)
+
+    def record_charge(self, request_charge):
+        if not self.request_units_per_second:
+            return
+        with self.lock:
+            self.resume_at = (
+                max(self.resume_at, time.monotonic())
+                + request_charge / self.request_units_per_second
+            )
+
+
+class ResponseMonitor:
+    """Collects the request charge and throttling of each HTTP response in one call.
+
+    Passed to the Cosmos client as raw_response_hook, so it also sees the
+    429 responses the SDK retries internally before returning.
+    """
+
+    def __init__(self, pacer):
+        self.pacer = pacer
+        self.request_charge = 0.0
+        self.throttled_seconds = 0.0
+        self.pending_retry_seconds = 0.0
+
+    def __call__(self, pipeline_response):
+        # A response after a 429 means the SDK waited out that 429 and retried
+        self.throttled_seconds += self.pending_retry_seconds
+        self.pending_retry_seconds = 0.0
+
+        response = pipeline_response.http_response
+        self.request_charge += float(response.headers.get(REQUEST_CHARGE_HEADER) or 0)
+        if response.status_code == TOO_MANY_REQUESTS:
+            retry_after_seconds = int(response.headers.get(RETRY_AFTER_HEADER) or 0) / 1000
+            self.pending_retry_seconds = retry_after_seconds
+            self.pacer.record_throttle(retry_after_seconds)
+
+
+class CosmosBulkWriter:
+    """Loads documents into a container with the bulkImport stored procedure.
+
+    Call add for each document and flush once at the end, or use the writer
+    as a context manager. flush waits for every batch, logs a report of each
+    one and raises BulkWriteError if any batch could not be loaded.
+    """
+
+    def __init__(
+        self,
+        container,
+        partition_key,
+        max_batch_bytes=None,
+        max_in_flight=None,
+        request_units_per_second=None,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+        sproc="bulkImport",
+    ):
+        self.container = container
+        self.partition_key = str(partition_key)
+        self.max_batch_bytes = max_batch_bytes or int(
+            os.environ.get("CosmosBulkWriteMaxBatchBytes", DEFAULT_MAX_BATCH_BYTES)
+        )
+        self.max_in_flight = max_in_flight or int(
+            os.environ.get("CosmosBulkWriteMaxInFlight", DEFAULT_MAX_IN_FLIGHT)
+        )
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.sproc = sproc
+        self.pacer = RequestPacer(
+            request_units_per_second
+            or int(os.environ.get("CosmosBulkWriteRequestUnitsPerSecond", 0))
+        )
+
+        self.executor = ThreadPoolExecutor(self.max_in_flight)
+        self.in_flight = set()
+        self.results = []
+        self.lock = threading.Lock()
+
+        self.batch = []
+        self.batch_bytes = 0
+        self.batch_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.executor.shutdown(wait=True)
+
+    def add(self, doc):
+        """Queues a document, sending the current batch first if the document would overflow it"""
+        doc_bytes = len(json.dumps(doc).encode("utf-8"))
+        if self.batch and self.batch_bytes + doc_bytes > self.max_batch_bytes:
+            self.send_batch()
+        self.batch.append(doc)
+        self.batch_bytes += doc_bytes
+
+    def send_batch(self):
+        """Hands the current batch to the thread pool, waiting while too many are in flight"""
+        if not self.batch:
+            return
+
+        while len(self.in_flight) >= self.max_in_flight:
+            done, self.in_flight = wait(self.in_flight, return_when=FIRST_COMPLETED)
+
+        self.batch_count += 1
+        future = self.executor.submit(
+            self.write_batch, self.batch_count, self.batch, self.batch_bytes
+        )
+        self.in_flight.add(future)
+        self.batch = []
+        self.batch_bytes = 0
+
+    def write_batch(self, number, docs, size_bytes):
+        """Runs the stored procedure for one batch, retrying while the container is throttled
+
+        The documents bulkImport did not get to are sent again, and a call
+        that creates none of them is recorded as the batch's error.
+        """
+        attempts = 0
+        error = None
+        request_charge = 0.0
+        writing_seconds = 0.0
+        throttled_seconds = 0.0
+        remaining = docs
+        while True:
+            attempts += 1
+            throttled_seconds += self.pacer.wait()
+            monitor = ResponseMonitor(self.pacer)
+            start = time.monotonic()
+            try:
+                created = self.container.scripts.execute_stored_procedure(
+                    sproc=self.sproc,
+                    partition_key=self.partition_key,
+                    params=[remaining],
+                    raw_response_hook=monitor,
+                )
+                error = None
+            except Exception as e:
+                error = e
+            finally:
+                elapsed = time.monotonic() - start
+                # Time the SDK spent waiting out 429s inside the call counts as throttled
+                sdk_throttled_seconds = min(monitor.throttled_seconds, elapsed)
+                writing_seconds += elapsed - sdk_throttled_seconds
+                throttled_seconds += sdk_throttled_seconds
+                request_charge += monitor.request_charge
+
+            if error is None:
+                self.pacer.record_charge(monitor.request_charge)
+                if not isinstance(created, int) or created <= 0:
+                    error = BulkWriteError(
+                        f"{self.sproc} created {created!r} of the {len(remaining)} remaining documents"
+                    )
+                    break
+                if created >= len(remaining):
+                    break
+                logging.info(
+                    f"Batch {number}: {self.sproc} created {created} of {len(remaining)} documents, sending the rest"
+                )
+                remaining = remaining[created:]
+                continue
+            if (
+                not isinstance(error, CosmosHttpResponseError)
+                or error.status_code != TOO_MANY_REQUESTS
+                or attempts > self.max_retries
+            ):
+                break
+            delay = self.get_retry_delay(error, attempts)
+            logging.warning(
+                f"Batch {number} throttled, retrying in {delay:.2f}s (attempt {attempts})"
+            )
+            self.pacer.record_throttle(delay)
+
+        result = BatchResult(
+            number,
+            len(docs),
+            size_bytes,
+            attempts,
+            error,
+            request_charge,
+            writing_seconds,
+            throttled_seconds,
+        )
+        with self.lock:
+            self.results.append(result)
+        return result
+
+    def get_retry_delay(self, error, attempts):
+        """Returns the delay Cosmos DB asked for, or an exponential backoff if it gave none"""
+        retry_after_ms = error.headers.get(RETRY_AFTER_HEADER) if error.headers else None
+        if retry_after_ms:
+            return int(retry_after_ms) / 1000
+        return min(self.backoff_seconds * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+
+    def flush(self):
+        """Sends any queued documents, waits for every batch and returns the BulkWriteReport"""
+        self.send_batch()
+        wait(self.in_flight)
+        self.in_flight = set()
+        self.executor.shutdown(wait=True)
+
+        report = BulkWriteReport(self.results)
+        report.log()
+        if report.failed_batches:
+            raise BulkWriteError(
+                f"{len(report.failed_batches)} of {len(report.batches)} batches failed, "
+                f"{report.documents_failed} documents were not loaded"
+            )
+        return report
@@ -29,3 +29,15 @@ class DataSetTooEarlyError(Error):
     """ An error raised if too soon for DataSet service run again """
 
     pass
+
+
+class BulkWriteError(Error):
+    """ An error raised if batches could not be loaded into Cosmos DB """
+
+    pass
+
+
+class SearchUploadError(Error):
+    """ An error raised if documents could not be uploaded to a search index """
+
+    pass
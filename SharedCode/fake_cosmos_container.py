@@ -0,0 +1,112 @@
+"""An in-memory stand-in for a Cosmos DB container, for benchmarking bulk writes and queries offline"""
+
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from azure.core.paging import ItemPaged
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+
+class FakeCosmosContainer:
+    """Accepts bulkImport stored procedure calls and keeps the documents in memory.
+
+    Each call takes latency_seconds plus seconds_per_kb of the payload to
+    return and is charged request_units_per_kb. When max_requests_per_second
+    is set, calls over that rate are rejected with a 429 that carries an
+    x-ms-retry-after-ms header, the way a container without enough
+    provisioned throughput responds. Like the Cosmos client, responses are
+    passed to a raw_response_hook when one is given.
+
+    query_items pages through the stored documents like the Cosmos client,
+    max_item_count at a time, with the offset of the next page as the
+    continuation token. The query text is recorded but not evaluated.
+    """
+
+    def __init__(
+        self,
+        latency_seconds=0.0,
+        seconds_per_kb=0.0,
+        max_requests_per_second=None,
+        request_units_per_kb=5.0,
+    ):
+        self.latency_seconds = latency_seconds
+        self.seconds_per_kb = seconds_per_kb
+        self.max_requests_per_second = max_requests_per_second
+        self.request_units_per_kb = request_units_per_kb
+        self.scripts = FakeScripts(self)
+        self.documents = []
+        self.calls = 0
+        self.throttled_calls = 0
+        self.request_times = deque()
+        self.queries = []
+        self.pages_read = 0
+        self.lock = threading.Lock()
+
+    def check_rate(self, raw_response_hook):
+        if self.max_requests_per_second is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            while self.request_times and now - self.request_times[0] >= 1:
+                self.request_times.popleft()
+            if len(self.request_times) >= self.max_requests_per_second:
+                self.throttled_calls += 1
+                retry_after_ms = int((1 - (now - self.request_times[0])) * 1000) + 1
+                headers = {"x-ms-retry-after-ms": str(retry_after_ms), "x-ms-request-charge": "0"}
+                send_response(raw_response_hook, 429, headers)
+                error = CosmosHttpResponseError(status_code=429, message="Request rate is large")
+                error.headers = headers
+                raise error
+            self.request_times.append(now)
+
+    def execute_stored_procedure(self, sproc, partition_key, params, raw_response_hook=None):
+        self.check_rate(raw_response_hook)
+        docs = params[0]
+        payload_kb = sum(len(str(doc)) for doc in docs) / 1024
+        delay = self.latency_seconds + self.seconds_per_kb * payload_kb
+        if delay:
+            time.sleep(delay)
+        with self.lock:
+            self.calls += 1
+            self.documents.extend(docs)
+        request_charge = payload_kb * self.request_units_per_kb
+        send_response(raw_response_hook, 200, {"x-ms-request-charge": f"{request_charge:.2f}"})
+        return len(docs)
+
+
+    def query_items(self, query, max_item_count=None, **kwargs):
+        self.queries.append(query)
+        page_size = max_item_count or len(self.documents) or 1
+
+        def get_next(continuation_token):
+            offset = int(continuation_token or 0)
+            if self.latency_seconds:
+                time.sleep(self.latency_seconds)
+            self.pages_read += 1
+            return offset, self.documents[offset:offset + page_size]
+
+        def extract_data(response):
+            offset, page = response
+            next_offset = offset + len(page)
+            continuation_token = str(next_offset) if next_offset < len(self.documents) else None
+            return continuation_token, iter(page)
+
+        return ItemPaged(get_next, extract_data)
+
+
+class FakeScripts:
+    def __init__(self, container):
+        self.container = container
+
+    def execute_stored_procedure(self, sproc, partition_key, params, **kwargs):
+        return self.container.execute_stored_procedure(sproc, partition_key, params, **kwargs)
+
+
+def send_response(raw_response_hook, status_code, headers):
+    """Calls the hook with an object shaped like an azure-core PipelineResponse"""
+    if raw_response_hook is not None:
+        raw_response_hook(
+            SimpleNamespace(http_response=SimpleNamespace(status_code=status_code, headers=headers))
+        )
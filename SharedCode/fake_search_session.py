@@ -0,0 +1,67 @@
+"""A stand-in for a requests session posting to the search index documents API"""
+
+import json
+import threading
+import time
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.headers = headers or {}
+        self.text = json.dumps(self.body)
+
+    def json(self):
+        return self.body
+
+
+class FakeSearchSession:
+    """Indexes posted documents, answering with the queued outcomes first.
+
+    Each queued outcome is either a status code for the whole batch or a
+    dict of the status code each failing key gets in a 207 response.
+    """
+
+    def __init__(self, outcomes=(), latency_seconds=0, retry_after=None):
+        self.outcomes = list(outcomes)
+        self.latency_seconds = latency_seconds
+        self.retry_after = retry_after
+        self.documents = {}
+        self.posts = []
+        self.active = 0
+        self.max_active = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def post(self, url, headers, data):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            outcome = self.outcomes.pop(0) if self.outcomes else {}
+            docs = json.loads(data)["value"]
+            self.posts.append([doc["id"] for doc in docs])
+        try:
+            if self.latency_seconds:
+                time.sleep(self.latency_seconds)
+            if isinstance(outcome, int):
+                headers = {"Retry-After": self.retry_after} if self.retry_after else {}
+                return FakeResponse(outcome, headers=headers)
+
+            results = []
+            for doc in docs:
+                status_code = outcome.get(doc["id"], 200)
+                if status_code == 200:
+                    with self.lock:
+                        if doc.get("@search.action") == "delete":
+                            self.documents.pop(doc["id"], None)
+                        else:
+                            self.documents[doc["id"]] = doc
+                results.append({"key": doc["id"], "status": status_code == 200, "statusCode": status_code})
+            return FakeResponse(207 if outcome else 200, {"value": results})
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def close(self):
+        self.closed = True
@@ -0,0 +1,98 @@
+"""
+Incremental reader for the HESA XML dataset.
+
+The dataset is read with iterparse so that only the reference sections
+(LOCATION, ACCREDITATIONTABLE, KISAIM and SECTORSAL) and the institution
+currently being processed are held in memory. Each top level element is
+detached from the document root as soon as it has been handed on.
+
+SECTORSAL follows the institutions in the HESA files. The institutions are
+handed on as they are parsed rather than held until it is reached, and
+SECTORSAL is added to the reference data when the stream gets to it, for
+read_sector_salaries to return once the institutions have been read.
+"""
+
+import logging
+from xml.etree.ElementTree import Element
+
+import defusedxml.ElementTree as ET
+
+from SharedCode.exceptions import XmlValidationError
+
+REFERENCE_TAGS = ("LOCATION", "ACCREDITATIONTABLE", "KISAIM", "SECTORSAL")
+
+
+class HesaXmlStream:
+    """Streams the top level sections of a HESA XML file object"""
+
+    def __init__(self, xml_file):
+        self.events = ET.iterparse(xml_file, events=("start", "end"))
+        self.reference_root = Element("KIS")
+        self.first_institution = None
+        self.reference_data_complete = False
+        self.root = None
+        self.depth = 0
+
+    def iter_top_level_elements(self):
+        """Yields each child of the document root once it has been fully parsed"""
+
+        for event, elem in self.events:
+            if event == "start":
+                if self.root is None:
+                    self.root = elem
+                self.depth += 1
+                continue
+
+            self.depth -= 1
+            if self.depth == 1:
+                # Detach the finished section so the tree never grows.
+                self.root.remove(elem)
+                yield elem
+
+    def read_reference_data(self):
+        """Reads until the first INSTITUTION and returns the reference sections under a KIS element
+
+        The XSD places LOCATION, ACCREDITATIONTABLE and KISAIM before the first
+        INSTITUTION. SECTORSAL is not part of it and is only included if it
+        comes first too, otherwise read_sector_salaries returns it once the
+        institutions have been read.
+        """
+
+        if self.reference_data_complete:
+            return self.reference_root
+
+        for elem in self.iter_top_level_elements():
+            if elem.tag == "INSTITUTION":
+                self.first_institution = elem
+                break
+            if elem.tag in REFERENCE_TAGS:
+                self.reference_root.append(elem)
+
+        self.reference_data_complete = True
+        return self.reference_root
+
+    def iter_institutions(self):
+        """Yields INSTITUTION elements one at a time"""
+
+        self.read_reference_data()
+
+        if self.first_institution is not None:
+            first_institution, self.first_institution = self.first_institution, None
+            yield first_institution
+
+        for elem in self.iter_top_level_elements():
+            if elem.tag == "INSTITUTION":
+                yield elem
+            elif elem.tag == "SECTORSAL" and self.reference_root.find("SECTORSAL") is None:
+                self.reference_root.append(elem)
+            elif elem.tag in REFERENCE_TAGS:
+                logging.warning(
+                    f"{elem.tag} found after the institutions started, it will not be used"
+                )
+
+    def read_sector_salaries(self):
+        """Returns the reference sections including SECTORSAL, once iter_institutions has finished"""
+
+        if self.reference_root.find("SECTORSAL") is None:
+            raise XmlValidationError("SECTORSAL was not found in the HESA XML")
+        return self.reference_root
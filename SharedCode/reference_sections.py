@@ -0,0 +1,34 @@
+"""
+Single pass index of the reference sections of a HESA XML document.
+
+The lookup tables (locations, accreditations, KIS aims and sector salaries)
+used to call root.iter for their own tag, and each call walked every course
+in the document to find a few top level elements. ReferenceSections visits
+the children of the root once and answers iter and find from that.
+"""
+
+NESTED_SECTIONS = ("SECTORSAL",)
+
+
+class ReferenceSections:
+    """The children of a HESA root element grouped by tag in one pass
+
+    Stands in for the root in the lookup table constructors, which only call
+    iter(tag) and find(tag) for top level tags. SECTORSAL is indexed the same
+    way, so its GOSECSAL, LEO3SEC and LEO5SEC rows are grouped in the same pass.
+    """
+
+    def __init__(self, root):
+        self.children = {}
+        for child in root:
+            tag = child.tag
+            if tag in NESTED_SECTIONS:
+                child = ReferenceSections(child)
+            self.children.setdefault(tag, []).append(child)
+
+    def iter(self, tag):
+        return iter(self.children.get(tag, ()))
+
+    def find(self, tag):
+        children = self.children.get(tag)
+        return children[0] if children else None
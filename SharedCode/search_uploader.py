@@ -0,0 +1,328 @@
+"""Concurrent batched uploads to an Azure Cognitive Search index.
+
+Documents are grouped into batches by count and by serialised size, and a
+bounded number of batches are in flight at once over one pooled keep-alive
+session, so building the next batch overlaps with uploading the last ones.
+
+The index API answers 207 when only some documents in a batch were
+indexed. The status of each document is read from the response and only
+the documents that failed with a transient status are sent again. Whole
+batches answered with 429 or 503 are retried after the delay the service
+asks for, or an exponential backoff, and every batch waits while any batch
+has been asked to slow down.
+
+Batches can finish in any order, so a key should appear once per upload.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from SharedCode.cosmos_bulk_writer import RequestPacer
+from SharedCode.exceptions import SearchUploadError
+
+DEFAULT_MAX_BATCH_DOCS = 1000
+DEFAULT_MAX_BATCH_BYTES = 8 * 1024 * 1024
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 60
+
+RETRY_AFTER_HEADER = "Retry-After"
+MULTI_STATUS = 207
+RETRIABLE_BATCH_STATUS_CODES = frozenset([429, 503])
+# Conflicting concurrent writes, an index that is briefly unavailable and throttling
+RETRIABLE_DOCUMENT_STATUS_CODES = frozenset([409, 422, 503])
+
+PAYLOAD_PREFIX = b'{"value": ['
+PAYLOAD_SUFFIX = b"]}"
+
+
+UploadResult = namedtuple(
+    "UploadResult",
+    ["number", "documents", "size_bytes", "attempts", "failed_keys", "error", "uploading_seconds", "throttled_seconds"],
+)
+
+
+class SearchUploadReport:
+    """The outcome of every batch sent by a SearchUploader"""
+
+    def __init__(self, batches):
+        self.batches = sorted(batches, key=lambda batch: batch.number)
+
+    @property
+    def failed_batches(self):
+        return [batch for batch in self.batches if batch.error is not None]
+
+    @property
+    def documents_uploaded(self):
+        return sum(batch.documents - len(batch.failed_keys) for batch in self.batches)
+
+    @property
+    def documents_failed(self):
+        return sum(len(batch.failed_keys) for batch in self.batches)
+
+    @property
+    def uploading_seconds(self):
+        return sum(batch.uploading_seconds for batch in self.batches)
+
+    @property
+    def throttled_seconds(self):
+        return sum(batch.throttled_seconds for batch in self.batches)
+
+    def log(self):
+        for batch in self.failed_batches:
+            logging.error(
+                f"Batch {batch.number}: failed to upload {len(batch.failed_keys)} of {batch.documents} "
+                f"documents after {batch.attempts} attempt(s): {batch.error}"
+            )
+        logging.info(
+            f"Search upload finished: {self.documents_uploaded} documents uploaded in "
+            f"{len(self.batches)} batches, {len(self.failed_batches)} batches failed"
+        )
+        logging.info(
+            f"Search upload spent {self.uploading_seconds:.1f}s uploading and "
+            f"{self.throttled_seconds:.1f}s throttled"
+        )
+
+
+def get_retry_after(response):
+    """Returns the seconds a response asked us to wait, or None if it did not say"""
+    retry_after = response.headers.get(RETRY_AFTER_HEADER)
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_failed_statuses(response):
+    """Returns the status code of each document a 207 response did not index, by key"""
+    return {
+        result["key"]: result.get("statusCode")
+        for result in response.json()["value"]
+        if not result["status"]
+    }
+
+
+def check_uploads(futures):
+    """Raises SearchUploadError if an upload_batch call raised instead of recording its result"""
+    for future in futures:
+        e = future.exception()
+        if e is not None:
+            raise SearchUploadError(f"a batch upload raised {e!r}, its documents may not have been uploaded") from e
+
+
+def get_session(max_in_flight):
+    """Returns a keep-alive session with a connection for each batch in flight"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class SearchUploader:
+    """Uploads documents to a search index with the index documents API.
+
+    Call add for each document and flush once at the end, or use the
+    uploader as a context manager. flush waits for every batch, logs a
+    report and raises SearchUploadError if any document was not uploaded.
+    """
+
+    def __init__(
+        self,
+        url,
+        api_key,
+        api_version,
+        index_name,
+        key_field="id",
+        max_batch_docs=None,
+        max_batch_bytes=None,
+        max_in_flight=None,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+        session=None,
+    ):
+        self.url = f"{url}/indexes/{index_name}/docs/index?api-version={api_version}"
+        self.headers = {
+            "Content-Type": "application/json",
+            "api-key": api_key,
+            "odata": "verbose",
+        }
+        self.index_name = index_name
+        self.key_field = key_field
+        self.max_batch_docs = max_batch_docs or DEFAULT_MAX_BATCH_DOCS
+        self.max_batch_bytes = max_batch_bytes or int(
+            os.environ.get("SearchUploadMaxBatchBytes", DEFAULT_MAX_BATCH_BYTES)
+        )
+        self.max_in_flight = max_in_flight or int(
+            os.environ.get("SearchUploadMaxInFlight", DEFAULT_MAX_IN_FLIGHT)
+        )
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.session = session or get_session(self.max_in_flight)
+        self.pacer = RequestPacer()
+
+        self.executor = ThreadPoolExecutor(self.max_in_flight)
+        self.in_flight = set()
+        self.results = []
+        self.lock = threading.Lock()
+
+        self.batch = []
+        self.batch_bytes = len(PAYLOAD_PREFIX) + len(PAYLOAD_SUFFIX)
+        self.batch_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.close()
+
+    def add(self, doc):
+        """Queues a document, sending the current batch first if the document would overflow it"""
+        self.add_json(doc[self.key_field], json.dumps(doc).encode("utf-8"))
+
+    def add_json(self, key, body):
+        """Queues a document already serialised to JSON bytes, with its key"""
+        # Each document after the first is preceded by a comma
+        if self.batch and (
+            len(self.batch) >= self.max_batch_docs
+            or self.batch_bytes + len(body) + 1 > self.max_batch_bytes
+        ):
+            self.send_batch()
+        self.batch_bytes += len(body) + (1 if self.batch else 0)
+        self.batch.append((key, body))
+
+    def send_batch(self):
+        """Hands the current batch to the thread pool, waiting while too many are in flight"""
+        if not self.batch:
+            return
+
+        while len(self.in_flight) >= self.max_in_flight:
+            done, self.in_flight = wait(self.in_flight, return_when=FIRST_COMPLETED)
+            try:
+                check_uploads(done)
+            except SearchUploadError:
+                self.close()
+                raise
+
+        self.batch_count += 1
+        future = self.executor.submit(self.upload_batch, self.batch_count, self.batch)
+        self.in_flight.add(future)
+        self.batch = []
+        self.batch_bytes = len(PAYLOAD_PREFIX) + len(PAYLOAD_SUFFIX)
+
+    def upload_batch(self, number, batch):
+        """Posts one batch, retrying the documents that failed for as long as they can be retried"""
+        pending = batch
+        size_bytes = 0
+        attempts = 0
+        error = None
+        uploading_seconds = 0.0
+        throttled_seconds = 0.0
+        while pending:
+            attempts += 1
+            throttled_seconds += self.pacer.wait()
+            payload = PAYLOAD_PREFIX + b",".join(body for key, body in pending) + PAYLOAD_SUFFIX
+            size_bytes = size_bytes or len(payload)
+            retry_after = None
+            start = time.monotonic()
+            try:
+                response = self.session.post(self.url, headers=self.headers, data=payload)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+                retriable = True
+            except requests.exceptions.RequestException as e:
+                error = e
+                retriable = False
+            else:
+                pending, error, retriable = self.get_pending(pending, response)
+                retry_after = get_retry_after(response)
+            finally:
+                uploading_seconds += time.monotonic() - start
+
+            if not pending or not retriable or attempts > self.max_retries:
+                break
+            delay = retry_after or min(self.backoff_seconds * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+            logging.warning(
+                f"Batch {number}: {len(pending)} documents not uploaded ({error}), "
+                f"retrying in {delay:.2f}s (attempt {attempts})"
+            )
+            self.pacer.record_throttle(delay)
+
+        result = UploadResult(
+            number,
+            len(batch),
+            size_bytes,
+            attempts,
+            [key for key, body in pending],
+            error if pending else None,
+            uploading_seconds,
+            throttled_seconds,
+        )
+        with self.lock:
+            self.results.append(result)
+        return result
+
+    def get_pending(self, pending, response):
+        """Returns the documents still to upload after response, the error and whether it can be retried"""
+        if response.status_code == 200:
+            return [], None, False
+
+        if response.status_code != MULTI_STATUS:
+            error = requests.exceptions.HTTPError(
+                f"{response.status_code}: {response.text}", response=response
+            )
+            return pending, error, response.status_code in RETRIABLE_BATCH_STATUS_CODES
+
+        try:
+            failed_statuses = get_failed_statuses(response)
+        except (ValueError, KeyError) as e:
+            return pending, SearchUploadError(f"unreadable 207 response: {e}"), False
+        pending = [(key, body) for key, body in pending if key in failed_statuses]
+        error = SearchUploadError(
+            f"{len(pending)} documents failed with status codes "
+            f"{sorted(set(map(str, failed_statuses.values())))}"
+        )
+        retriable = all(
+            status_code in RETRIABLE_DOCUMENT_STATUS_CODES
+            for status_code in failed_statuses.values()
+        )
+        return pending, error, retriable
+
+    def close(self):
+        """Waits for the batches in flight and closes the session"""
+        self.executor.shutdown(wait=True)
+        self.in_flight = set()
+        self.session.close()
+
+    def flush(self):
+        """Sends any queued documents, waits for every batch and returns the SearchUploadReport"""
+        try:
+            self.send_batch()
+            done, not_done = wait(self.in_flight)
+            check_uploads(done)
+        finally:
+            self.close()
+
+        report = SearchUploadReport(self.results)
+        report.log()
+        if report.failed_batches:
+            raise SearchUploadError(
+                f"{len(report.failed_batches)} of {len(report.batches)} batches failed, "
+                f"{report.documents_failed} documents were not uploaded to {self.index_name}"
+            )
+        return report
+
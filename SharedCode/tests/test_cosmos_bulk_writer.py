@@ -0,0 +1,276 @@
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from SharedCode.benchmark import benchmark
+from SharedCode.cosmos_bulk_writer import CosmosBulkWriter
+from SharedCode.exceptions import BulkWriteError
+from SharedCode.fake_cosmos_container import FakeCosmosContainer
+from SharedCode.fake_cosmos_container import send_response
+
+
+def get_docs(count, padding=100):
+    return [{"id": f"{i:04d}", "version": 1, "padding": "x" * padding} for i in range(count)]
+
+
+def get_error(status_code, retry_after_ms=None):
+    error = CosmosHttpResponseError(status_code=status_code, message="error")
+    if retry_after_ms is not None:
+        error.headers = {"x-ms-retry-after-ms": str(retry_after_ms)}
+    return error
+
+
+class ConcurrencyTrackingContainer(FakeCosmosContainer):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.active = 0
+        self.max_active = 0
+        self.active_lock = threading.Lock()
+
+    def execute_stored_procedure(self, sproc, partition_key, params, **kwargs):
+        with self.active_lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            return super().execute_stored_procedure(sproc, partition_key, params, **kwargs)
+        finally:
+            with self.active_lock:
+                self.active -= 1
+
+
+class FailingContainer(FakeCosmosContainer):
+    """Raises the queued errors, in order, before accepting calls"""
+
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = list(errors)
+
+    def execute_stored_procedure(self, sproc, partition_key, params, **kwargs):
+        with self.lock:
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        return super().execute_stored_procedure(sproc, partition_key, params, **kwargs)
+
+
+class PartialContainer(FakeCosmosContainer):
+    """Creates at most the queued number of documents in each call, as bulkImport does at its execution bounds"""
+
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = list(limits)
+
+    def execute_stored_procedure(self, sproc, partition_key, params, **kwargs):
+        limit = self.limits.pop(0) if self.limits else len(params[0])
+        return super().execute_stored_procedure(sproc, partition_key, [params[0][:limit]], **kwargs)
+
+
+class ClientRetryingContainer(FakeCosmosContainer):
+    """Answers the first request with a 429 and retries it, as the Cosmos client does"""
+
+    def __init__(self, retry_after_ms):
+        super().__init__()
+        self.retry_after_ms = retry_after_ms
+
+    def execute_stored_procedure(self, sproc, partition_key, params, raw_response_hook=None):
+        send_response(raw_response_hook, 429, {"x-ms-retry-after-ms": str(self.retry_after_ms)})
+        time.sleep(self.retry_after_ms / 1000)
+        return super().execute_stored_procedure(sproc, partition_key, params, raw_response_hook)
+
+
+class TestCosmosBulkWriter(unittest.TestCase):
+    def test_batches_are_limited_by_payload_bytes(self):
+        container = FakeCosmosContainer()
+        docs = get_docs(50)
+        doc_bytes = len(json.dumps(docs[0]).encode("utf-8"))
+        writer = CosmosBulkWriter(container, 1, max_batch_bytes=doc_bytes * 10)
+        for doc in docs:
+            writer.add(doc)
+        report = writer.flush()
+
+        self.assertEqual(5, len(report.batches))
+        self.assertTrue(all(batch.size_bytes <= doc_bytes * 10 for batch in report.batches))
+        self.assertEqual(50, report.documents_written)
+        self.assertCountEqual(docs, container.documents)
+
+    def test_document_larger_than_batch_limit_is_sent_alone(self):
+        container = FakeCosmosContainer()
+        writer = CosmosBulkWriter(container, 1, max_batch_bytes=500)
+        writer.add(get_docs(1, padding=10)[0])
+        writer.add(get_docs(1, padding=1000)[0])
+        report = writer.flush()
+
+        self.assertEqual([1, 1], [batch.documents for batch in report.batches])
+
+    def test_in_flight_batches_are_bounded(self):
+        container = ConcurrencyTrackingContainer(latency_seconds=0.01)
+        writer = CosmosBulkWriter(container, 1, max_batch_bytes=200, max_in_flight=3)
+        for doc in get_docs(40):
+            writer.add(doc)
+        writer.flush()
+
+        self.assertEqual(40, len(container.documents))
+        self.assertLessEqual(container.max_active, 3)
+        self.assertGreater(container.max_active, 1)
+
+    @mock.patch("SharedCode.cosmos_bulk_writer.time.sleep")
+    def test_throttled_batch_is_retried_after_requested_delay(self, mock_sleep):
+        container = FailingContainer([get_error(429, retry_after_ms=250), get_error(429)])
+        writer = CosmosBulkWriter(container, 1, backoff_seconds=0.5)
+        for doc in get_docs(3):
+            writer.add(doc)
+        report = writer.flush()
+
+        self.assertEqual(3, report.batches[0].attempts)
+        delays = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertEqual(2, len(delays))
+        self.assertAlmostEqual(0.25, delays[0], places=2)
+        self.assertAlmostEqual(1.0, delays[1], places=2)
+        self.assertAlmostEqual(1.25, report.throttled_seconds, places=2)
+        self.assertEqual(3, len(container.documents))
+
+    @mock.patch("SharedCode.cosmos_bulk_writer.time.sleep")
+    def test_flush_raises_when_retries_are_exhausted(self, mock_sleep):
+        container = FailingContainer([get_error(429)] * 3)
+        writer = CosmosBulkWriter(container, 1, max_retries=2)
+        writer.add(get_docs(1)[0])
+
+        with self.assertLogs(level="ERROR"):
+            with self.assertRaises(BulkWriteError):
+                writer.flush()
+        self.assertEqual(2, mock_sleep.call_count)
+
+    def test_other_errors_are_not_retried(self):
+        container = FailingContainer([get_error(400)])
+        writer = CosmosBulkWriter(container, 1, max_batch_bytes=300, max_in_flight=1)
+        for doc in get_docs(4):
+            writer.add(doc)
+
+        with self.assertLogs(level="ERROR") as logs:
+            with self.assertRaises(BulkWriteError):
+                writer.flush()
+        self.assertEqual(1, len(logs.records))
+        self.assertEqual(2, len(container.documents))
+
+    def test_documents_bulk_import_did_not_reach_are_sent_again(self):
+        container = PartialContainer([3, 4])
+        docs = get_docs(10)
+        writer = CosmosBulkWriter(container, 1)
+        for doc in docs:
+            writer.add(doc)
+        report = writer.flush()
+
+        self.assertEqual(docs, container.documents)
+        self.assertEqual(3, container.calls)
+        self.assertEqual(3, report.batches[0].attempts)
+        self.assertEqual(10, report.documents_written)
+
+    def test_batch_fails_when_bulk_import_creates_nothing(self):
+        container = PartialContainer([3, 0])
+        writer = CosmosBulkWriter(container, 1)
+        for doc in get_docs(10):
+            writer.add(doc)
+
+        with self.assertLogs(level="ERROR"):
+            with self.assertRaises(BulkWriteError):
+                writer.flush()
+        self.assertEqual(3, len(container.documents))
+
+    def test_writes_complete_against_throttling_container(self):
+        container = FakeCosmosContainer(max_requests_per_second=10)
+        writer = CosmosBulkWriter(container, 1, max_batch_bytes=200)
+        for doc in get_docs(15):
+            writer.add(doc)
+        report = writer.flush()
+
+        self.assertGreater(container.throttled_calls, 0)
+        self.assertEqual(15, report.documents_written)
+        self.assertCountEqual(get_docs(15), container.documents)
+        self.assertGreater(report.throttled_seconds, 0)
+        self.assertGreater(report.request_charge, 0)
+
+    def test_throttling_retried_inside_the_client_is_reported(self):
+        container = ClientRetryingContainer(retry_after_ms=50)
+        writer = CosmosBulkWriter(container, 1)
+        writer.add(get_docs(1)[0])
+        report = writer.flush()
+
+        self.assertEqual(1, report.batches[0].attempts)
+        self.assertAlmostEqual(0.05, report.throttled_seconds, places=2)
+        self.assertGreater(writer.pacer.resume_at, 0)
+
+    def test_unthrottled_writes_do_not_wait(self):
+        container = FakeCosmosContainer(latency_seconds=0.001)
+        writer = CosmosBulkWriter(container, 1, max_batch_bytes=200)
+        for doc in get_docs(20):
+            writer.add(doc)
+        report = writer.flush()
+
+        self.assertEqual(0, report.throttled_seconds)
+        self.assertGreater(report.writing_seconds, 0)
+
+    def test_request_charges_pace_batches_to_budget(self):
+        # Each batch costs roughly 0.7 RU, so a 20 RU/s budget spaces them about 35ms apart
+        container = FakeCosmosContainer()
+        writer = CosmosBulkWriter(
+            container, 1, max_batch_bytes=200, max_in_flight=1, request_units_per_second=20
+        )
+        start = time.monotonic()
+        for doc in get_docs(6):
+            writer.add(doc)
+        report = writer.flush()
+        elapsed = time.monotonic() - start
+
+        expected_seconds = sum(batch.request_charge for batch in report.batches[:-1]) / 20
+        self.assertGreater(report.throttled_seconds, expected_seconds * 0.8)
+        self.assertGreater(elapsed, expected_seconds * 0.8)
+        self.assertEqual(0, container.throttled_calls)
+
+    def test_flush_with_no_documents(self):
+        report = CosmosBulkWriter(FakeCosmosContainer(), 1).flush()
+
+        self.assertEqual([], report.batches)
+
+    def test_context_manager_flushes(self):
+        container = FakeCosmosContainer()
+        with CosmosBulkWriter(container, 1) as writer:
+            writer.add(get_docs(1)[0])
+
+        self.assertEqual(1, len(container.documents))
+
+
+@benchmark
+class TestCosmosBulkWriterBenchmark(unittest.TestCase):
+    def test_bulk_writer_is_faster_than_sequential_five_document_batches(self):
+        docs = get_docs(200, padding=2000)
+
+        container = FakeCosmosContainer(latency_seconds=0.005, seconds_per_kb=0.0001)
+        start = time.perf_counter()
+        for i in range(0, len(docs), 5):
+            container.scripts.execute_stored_procedure(
+                sproc="bulkImport", partition_key="1", params=[docs[i:i + 5]]
+            )
+        sequential_time = time.perf_counter() - start
+
+        container = FakeCosmosContainer(latency_seconds=0.005, seconds_per_kb=0.0001)
+        start = time.perf_counter()
+        writer = CosmosBulkWriter(container, 1, max_batch_bytes=64 * 1024, max_in_flight=4)
+        for doc in docs:
+            writer.add(doc)
+        writer.flush()
+        writer_time = time.perf_counter() - start
+
+        print(
+            f"\nsequential 5 document batches: {len(docs) / sequential_time:.0f} docs/s, "
+            f"bulk writer: {len(docs) / writer_time:.0f} docs/s"
+        )
+        self.assertEqual(len(docs), len(container.documents))
+        self.assertLess(writer_time, sequential_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
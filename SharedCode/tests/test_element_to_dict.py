@@ -0,0 +1,91 @@
+import glob
+import os
+import timeit
+import unittest
+
+import defusedxml.ElementTree as ET
+import xmltodict
+
+from SharedCode.benchmark import benchmark
+from SharedCode.utils import element_to_dict
+
+CURRENTDIR = os.path.dirname(os.path.abspath(__file__))
+ROOTDIR = os.path.dirname(os.path.dirname(CURRENTDIR))
+FIXTURE_FILES = sorted(
+    glob.glob(os.path.join(ROOTDIR, "EtlPipeline", "tests", "fixtures", "*.xml"))
+    + glob.glob(os.path.join(ROOTDIR, "CreateInst", "tests", "fixtures", "*.xml"))
+)
+
+
+def round_trip(element):
+    return xmltodict.parse(ET.tostring(element))[element.tag]
+
+
+class TestElementToDict(unittest.TestCase):
+    def assert_parity(self, xml_string):
+        element = ET.fromstring(xml_string)
+        self.assertEqual(round_trip(element), element_to_dict(element))
+
+    def test_leaf_text(self):
+        self.assert_parity("<A><B>1</B><C>two</C></A>")
+
+    def test_empty_and_whitespace_elements(self):
+        self.assert_parity("<A><B/><C>   </C><D>\n</D></A>")
+
+    def test_repeated_tags_become_lists(self):
+        self.assert_parity("<A><B>1</B><B>2</B><C>3</C><B>4</B></A>")
+
+    def test_nested_repeated_elements(self):
+        self.assert_parity(
+            "<A><B><C>1</C></B><B><C>2</C><C>3</C></B></A>"
+        )
+
+    def test_attributes(self):
+        self.assert_parity('<A x="1"><B y="2">text</B><C z="3"/></A>')
+
+    def test_mixed_content(self):
+        self.assert_parity("<A> before <B>1</B> after </A>")
+
+    def test_escaped_text(self):
+        self.assert_parity("<A><B>Abingdon &amp;amp; Witney</B><C>&lt;5</C></A>")
+
+    def test_leaf_element(self):
+        self.assert_parity("<A>value</A>")
+        self.assert_parity("<A/>")
+
+    def test_fixture_parity(self):
+        """Compares each top level section and each course in every XML fixture"""
+        for fixture_file in FIXTURE_FILES:
+            with open(fixture_file, "rb") as infile:
+                root = ET.fromstring(infile.read())
+            elements = list(root) + list(root.iter("KISCOURSE"))
+            for element in elements:
+                with self.subTest(fixture=os.path.basename(fixture_file), tag=element.tag):
+                    self.assertEqual(round_trip(element), element_to_dict(element))
+
+
+@benchmark
+class TestElementToDictBenchmark(unittest.TestCase):
+    def test_per_course_conversion_is_faster_than_round_trip(self):
+        fixture_file = os.path.join(ROOTDIR, "EtlPipeline", "tests", "fixtures", "25_courses.xml")
+        with open(fixture_file, "rb") as infile:
+            root = ET.fromstring(infile.read())
+        courses = list(root.iter("KISCOURSE"))
+
+        round_trip_time = min(timeit.repeat(
+            lambda: [round_trip(course) for course in courses], number=5, repeat=3
+        ))
+        converter_time = min(timeit.repeat(
+            lambda: [element_to_dict(course) for course in courses], number=5, repeat=3
+        ))
+
+        per_course = len(courses) * 5
+        print(
+            f"\nxmltodict round trip: {round_trip_time / per_course * 1e6:.1f}us per course, "
+            f"element_to_dict: {converter_time / per_course * 1e6:.1f}us per course"
+        )
+        self.assertLess(converter_time, round_trip_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
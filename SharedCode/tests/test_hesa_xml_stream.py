@@ -0,0 +1,118 @@
+import gzip
+import io
+import os
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+from SharedCode.exceptions import XmlValidationError
+from SharedCode.hesa_xml_stream import HesaXmlStream
+
+MULTI_INSTITUTION_XML = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "EtlPipeline", "tests", "fixtures", "multi_inst_courses.xml",
+)
+
+LOCATION = "<LOCATION><UKPRN>10000055</UKPRN><LOCID>AB</LOCID></LOCATION>"
+KISAIM = "<KISAIM><KISAIMCODE>021</KISAIMCODE><KISAIMLABEL>BA</KISAIMLABEL></KISAIM>"
+SECTORSAL = "<SECTORSAL><GOSECSAL><GOSECSBJ>CAH01</GOSECSBJ></GOSECSAL></SECTORSAL>"
+
+
+def get_institution(pubukprn):
+    return (
+        f"<INSTITUTION><PUBUKPRN>{pubukprn}</PUBUKPRN>"
+        f"<KISCOURSE><KISCOURSEID>AB20</KISCOURSEID></KISCOURSE></INSTITUTION>"
+    )
+
+
+def get_xml_file(*sections):
+    xml = '<?xml version="1.0" encoding="utf-8"?><KIS>' + "".join(sections) + "</KIS>"
+    return io.BytesIO(xml.encode("utf-8"))
+
+
+class TestHesaXmlStream(unittest.TestCase):
+    def test_reference_data_before_institutions(self):
+        xml_file = get_xml_file(
+            LOCATION, KISAIM, SECTORSAL, get_institution("1"), get_institution("2")
+        )
+        hesa_stream = HesaXmlStream(xml_file)
+
+        reference_root = hesa_stream.read_reference_data()
+        self.assertEqual(
+            ["LOCATION", "KISAIM", "SECTORSAL"],
+            [elem.tag for elem in reference_root],
+        )
+        # Only the first institution is read ahead of the reference data being returned
+        self.assertEqual("1", hesa_stream.first_institution.findtext("PUBUKPRN"))
+
+        pubukprns = [inst.findtext("PUBUKPRN") for inst in hesa_stream.iter_institutions()]
+        self.assertEqual(["1", "2"], pubukprns)
+
+    def test_sector_salaries_after_institutions(self):
+        xml_file = get_xml_file(LOCATION, get_institution("1"), get_institution("2"), SECTORSAL)
+        hesa_stream = HesaXmlStream(xml_file)
+
+        reference_root = hesa_stream.read_reference_data()
+        self.assertEqual(["LOCATION"], [elem.tag for elem in reference_root])
+
+        pubukprns = [inst.findtext("PUBUKPRN") for inst in hesa_stream.iter_institutions()]
+        self.assertEqual(["1", "2"], pubukprns)
+        reference_root = hesa_stream.read_sector_salaries()
+        self.assertEqual(["LOCATION", "SECTORSAL"], [elem.tag for elem in reference_root])
+        self.assertEqual("CAH01", reference_root.findtext("SECTORSAL/GOSECSAL/GOSECSBJ"))
+
+    def test_missing_sector_salaries(self):
+        hesa_stream = HesaXmlStream(get_xml_file(LOCATION, get_institution("1")))
+
+        self.assertEqual(1, len(list(hesa_stream.iter_institutions())))
+        with self.assertRaises(XmlValidationError):
+            hesa_stream.read_sector_salaries()
+
+    def test_institutions_are_not_held_for_sector_salaries(self):
+        with open(MULTI_INSTITUTION_XML, "rb") as xml_file:
+            hesa_stream = HesaXmlStream(xml_file)
+            parsed = []
+
+            def count_institutions(events):
+                for event, elem in events:
+                    if event == "end" and elem.tag == "INSTITUTION":
+                        parsed.append(elem.findtext("PUBUKPRN"))
+                    yield event, elem
+
+            hesa_stream.events = count_institutions(hesa_stream.events)
+            yielded = []
+            for institution in hesa_stream.iter_institutions():
+                yielded.append(institution.findtext("PUBUKPRN"))
+                # Each institution is handed on as soon as it is parsed
+                self.assertEqual(yielded, parsed)
+                self.assertIsNone(hesa_stream.reference_root.find("SECTORSAL"))
+
+        self.assertEqual(6, len(yielded))
+        expected = ElementTree.parse(MULTI_INSTITUTION_XML).getroot().find("SECTORSAL")
+        self.assertEqual(
+            ElementTree.tostring(expected),
+            ElementTree.tostring(hesa_stream.read_sector_salaries().find("SECTORSAL")),
+        )
+
+    def test_institutions_are_detached_from_root(self):
+        xml_file = get_xml_file(LOCATION, SECTORSAL, get_institution("1"), get_institution("2"))
+        hesa_stream = HesaXmlStream(xml_file)
+
+        for institution in hesa_stream.iter_institutions():
+            # At most the section currently being parsed is attached to the root
+            self.assertLessEqual(len(hesa_stream.root), 1)
+            self.assertEqual("AB20", institution.findtext("KISCOURSE/KISCOURSEID"))
+
+    def test_reads_gzip_stream(self):
+        xml_file = get_xml_file(KISAIM, SECTORSAL, get_institution("1"))
+        gzip_file = gzip.GzipFile(
+            fileobj=io.BytesIO(gzip.compress(xml_file.getvalue())), mode="rb"
+        )
+        hesa_stream = HesaXmlStream(gzip_file)
+
+        institutions = list(hesa_stream.iter_institutions())
+        self.assertEqual(1, len(institutions))
+        self.assertIsNotNone(hesa_stream.reference_root.find("KISAIM"))
+
+
+if __name__ == "__main__":
+    unittest.main()
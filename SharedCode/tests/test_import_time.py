@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from SharedCode.benchmark import benchmark
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ENTRY_MODULES = ["EtlPipeline", "CreateInst", "CourseSearchBuilder"]
+
+# Prints the import time in milliseconds and how many Cosmos clients were asked for
+IMPORT_SCRIPT = """
+import sys
+import time
+import SharedCode.utils
+
+cosmos_clients = []
+
+def get_cosmos_client():
+    cosmos_clients.append(1)
+    raise RuntimeError("Cosmos client requested at import time")
+
+SharedCode.utils.get_cosmos_client = get_cosmos_client
+start = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+print((time.perf_counter() - start) * 1000, len(cosmos_clients))
+"""
+
+
+def import_modules(*modules):
+    """Imports the modules in a fresh interpreter.
+
+    Returns the milliseconds taken and the number of Cosmos clients requested.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT, *modules],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    ms, cosmos_clients = result.stdout.strip().splitlines()[-1].split()
+    return float(ms), int(cosmos_clients)
+
+
+class TestEntryModuleImports(unittest.TestCase):
+    def test_course_stats_import_does_not_touch_cosmos(self):
+        _ms, cosmos_clients = import_modules("EtlPipeline.course_stats", "EtlPipeline.course_docs")
+
+        self.assertEqual(0, cosmos_clients)
+
+
+@benchmark
+class TestEntryModuleImportBenchmark(unittest.TestCase):
+    def test_entry_module_import_times(self):
+        # Imported together first so the shared dependencies are in the OS file cache
+        import_modules(*ENTRY_MODULES)
+        import_times = {module: import_modules(module)[0] for module in ENTRY_MODULES}
+
+        print("\n" + ", ".join(f"{module}: {ms:.0f}ms" for module, ms in import_times.items()))
+        for module, ms in import_times.items():
+            self.assertLess(ms, 10000, f"{module} took {ms:.0f}ms to import")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import json
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from SharedCode.benchmark import benchmark
+from SharedCode.exceptions import SearchUploadError
+from SharedCode.fake_search_session import FakeSearchSession
+from SharedCode.search_uploader import SearchUploader
+
+
+def get_docs(count, padding=100):
+    return [{"@search.action": "upload", "id": f"{i:04d}", "padding": "x" * padding} for i in range(count)]
+
+
+def upload(session, docs, **kwargs):
+    uploader = SearchUploader("https://search.example", "key", "2019-05-06", "postcodes", session=session, **kwargs)
+    for doc in docs:
+        uploader.add(doc)
+    return uploader.flush()
+
+
+class TestSearchUploader(unittest.TestCase):
+    def test_batches_are_limited_by_document_count(self):
+        session = FakeSearchSession()
+
+        report = upload(session, get_docs(25), max_batch_docs=10)
+
+        self.assertEqual([10, 10, 5], [batch.documents for batch in report.batches])
+        self.assertEqual(25, report.documents_uploaded)
+        self.assertEqual(25, len(session.documents))
+        self.assertTrue(session.closed)
+
+    def test_batches_are_limited_by_payload_bytes(self):
+        session = FakeSearchSession()
+        doc_bytes = len(json.dumps(get_docs(1)[0]).encode("utf-8"))
+
+        report = upload(session, get_docs(50), max_batch_bytes=doc_bytes * 10 + 22)
+
+        self.assertEqual(5, len(report.batches))
+        self.assertTrue(all(batch.size_bytes <= doc_bytes * 10 + 22 for batch in report.batches))
+        self.assertEqual(50, len(session.documents))
+
+    def test_in_flight_batches_are_bounded(self):
+        session = FakeSearchSession(latency_seconds=0.01)
+
+        upload(session, get_docs(40), max_batch_docs=2, max_in_flight=3)
+
+        self.assertEqual(40, len(session.documents))
+        self.assertLessEqual(session.max_active, 3)
+        self.assertGreater(session.max_active, 1)
+
+    @mock.patch("SharedCode.cosmos_bulk_writer.time.sleep")
+    def test_only_failed_documents_are_retried(self, mock_sleep):
+        session = FakeSearchSession([{"0001": 503, "0003": 422}])
+
+        report = upload(session, get_docs(5))
+
+        self.assertEqual([["0000", "0001", "0002", "0003", "0004"], ["0001", "0003"]], session.posts)
+        self.assertEqual(2, report.batches[0].attempts)
+        self.assertEqual(5, len(session.documents))
+
+    @mock.patch("SharedCode.cosmos_bulk_writer.time.sleep")
+    def test_throttled_batches_back_off(self, mock_sleep):
+        session = FakeSearchSession([429, 503])
+
+        report = upload(session, get_docs(3), backoff_seconds=0.5)
+
+        self.assertEqual(3, report.batches[0].attempts)
+        delays = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertEqual(2, len(delays))
+        self.assertAlmostEqual(0.5, delays[0], places=2)
+        self.assertAlmostEqual(1.0, delays[1], places=2)
+        self.assertEqual(3, len(session.documents))
+
+    @mock.patch("SharedCode.cosmos_bulk_writer.time.sleep")
+    def test_retry_after_header_is_honoured(self, mock_sleep):
+        session = FakeSearchSession([503], retry_after="3")
+
+        upload(session, get_docs(1))
+
+        self.assertAlmostEqual(3, mock_sleep.call_args.args[0], places=2)
+
+    @mock.patch("SharedCode.cosmos_bulk_writer.time.sleep")
+    def test_flush_raises_when_retries_are_exhausted(self, mock_sleep):
+        session = FakeSearchSession([429] * 3)
+
+        with self.assertLogs(level="ERROR"):
+            with self.assertRaises(SearchUploadError):
+                upload(session, get_docs(1), max_retries=2)
+        self.assertEqual(2, mock_sleep.call_count)
+
+    def test_documents_with_permanent_errors_are_not_retried(self):
+        session = FakeSearchSession([{"0001": 400}])
+
+        with self.assertLogs(level="ERROR") as logs:
+            with self.assertRaises(SearchUploadError) as context:
+                upload(session, get_docs(3))
+
+        self.assertEqual(1, len(session.posts))
+        self.assertIn("1 documents were not uploaded", str(context.exception))
+        self.assertIn("failed to upload 1 of 3 documents", logs.output[0])
+
+    def test_other_errors_are_not_retried(self):
+        session = FakeSearchSession([400])
+
+        with self.assertLogs(level="ERROR"):
+            with self.assertRaises(SearchUploadError):
+                upload(session, get_docs(2), max_batch_docs=1, max_in_flight=1)
+        self.assertEqual(2, len(session.posts))
+        self.assertEqual(1, len(session.documents))
+
+    @mock.patch("SharedCode.cosmos_bulk_writer.time.sleep")
+    def test_connection_errors_are_retried(self, mock_sleep):
+        session = FakeSearchSession()
+        post = session.post
+
+        def post_after_reset(*args, **kwargs):
+            session.post = post
+            raise requests.exceptions.ConnectionError("reset")
+
+        session.post = post_after_reset
+        report = upload(session, get_docs(2))
+
+        self.assertEqual(2, report.batches[0].attempts)
+        self.assertEqual(2, len(session.documents))
+
+    def test_unexpected_errors_are_not_lost(self):
+        for number_of_docs, max_in_flight in ((1, 1), (5, 1), (5, 2)):
+            with self.subTest(number_of_docs=number_of_docs, max_in_flight=max_in_flight):
+                session = FakeSearchSession()
+                session.post = mock.Mock(side_effect=RuntimeError("boom"))
+
+                with self.assertRaises(SearchUploadError) as context:
+                    upload(session, get_docs(number_of_docs), max_batch_docs=1, max_in_flight=max_in_flight)
+                self.assertIsInstance(context.exception.__cause__, RuntimeError)
+                self.assertTrue(session.closed)
+
+    def test_flush_with_no_documents(self):
+        session = FakeSearchSession()
+
+        report = upload(session, [])
+
+        self.assertEqual([], report.batches)
+        self.assertEqual([], session.posts)
+
+    def test_pooled_session_keeps_a_connection_per_batch_in_flight(self):
+        uploader = SearchUploader("https://search.example", "key", "2019-05-06", "postcodes", max_in_flight=6)
+
+        adapter = uploader.session.get_adapter("https://search.example")
+        self.assertEqual(6, adapter._pool_maxsize)
+        uploader.flush()
+
+
+@benchmark
+class TestSearchUploaderBenchmark(unittest.TestCase):
+    def test_uploader_is_faster_than_sequential_posts(self):
+        docs = get_docs(400)
+
+        session = FakeSearchSession(latency_seconds=0.01)
+        start = time.perf_counter()
+        for i in range(0, len(docs), 50):
+            payload = json.dumps({"value": docs[i:i + 50]}).encode("utf-8")
+            session.post("https://search.example", {}, payload)
+        sequential_time = time.perf_counter() - start
+
+        session = FakeSearchSession(latency_seconds=0.01)
+        start = time.perf_counter()
+        upload(session, docs, max_batch_docs=50, max_in_flight=4)
+        uploader_time = time.perf_counter() - start
+
+        print(
+            f"\nsequential posts: {len(docs) / sequential_time:.0f} docs/s, "
+            f"search uploader: {len(docs) / uploader_time:.0f} docs/s"
+        )
+        self.assertEqual(len(docs), len(session.documents))
+        self.assertLess(uploader_time, sequential_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,13 @@
 import unittest
 from unittest import mock
 
+from SharedCode.fake_cosmos_container import FakeCosmosContainer
+from SharedCode import utils
 from SharedCode.utils import get_collection_link
+from SharedCode.utils import get_projected_query
+from SharedCode.utils import get_projection
+from SharedCode.utils import iter_query_pages
+from SharedCode.utils import project_document
 
 
 class TestGetCollectionLink(unittest.TestCase):
@@ -27,5 +33,81 @@ class TestGetCollectionLink(unittest.TestCase):
         self.assertEqual(collection_link, expected_link)
 
 
+class TestIterQueryPages(unittest.TestCase):
+    def setUp(self):
+        self.container = FakeCosmosContainer()
+        self.container.documents = [{"id": str(i)} for i in range(7)]
+
+    def test_documents_are_returned_a_page_at_a_time(self):
+        pages = list(iter_query_pages(self.container, "SELECT * from c", page_size=3))
+
+        self.assertEqual([3, 3, 1], [len(page) for page in pages])
+        self.assertEqual(self.container.documents, [doc for page in pages for doc in page])
+
+    def test_next_page_is_only_read_when_needed(self):
+        pages = iter_query_pages(self.container, "SELECT * from c", page_size=3)
+
+        next(pages)
+        self.assertEqual(1, self.container.pages_read)
+        next(pages)
+        self.assertEqual(2, self.container.pages_read)
+
+    def test_query_can_resume_from_continuation_token(self):
+        pages = list(iter_query_pages(self.container, "SELECT * from c", page_size=3, continuation_token="6"))
+
+        self.assertEqual([[{"id": "6"}]], pages)
+
+    @mock.patch.dict("os.environ", {"CosmosQueryPageSize": "5"})
+    def test_page_size_defaults_to_setting(self):
+        pages = list(iter_query_pages(self.container, "SELECT * from c"))
+
+        self.assertEqual([5, 2], [len(page) for page in pages])
+
+
+class TestProjectedQuery(unittest.TestCase):
+    def test_projection_keeps_nesting(self):
+        self.assertEqual(
+            '{"institution_id": c["institution_id"], '
+            '"course": {"kis_course_id": c["course"]["kis_course_id"], "mode": {"label": c["course"]["mode"]["label"]}}}',
+            get_projection(["institution_id", "course.kis_course_id", "course.mode.label"]),
+        )
+
+    def test_whole_object_wins_over_its_fields(self):
+        self.assertEqual('{"course": c["course"]}', get_projection(["course.mode.label", "course"]))
+        self.assertEqual('{"course": c["course"]}', get_projection(["course", "course.mode.label"]))
+
+    def test_projected_query(self):
+        self.assertEqual(
+            'SELECT VALUE {"code": c["code"]} FROM c WHERE c.version = 3',
+            get_projected_query(["code"], "c.version = 3"),
+        )
+        self.assertEqual("SELECT * FROM c WHERE c.version = 3", get_projected_query(None, "c.version = 3"))
+
+    def test_project_document_leaves_out_missing_fields(self):
+        document = {"institution_id": "1", "course": {"kis_course_id": "A", "mode": {"code": 1, "label": "Full"}}}
+
+        self.assertEqual(
+            {"institution_id": "1", "course": {"mode": {"label": "Full"}}},
+            project_document(document, ["institution_id", "course.mode.label", "course.title"]),
+        )
+
+    @mock.patch.object(utils, "get_cosmos_client")
+    def test_lookups_only_read_the_fields_they_use(self, mock_get_cosmos_client):
+        container = mock_get_cosmos_client.return_value.get_database_client.return_value.get_container_client.return_value
+        container.query_items.return_value = [
+            {"institution": {"pub_ukprn": "1", "pub_ukprn_name": "Uni", "pub_ukprn_welsh_name": "Prifysgol"}}
+        ]
+
+        self.assertEqual({"1": {"ukprn_name": "Uni", "ukprn_welsh_name": "Prifysgol"}}, utils.get_ukrlp_lookups(2))
+        self.assertEqual(
+            get_projected_query(utils.UKRLP_LOOKUP_FIELDS, "c.version = 2"),
+            container.query_items.call_args.kwargs["query"],
+        )
+
+        container.query_items.return_value = [{"code": "CAH01", "english_name": "Medicine"}]
+        self.assertEqual({"CAH01": {"code": "CAH01", "english_name": "Medicine"}}, utils.get_subject_lookups(2))
+        self.assertIn('"level": c["level"]', container.query_items.call_args.kwargs["query"])
+
+
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,109 @@
+import threading
+import time
+import unittest
+
+from SharedCode.benchmark import benchmark
+from SharedCode.warm_up import WarmUp
+
+
+def sleep_then_return(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+class TestWarmUp(unittest.TestCase):
+    def test_results_are_returned_by_name(self):
+        warm_up = WarmUp()
+        warm_up.add("one", lambda: 1)
+        warm_up.add("two", sleep_then_return, 0, 2)
+
+        self.assertEqual({"one": 1, "two": 2}, warm_up.run())
+
+    def test_tasks_run_at_the_same_time(self):
+        # Each task waits for all the others to start, which only works if they run together
+        barrier = threading.Barrier(4, timeout=5)
+
+        def wait_for_others(value):
+            barrier.wait()
+            return value
+
+        warm_up = WarmUp()
+        for i in range(4):
+            warm_up.add(f"task {i}", wait_for_others, i)
+
+        self.assertEqual({f"task {i}": i for i in range(4)}, warm_up.run())
+        self.assertEqual(4, len(warm_up.timings))
+
+    def test_task_can_wait_for_another_task(self):
+        warm_up = WarmUp()
+        warm_up.add("version", sleep_then_return, 0.05, 7)
+        warm_up.add("lookups", lambda: f"lookups for version {warm_up.result('version')}")
+
+        self.assertEqual("lookups for version 7", warm_up.run()["lookups"])
+
+    def test_first_failure_is_raised_once_running_tasks_finish(self):
+        finished = threading.Event()
+
+        def fail():
+            raise ValueError("lookup failed")
+
+        def read_stream():
+            time.sleep(0.1)
+            finished.set()
+
+        warm_up = WarmUp()
+        warm_up.add("reference data", read_stream)
+        warm_up.add("lookups", fail)
+
+        with self.assertLogs(level="ERROR") as logs:
+            with self.assertRaises(ValueError):
+                warm_up.run()
+
+        # The caller can close what the other tasks were reading once run raises
+        self.assertTrue(finished.is_set())
+        self.assertIn("'lookups' failed", logs.output[0])
+
+    def test_dependent_task_fails_with_its_dependency(self):
+        def fail():
+            raise ValueError("no version")
+
+        warm_up = WarmUp()
+        warm_up.add("version", fail)
+        warm_up.add("lookups", lambda: warm_up.result("version"))
+
+        with self.assertLogs(level="ERROR"):
+            with self.assertRaises(ValueError):
+                warm_up.run()
+
+
+@benchmark
+class TestWarmUpBenchmark(unittest.TestCase):
+    def test_start_up_takes_as_long_as_the_slowest_task(self):
+        # Latencies in the same proportion as the blob download and Cosmos queries
+        task_seconds = {
+            "reference data": 0.2,
+            "dataset version": 0.03,
+            "ukrlp lookups": 0.1,
+            "subject lookups": 0.05,
+            "qualification levels": 0.03,
+        }
+
+        start = time.monotonic()
+        for seconds in task_seconds.values():
+            time.sleep(seconds)
+        sequential_time = time.monotonic() - start
+
+        warm_up = WarmUp()
+        for name, seconds in task_seconds.items():
+            warm_up.add(name, time.sleep, seconds)
+        start = time.monotonic()
+        warm_up.run()
+        warm_up_time = time.monotonic() - start
+
+        print(f"\nsequential start-up: {sequential_time:.2f}s, warm-up: {warm_up_time:.2f}s")
+        self.assertLess(warm_up_time, sequential_time)
+        self.assertLess(warm_up_time, max(task_seconds.values()) + 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
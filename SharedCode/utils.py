@@ -53,6 +53,15 @@ def get_uuid():
     return str(uuid.uuid1())
 
 
+# The fields of the documents each lookup reads, as dotted paths
+UKRLP_LOOKUP_FIELDS = (
+    "institution.pub_ukprn",
+    "institution.pub_ukprn_name",
+    "institution.pub_ukprn_welsh_name",
+)
+SUBJECT_LOOKUP_FIELDS = ("code", "english_name", "welsh_name", "level")
+
+
 def get_ukrlp_lookups(version):
     """Returns a dictionary of UKRLP lookups"""
 
@@ -63,8 +72,7 @@ def get_ukrlp_lookups(version):
     database = cosmos_db_client.get_database_client(db_id)
     container = database.get_container_client(collection_id)
 
-    query = f"SELECT * from c WHERE c.version = {version}"
-
+    query = get_projected_query(UKRLP_LOOKUP_FIELDS, f"c.version = {version}")
 
     lookup_list = list(
         container.query_items(query=query, enable_cross_partition_query=True)
@@ -91,7 +99,7 @@ def get_subject_lookups(version):
     database = cosmos_db_client.get_database_client(db_id)
     container = database.get_container_client(collection_id)
 
-    query = f"SELECT * from c WHERE c.version = {version}"
+    query = get_projected_query(SUBJECT_LOOKUP_FIELDS, f"c.version = {version}")
 
     options = {"enable_cross_partition_query": True}
 
@@ -102,8 +110,90 @@ def get_subject_lookups(version):
     return {lookup["code"]: lookup for lookup in lookup_list}
 
 
-def get_courses_by_version(version):
-    """Returns a dictionary of courses for a version of the dataset"""
+def get_projection(fields, source="c"):
+    """Returns a Cosmos DB SQL object literal that selects only the given fields
+
+    Fields are dotted paths such as "course.mode.label" and keep their
+    nesting in the result, so a projected document reads the same way as
+    the whole one. A field missing from a document is left out, as it is
+    in the whole document.
+    """
+    tree = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.split(".")
+        for parent in parents:
+            node = node.setdefault(parent, {})
+            if node is None:
+                break
+        else:
+            node[leaf] = None
+
+    def render(node, path):
+        properties = []
+        for key, children in node.items():
+            reference = f'{path}["{key}"]'
+            value = render(children, reference) if children else reference
+            properties.append(f'"{key}": {value}')
+        return "{" + ", ".join(properties) + "}"
+
+    return render(tree, source)
+
+
+def get_projected_query(fields, condition=None):
+    """Returns a query for the documents matching condition with only the given fields
+
+    With fields=None every field is returned, as SELECT * does.
+    """
+    if fields is None:
+        query = "SELECT * FROM c"
+    else:
+        query = f"SELECT VALUE {get_projection(fields)} FROM c"
+    if condition:
+        query += f" WHERE {condition}"
+    return query
+
+
+def project_document(document, fields):
+    """Returns the part of a document that get_projection(fields) would select"""
+    projected = {}
+    for field in fields:
+        source, target = document, projected
+        *parents, leaf = field.split(".")
+        for parent in parents:
+            source = source.get(parent) if isinstance(source, dict) else None
+            target = target.setdefault(parent, {})
+        if isinstance(source, dict) and leaf in source:
+            target[leaf] = source[leaf]
+    return projected
+
+
+def get_query_page_size():
+    return int(os.environ.get("CosmosQueryPageSize", 500))
+
+
+def iter_query_pages(container, query, page_size=None, continuation_token=None, **options):
+    """Yields the results of a query a page (a list of documents) at a time
+
+    Each page is fetched with the continuation token returned with the one
+    before it, and only when the previous page has been consumed, so no more
+    than page_size documents are held at once.
+    """
+    if page_size is None:
+        page_size = get_query_page_size()
+
+    pages = container.query_items(
+        query=query, max_item_count=page_size, **options
+    ).by_page(continuation_token)
+    for page in pages:
+        yield list(page)
+
+
+def iter_courses_by_version(version, page_size=None, fields=None):
+    """Yields pages of the courses for a version of the dataset
+
+    With fields, only those fields of each course are read (see get_projection).
+    """
     cosmos_db_client = get_cosmos_client()
     database_id = os.environ.get("AzureCosmosDbDatabaseId")
     container_id = os.environ.get("AzureCosmosDbCoursesCollectionId")
@@ -111,15 +201,54 @@ def get_courses_by_version(version):
     database = cosmos_db_client.get_database_client(database_id)
     container = database.get_container_client(container_id)
 
-    query = f"SELECT * from c WHERE c.version = {version}"
+    query = get_projected_query(fields, f"c.version = {version}")
 
     options = {"enable_cross_partition_query": True}
 
-    course_list = list(
-        container.query_items(query=query, **options)
-    )
+    yield from iter_query_pages(container, query, page_size, **options)
+
 
-    return course_list
+def get_courses_by_version(version):
+    """Returns a list of courses for a version of the dataset"""
+    return [course for page in iter_courses_by_version(version) for course in page]
+
+
+def element_to_dict(element):
+    """Returns the same value as xmltodict.parse(ET.tostring(element))[element.tag]
+
+    Walks the element directly rather than serialising it and parsing it
+    again. Repeated child tags become lists, attributes are prefixed with
+    '@', text alongside children or attributes is stored under '#text' and
+    whitespace-only text is dropped.
+    """
+    item = None
+    if element.attrib:
+        item = {f"@{key}": value for key, value in element.attrib.items()}
+
+    text = [element.text] if element.text else []
+    for child in element:
+        if item is None:
+            item = {}
+        push_element_value(item, child.tag, element_to_dict(child))
+        if child.tail:
+            text.append(child.tail)
+
+    text = "".join(text).strip() or None
+    if item is None:
+        return text
+    if text:
+        push_element_value(item, "#text", text)
+    return item
+
+
+def push_element_value(item, key, value):
+    """Adds value to item under key, turning the entry into a list when the key repeats"""
+    if key not in item:
+        item[key] = value
+    elif isinstance(item[key], list):
+        item[key].append(value)
+    else:
+        item[key] = [item[key], value]
 
 
 def get_english_welsh_item(key, lookup_table: Dict):
@@ -0,0 +1,64 @@
+"""Runs the independent start-up steps of a function at the same time.
+
+Downloads and Cosmos DB queries made before the main work starts spend
+nearly all their time waiting on the network, so running them on a thread
+pool makes the start-up as long as the slowest step rather than the sum of
+them. Each task is timed. The first failure is raised once the tasks
+already running have finished, so none of them is left using a stream or
+client the caller closes as the failure unwinds it.
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_EXCEPTION
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+
+class WarmUp:
+    """A set of named start-up tasks run together on a thread pool
+
+    A task that needs another task's result calls result(name) from inside
+    its own function and waits for it there.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.futures = {}
+        self.timings = {}
+
+    def add(self, name, func, *args):
+        self.tasks[name] = (func, args)
+
+    def result(self, name):
+        return self.futures[name].result()
+
+    def run_task(self, name, func, args):
+        start = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            self.timings[name] = time.monotonic() - start
+            logging.info(f"Warm-up task '{name}' finished in {self.timings[name]:.2f}s")
+
+    def run(self):
+        """Runs every task and returns a dict of their results by name"""
+        start = time.monotonic()
+        # One thread per task, so tasks waiting on another task's result cannot starve it
+        executor = ThreadPoolExecutor(max(len(self.tasks), 1), thread_name_prefix="warm-up")
+        for name, (func, args) in self.tasks.items():
+            self.futures[name] = executor.submit(self.run_task, name, func, args)
+
+        done, not_done = wait(self.futures.values(), return_when=FIRST_EXCEPTION)
+        for name, future in self.futures.items():
+            if future in done and future.exception() is not None:
+                logging.error(f"Warm-up task '{name}' failed, waiting for {len(not_done)} other task(s) to finish")
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise future.exception()
+
+        executor.shutdown()
+        elapsed = time.monotonic() - start
+        logging.info(
+            f"Warm-up finished in {elapsed:.2f}s, its tasks took {sum(self.timings.values()):.2f}s in total"
+        )
+        return {name: future.result() for name, future in self.futures.items()}
@@ -3,8 +3,8 @@ import requests
 import azure.cosmos.cosmos_client as cosmos_client
 import azure.cosmos.errors as errors
 import azure.cosmos.documents as documents
-import time
 
+from ..SharedCode.cosmos_bulk_writer import CosmosBulkWriter
 from . import models
 
 
@@ -35,41 +35,19 @@ class Loader:
 
     def load_subject_documents(self):
         subject_count = 0
-        new_docs = []
-        sproc_count = 0
+        bulk_writer = CosmosBulkWriter(self.container, self.version)
 
         for row in self.rows:
             subject_count += 1
-            sproc_count += 1
 
             if subject_count == 1:
                 logging.info("skipping header row")
                 continue
 
             # Transform row into json object
-            new_docs.append(models.build_subject_doc(row, self.version))
-
-            if sproc_count == 100:
-                logging.info(f"Begining execution of stored procedure for {sproc_count} documents")
-                self.container.scripts.execute_stored_procedure(
-                    sproc="bulkImport",
-                    partition_key=str(self.version),
-                    params=[new_docs]
-                )
-                logging.info(f"Successfully loaded another {sproc_count} documents")
-                # Reset values
-                new_docs = []
-                sproc_count = 0
-                time.sleep(10)
-
-        if sproc_count > 0:
-            logging.info(f"Begining execution of stored procedure for {sproc_count} documents")
-            self.container.scripts.execute_stored_procedure(
-                sproc="bulkImport",
-                partition_key=str(self.version),
-                params=[new_docs]
-            )
-            logging.info(f"Successfully loaded another {sproc_count} documents")
+            bulk_writer.add(models.build_subject_doc(row, self.version))
+
+        bulk_writer.flush()
 
         logging.info(
             f"loaded {subject_count - 1} into {self.collection_id} collection in {self.db_id} database"